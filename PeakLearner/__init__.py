@@ -112,6 +112,8 @@ def main(global_config, **settings):
 
     config.add_route('jobs', '/Jobs/')
     config.add_route('jobQueue', '/Jobs/queue/')
+    config.add_route('jobLease', '/Jobs/lease/')
+    config.add_route('jobTasks', '/Jobs/tasks/')
     config.add_route('jobsWithId', '/Jobs/{jobId}/')
     config.add_route('resetJob', '/Jobs/{jobId}/reset/')
     config.add_route('restartJob', '/Jobs/{jobId}/restart/')
@@ -126,6 +128,7 @@ def main(global_config, **settings):
 
     config.add_route('hubModels', '/{user}/{hub}/models/')
     config.add_route('trackModels', '/{user}/{hub}/{track}/models/')
+    config.add_route('trackModelBatch', '/{user}/{hub}/{track}/modelBatch/')
     # This one is for retrieving a single model summary
     # I can't really think of a good way to do both so I'm going to just split them
     config.add_route('trackModelSum', '/{user}/{hub}/{track}/modelSum/')
@@ -144,6 +147,8 @@ def main(global_config, **settings):
     config.add_route('deleteHub', '/{user}/{hub}/delete/')
     config.add_route('unlabeledHub', '/{user}/{hub}/unlabeled/')
     config.add_route('labeledHub', '/{user}/{hub}/labeled/')
+    config.add_route('hubTrackFeatures', '/{user}/{hub}/trackFeatures/')
+    config.add_route('hubIngest', '/{user}/{hub}/ingest/')
     config.add_route('jbrowseJson', '/{user}/{hub}/data/{handler}')
     config.scan('core.Hubs.views')
     config.add_static_view(name='/{user}/{hub}', path='jbrowse:jbrowse')
@@ -4,10 +4,11 @@
 #SBATCH --chdir=/home/tristan/Research/PeakLearner/
 #SBATCH --open-mode=append
 #SBATCH --ntasks=1
+#SBATCH --cpus-per-task=4
 #SBATCH --time=1:00:00
 
 source /home/tristan/anaconda3/bin/activate PLVenv
 
-srun python3 Slurm/run.py
+srun python3 Slurm/run.py --worker
 
 sbatch -Q PeakLearnerSlurm.sh
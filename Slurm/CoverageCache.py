@@ -0,0 +1,151 @@
+import os
+import fcntl
+import shutil
+import hashlib
+import contextlib
+try:
+    import SlurmConfig as cfg
+except ModuleNotFoundError:
+    import Slurm.SlurmConfig as cfg
+
+coverageExt = '.bedGraph'
+lockExt = '.lock'
+
+
+def cacheKey(trackUrl, chrom, start, end):
+    """Hash of the region, used as the file name for that region in the cache"""
+    region = '%s\t%s\t%s\t%s' % (trackUrl, chrom, int(start), int(end))
+
+    return hashlib.sha256(region.encode()).hexdigest()
+
+
+def entryPath(key):
+    return os.path.join(cfg.cachePath, key + coverageExt)
+
+
+def lockPath(key):
+    return os.path.join(cfg.cachePath, key + lockExt)
+
+
+@contextlib.contextmanager
+def lock(key, blocking=True):
+    """Holds an exclusive lock on a cache entry, yields whether the lock was acquired
+
+    Tasks on the same node wait on the lock so only one of them downloads the coverage
+    """
+    os.makedirs(cfg.cachePath, exist_ok=True)
+
+    flags = fcntl.LOCK_EX
+
+    if not blocking:
+        flags = flags | fcntl.LOCK_NB
+
+    path = lockPath(key)
+
+    while True:
+        with open(path, 'w') as lockFile:
+            try:
+                fcntl.flock(lockFile, flags)
+            except BlockingIOError:
+                yield False
+                return
+
+            try:
+                # Eviction removes the lock file with the entry, a lock taken on a removed file isn't the lock anymore
+                if not sameFile(lockFile, path):
+                    continue
+
+                yield True
+                return
+            finally:
+                fcntl.flock(lockFile, fcntl.LOCK_UN)
+
+
+def sameFile(lockFile, path):
+    try:
+        return os.stat(path).st_ino == os.fstat(lockFile.fileno()).st_ino
+    except FileNotFoundError:
+        return False
+
+
+def linkFile(src, dst):
+    """Hard links so eviction can't remove a file a task is using, copies if on different file systems"""
+    if os.path.exists(dst):
+        os.remove(dst)
+
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+
+def get(key, outputPath):
+    """Puts the cached coverage at outputPath, should be called with the lock for key held
+
+    Returns False if the region isn't cached
+    """
+    path = entryPath(key)
+
+    if not os.path.exists(path):
+        return False
+
+    # The modified time is what the LRU eviction goes off of
+    os.utime(path)
+
+    linkFile(path, outputPath)
+
+    return True
+
+
+def put(key, coveragePath):
+    """Adds a coverage file to the cache, should be called with the lock for key held"""
+    path = entryPath(key)
+    tempPath = '%s.%s.tmp' % (path, os.getpid())
+
+    linkFile(coveragePath, tempPath)
+
+    os.replace(tempPath, path)
+
+    evict()
+
+
+def evict():
+    """Removes the least recently used entries until the cache is under cfg.cacheSize bytes
+
+    Entries which are locked by another task are skipped
+    """
+    entries = []
+    totalSize = 0
+
+    for entry in os.scandir(cfg.cachePath):
+        if not entry.name.endswith(coverageExt):
+            continue
+
+        try:
+            stat = entry.stat()
+        except FileNotFoundError:
+            continue
+
+        entries.append((stat.st_mtime, stat.st_size, entry.name[:-len(coverageExt)]))
+        totalSize += stat.st_size
+
+    if totalSize <= cfg.cacheSize:
+        return
+
+    entries.sort()
+
+    for mtime, size, key in entries:
+        if totalSize <= cfg.cacheSize:
+            break
+
+        with lock(key, blocking=False) as locked:
+            if not locked:
+                continue
+
+            for path in (entryPath(key), lockPath(key)):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+        totalSize -= size
@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+
+quartiles = [0, 0.25, 0.5, 0.75, 1]
+quartileNames = ['quartile.0%', 'quartile.25%', 'quartile.50%', 'quartile.75%', 'quartile.100%']
+
+
+def weightedQuantiles(values, weights, probs):
+    """Quantiles of values where each value is repeated weights times
+
+    Gives the same result as R's default quantile (type 7) on the expanded vector,
+    found by searching the cumulative weights instead of expanding it
+    """
+    total = weights.sum()
+    ends = np.cumsum(weights)
+
+    # Position in the expanded vector, then the values on either side of it
+    position = (total - 1) * np.asarray(probs, dtype=float)
+    below = np.floor(position).astype(np.int64)
+    above = np.minimum(below + 1, total - 1)
+
+    belowValues = values[np.searchsorted(ends, below, side='right')]
+    aboveValues = values[np.searchsorted(ends, above, side='right')]
+
+    return belowValues + (position - below) * (aboveValues - belowValues)
+
+
+def coverageFeatures(coverage):
+    """Computes the features for a coverage DataFrame with chromStart, chromEnd, and count columns
+
+    Each row is a run of bases with the same count, the bases are used as weights rather than expanding
+    the coverage to one value per base. The columns are the same as the R feature script used to make.
+    """
+    counts = coverage['count'].to_numpy(dtype=float)
+    bases = (coverage['chromEnd'] - coverage['chromStart']).to_numpy(dtype=np.int64)
+
+    numBases = bases.sum()
+
+    order = np.argsort(counts, kind='stable')
+    sortedCounts = counts[order]
+    sortedBases = bases[order]
+
+    mean = np.sum(counts * bases) / numBases
+
+    if numBases > 1:
+        sd = np.sqrt(np.sum(bases * (counts - mean) ** 2) / (numBases - 1))
+    else:
+        sd = np.nan
+
+    names = quartileNames + ['mean', 'sd', 'bases', 'data']
+    values = np.concatenate([weightedQuantiles(sortedCounts, sortedBases, quartiles),
+                             [mean, sd, numBases, len(coverage.index)]]).astype(float)
+
+    # log of 0 and negatives are expected to be -inf and nan here
+    with np.errstate(divide='ignore', invalid='ignore'):
+        logValues = np.log(values)
+        variants = [('', values),
+                    ('log+1.', np.log(values + 1)),
+                    ('log.', logValues),
+                    ('log.log.', np.log(logValues))]
+
+    features = {}
+
+    for prefix, variant in variants:
+        for name, value in zip(names, variant):
+            features[prefix + name] = value
+
+    return pd.DataFrame([features])
+
+
+def problemFeatures(coveragePath):
+    """Computes the features for a coverage bedGraph"""
+    coverage = pd.read_csv(coveragePath, sep='\t', header=None)
+    coverage.columns = ['chrom', 'chromStart', 'chromEnd', 'count']
+
+    return coverageFeatures(coverage)
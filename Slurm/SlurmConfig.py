@@ -1,3 +1,5 @@
+import os
+import tempfile
 import configparser
 
 configFile = 'PeakLearnerSlurm.cfg'
@@ -28,6 +30,28 @@ if 'slurm' not in configSections:
     config['slurm']['dataPath'] = 'slurmdata/'
     save = True
 
+if 'worker' not in configSections:
+    config.add_section('worker')
+    # 0 uses the number of cores in the allocation
+    config['worker']['workers'] = '0'
+    config['worker']['minWait'] = '1'
+    config['worker']['maxWait'] = '60'
+    config['worker']['leaseTime'] = '3600'
+    # Processes used for the penalties of a multiModel task, 0 splits the cores between the workers
+    config['worker']['penaltyWorkers'] = '0'
+    # Stop taking tasks after this many seconds, keep it under the slurm time limit. 0 runs forever
+    config['worker']['runTime'] = '3000'
+    # Exit after being idle for this many seconds, 0 never exits from idling
+    config['worker']['maxIdle'] = '0'
+    save = True
+
+if 'cache' not in configSections:
+    config.add_section('cache')
+    # Should be on node local storage
+    config['cache']['path'] = os.path.join(tempfile.gettempdir(), 'PeakLearnerCoverage')
+    config['cache']['sizeGB'] = '10'
+    save = True
+
 # If a section was missing, save that to the config
 if save:
     with open(configFile, 'w') as cfg:
@@ -43,4 +67,22 @@ else:
 verify = config['remoteServer']['verify'].lower() == 'true'
 debug = config['general']['debug'].lower() == 'true'
 dataPath = config['slurm']['dataPath']
-jobUrl = '%sJobs/' % remoteServer
\ No newline at end of file
+jobUrl = '%sJobs/' % remoteServer
+
+numCores = int(os.environ.get('SLURM_CPUS_ON_NODE', os.cpu_count()))
+
+numWorkers = int(config['worker']['workers'])
+
+if numWorkers < 1:
+    numWorkers = numCores
+
+penaltyWorkers = int(config['worker']['penaltyWorkers'])
+
+minWait = float(config['worker']['minWait'])
+maxWait = float(config['worker']['maxWait'])
+leaseTime = int(config['worker']['leaseTime'])
+runTime = float(config['worker']['runTime'])
+maxIdle = float(config['worker']['maxIdle'])
+
+cachePath = config['cache']['path']
+cacheSize = float(config['cache']['sizeGB']) * 1024 ** 3
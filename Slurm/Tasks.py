@@ -4,34 +4,66 @@ import time
 import shutil
 import requests
 import subprocess
+import concurrent.futures
 import PeakSegDisk
 import pandas as pd
 try:
     import SlurmConfig as cfg
+    import Features
+    import CoverageCache as cache
 except ModuleNotFoundError:
     import Slurm.SlurmConfig as cfg
+    import Slurm.Features as Features
+    import Slurm.CoverageCache as cache
 
-genFeaturesPath = os.path.join('Slurm', 'GenerateFeatures.R')
 
+def newSession(poolSize=1):
+    """Creates the session used for requests to the server so connections are kept alive between tasks
 
-def model(task, dataPath, coveragePath, trackUrl):
-    segmentsPath = '%s_penalty=%s_segments.bed' % (coveragePath, task['penalty'])
-    lossPath = '%s_penalty=%s_loss.tsv' % (coveragePath, task['penalty'])
+    Worker processes call this when they start so they don't share connections with the process which forked them
+    """
+    global session
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=poolSize)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+
+    return session
+
+
+session = newSession()
+
+
+def runFPOP(coveragePath, penalty):
+    """Runs PeakSegDisk on the coverage with one penalty
+
+    Returns the paths to the segments and loss, or None if either wasn't created
+    """
+    segmentsPath = '%s_penalty=%s_segments.bed' % (coveragePath, penalty)
+    lossPath = '%s_penalty=%s_loss.tsv' % (coveragePath, penalty)
     try:
-        PeakSegDisk.FPOP_files(coveragePath, segmentsPath, lossPath, str(task['penalty']))
+        PeakSegDisk.FPOP_files(coveragePath, segmentsPath, lossPath, str(penalty))
     except FileNotFoundError:
         pass
 
-    if os.path.exists(lossPath):
-        if not sendLoss(lossPath, task, trackUrl):
-            return False
-    else:
+    if not os.path.exists(lossPath) or not os.path.exists(segmentsPath):
+        return None
+
+    return segmentsPath, lossPath
+
+
+def model(task, dataPath, coveragePath, trackUrl):
+    paths = runFPOP(coveragePath, task['penalty'])
+
+    if paths is None:
+        return False
+
+    segmentsPath, lossPath = paths
+
+    if not sendLoss(lossPath, task, trackUrl):
         return False
 
-    if os.path.exists(segmentsPath):
-        if not sendSegments(segmentsPath, task, trackUrl):
-            return False
-    else:
+    if not sendSegments(segmentsPath, task, trackUrl):
         return False
 
     if not cfg.debug:
@@ -41,19 +73,54 @@ def model(task, dataPath, coveragePath, trackUrl):
     return True
 
 
-def feature(task, dataPath, coveragePath, trackUrl):
-    result = subprocess.run(['Rscript',
-                             genFeaturesPath,
-                             dataPath],
-                            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+def multiModel(task, dataPath, coveragePath, trackUrl):
+    """Runs every penalty of the task on the same coverage in parallel, then uploads them together"""
+    penalties = task['penalties']
+
+    numWorkers = cfg.penaltyWorkers
+
+    if numWorkers < 1:
+        numWorkers = cfg.numCores
 
-    featurePath = os.path.join(dataPath, 'features.tsv')
+    numWorkers = max(1, min(len(penalties), numWorkers))
 
-    if not os.path.exists(featurePath):
-        print('out\n', result.stdout)
-        print('err\n', result.stderr)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=numWorkers) as executor:
+        results = list(executor.map(runFPOP, [coveragePath] * len(penalties), penalties))
+
+    if None in results:
+        return False
 
-    featureDf = pd.read_csv(featurePath, sep='\t')
+    models = []
+
+    for penalty, (segmentsPath, lossPath) in zip(penalties, results):
+        models.append({'penalty': str(penalty),
+                       'modelData': readSegments(segmentsPath).to_json(),
+                       'lossData': readLoss(lossPath).to_json()})
+
+    modelUrl = '%smodelBatch/' % trackUrl
+
+    query = {'modelInfo': getModelInfo(task), 'models': models}
+
+    try:
+        r = session.put(modelUrl, json=query, verify=cfg.verify)
+    except requests.exceptions.ConnectionError:
+        raise Exception(query['modelInfo'])
+
+    if not r.status_code == 200:
+        return False
+
+    print('models successfully sent with penalties', penalties, 'and with modelInfo:\n', query['modelInfo'], '\n')
+
+    if not cfg.debug:
+        for segmentsPath, lossPath in results:
+            os.remove(segmentsPath)
+            os.remove(lossPath)
+
+    return True
+
+
+def feature(task, dataPath, coveragePath, trackUrl):
+    featureDf = Features.problemFeatures(coveragePath)
 
     featureQuery = {'data': featureDf.to_dict('records'),
                     'problem': task['problem']}
@@ -61,7 +128,7 @@ def feature(task, dataPath, coveragePath, trackUrl):
     featureUrl = '%sfeatures/' % trackUrl
 
     try:
-        r = requests.put(featureUrl, json=featureQuery, verify=cfg.verify)
+        r = session.put(featureUrl, json=featureQuery, verify=cfg.verify)
     except requests.exceptions.ConnectionError:
         raise Exception(featureQuery)
 
@@ -73,23 +140,46 @@ def feature(task, dataPath, coveragePath, trackUrl):
     return True
 
 
-def sendSegments(segmentsFile, task, trackUrl):
+def getModelInfo(task):
+    return {'user': task['user'],
+            'hub': task['hub'],
+            'track': task['track'],
+            'problem': task['problem'],
+            'jobId': task['id']}
+
+
+def readSegments(segmentsFile):
     modelData = pd.read_csv(segmentsFile, sep='\t', header=None)
     modelData.columns = ['chrom', 'start', 'end', 'annotation', 'mean']
-    sortedModel = modelData.sort_values('start', ignore_index=True)
+    return modelData.sort_values('start', ignore_index=True)
+
+
+def readLoss(lossFile):
+    lossData = pd.read_csv(lossFile, sep='\t', header=None)
+    lossData.columns = ['penalty',
+                        'segments',
+                        'peaks',
+                        'totalBases',
+                        'bedGraphLines',
+                        'meanPenalizedCost',
+                        'totalUnpenalizedCost',
+                        'numConstraints',
+                        'meanIntervals',
+                        'maxIntervals']
+    return lossData
+
 
-    modelInfo = {'user': task['user'],
-                 'hub': task['hub'],
-                 'track': task['track'],
-                 'problem': task['problem'],
-                 'jobId': task['id']}
+def sendSegments(segmentsFile, task, trackUrl):
+    sortedModel = readSegments(segmentsFile)
+
+    modelInfo = getModelInfo(task)
 
     modelUrl = '%smodels/' % trackUrl
 
     query = {'modelInfo': modelInfo, 'penalty': task['penalty'], 'modelData': sortedModel.to_json()}
 
     try:
-        r = requests.put(modelUrl, json=query, verify=cfg.verify)
+        r = session.put(modelUrl, json=query, verify=cfg.verify)
     except requests.exceptions.ConnectionError:
         raise Exception(query)
 
@@ -104,28 +194,14 @@ def sendLoss(lossFile, task, trackUrl):
     strPenalty = str(task['penalty'])
     lossUrl = '%sloss/' % trackUrl
 
-    lossData = pd.read_csv(lossFile, sep='\t', header=None)
-    lossData.columns = ['penalty',
-                        'segments',
-                        'peaks',
-                        'totalBases',
-                        'bedGraphLines',
-                        'meanPenalizedCost',
-                        'totalUnpenalizedCost',
-                        'numConstraints',
-                        'meanIntervals',
-                        'maxIntervals']
+    lossData = readLoss(lossFile)
 
-    lossInfo = {'user': task['user'],
-                'hub': task['hub'],
-                'track': task['track'],
-                'problem': task['problem'],
-                'jobId': task['id']}
+    lossInfo = getModelInfo(task)
 
     query = {'lossInfo': lossInfo, 'penalty': strPenalty, 'lossData': lossData.to_json()}
 
     try:
-        r = requests.put(lossUrl, json=query, verify=cfg.verify)
+        r = session.put(lossUrl, json=query, verify=cfg.verify)
     except requests.exceptions.ConnectionError:
         raise Exception(query)
 
@@ -137,10 +213,34 @@ def sendLoss(lossFile, task, trackUrl):
 
 
 def getCoverageFile(task, dataPath):
+    """Gets the coverage for the task's problem, only downloading it if it isn't in the node's cache"""
     problem = task['problem']
 
     coveragePath = os.path.join(dataPath, 'coverage.bedGraph')
 
+    key = cache.cacheKey(task['trackUrl'], problem['chrom'], problem['chromStart'], problem['chromEnd'])
+
+    with cache.lock(key):
+        if cache.get(key, coveragePath):
+            return coveragePath
+
+        # Only coverage which was downloaded completely is cached
+        if not downloadCoverage(task, coveragePath):
+            if os.path.exists(coveragePath):
+                os.remove(coveragePath)
+            raise Exception('Failed to download coverage from %s' % task['trackUrl'])
+
+        fixCoverage(task, coveragePath)
+
+        cache.put(key, coveragePath)
+
+    return coveragePath
+
+
+def downloadCoverage(task, coveragePath):
+    """Downloads the coverage of the task's problem to coveragePath, returns whether it succeeded"""
+    problem = task['problem']
+
     coverageUrl = task['trackUrl']
 
     # Make num timeouts configurable
@@ -153,18 +253,18 @@ def getCoverageFile(task, dataPath):
                                  '-end=%s' % str(problem['chromEnd'])],
                                 stdout=subprocess.PIPE, stderr=subprocess.PIPE)
 
-        if not result.stderr == b'':
+        if result.returncode != 0 or not result.stderr == b'':
             print('download error\n', result.stderr)
             time.sleep(1)
             continue
 
         if os.path.exists(coveragePath):
-            break
+            return True
 
         # wait a second then make the request again
         time.sleep(1)
 
-    return fixCoverage(task, coveragePath)
+    return False
 
 
 def fixCoverage(task, coveragePath):
@@ -214,7 +314,7 @@ def runTask(task):
     currentJobUrl = '%s%s/' % (cfg.jobUrl, task['id'])
 
     try:
-        r = requests.post(currentJobUrl, json=query, verify=cfg.verify)
+        r = session.post(currentJobUrl, json=query, verify=cfg.verify)
     except requests.exceptions.ConnectionError:
         raise Exception(query)
 
@@ -238,7 +338,7 @@ def runTask(task):
                  'status': 'Done',
                  'totalTime': str(totalTime)}
         try:
-            r = requests.post(currentJobUrl, json=query, verify=cfg.verify)
+            r = session.post(currentJobUrl, json=query, verify=cfg.verify)
         except requests.exceptions.ConnectionError:
             raise Exception(query)
 
@@ -252,7 +352,7 @@ def runTask(task):
              'status': 'Error',
              'totalTime': str(totalTime)}
     try:
-        r = requests.post(currentJobUrl, json=query, verify=cfg.verify)
+        r = session.post(currentJobUrl, json=query, verify=cfg.verify)
     except requests.exceptions.ConnectionError:
         raise Exception(query)
 
@@ -262,6 +362,7 @@ def runTask(task):
 
 def getTaskFunc(task):
     tasks = {'model': model,
+             'multiModel': multiModel,
              'feature': feature}
 
     return tasks[task['type']]
@@ -1,7 +1,9 @@
 import os
 import sys
 import time
+import argparse
 import requests
+import concurrent.futures
 requests.packages.urllib3.disable_warnings(requests.packages.urllib3.exceptions.InsecureRequestWarning)
 
 try:
@@ -15,7 +17,7 @@ except ModuleNotFoundError:
 def runTask():
     queueUrl = '%squeue/' % cfg.jobUrl
     try:
-        r = requests.get(queueUrl, timeout=10, verify=cfg.verify)
+        r = tasks.session.get(queueUrl, timeout=10, verify=cfg.verify)
     except requests.exceptions.ReadTimeout:
         return False
 
@@ -27,6 +29,94 @@ def runTask():
     return tasks.runTask(task)
 
 
+def leaseTasks(count):
+    """Leases up to count tasks from the server"""
+    leaseUrl = '%slease/' % cfg.jobUrl
+    query = {'count': count, 'leaseTime': cfg.leaseTime}
+    try:
+        r = tasks.session.post(leaseUrl, json=query, timeout=10, verify=cfg.verify)
+    except (requests.exceptions.ReadTimeout, requests.exceptions.ConnectionError):
+        return []
+
+    if not r.status_code == 200:
+        return []
+
+    return r.json()
+
+
+def startWorker(numWorkers):
+    tasks.newSession()
+
+    # Split the cores between the workers rather than each multiModel task using all of them
+    if cfg.penaltyWorkers < 1:
+        cfg.penaltyWorkers = max(1, cfg.numCores // numWorkers)
+
+
+def runWorker(numWorkers=cfg.numWorkers, runTime=cfg.runTime, maxIdle=cfg.maxIdle):
+    """Keeps running tasks until runTime is up, backing off while the queue is empty
+
+    Each process in the pool runs one task at a time, so numWorkers should match the cores in the allocation
+    """
+    startTime = lastTask = time.time()
+    wait = cfg.minWait
+    running = set()
+
+    tasks.newSession(poolSize=numWorkers)
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=numWorkers, initializer=startWorker,
+                                                initargs=(numWorkers,)) as executor:
+        while True:
+            now = time.time()
+
+            stopping = runTime > 0 and now - startTime > runTime
+
+            if maxIdle > 0 and not running and now - lastTask > maxIdle:
+                stopping = True
+
+            if stopping:
+                if not running:
+                    break
+                leased = []
+            else:
+                leased = leaseTasks(numWorkers - len(running))
+
+            for task in leased:
+                running.add(executor.submit(tasks.runTask, task))
+
+            if leased:
+                lastTask = time.time()
+                wait = cfg.minWait
+
+            if not running:
+                time.sleep(wait)
+                wait = min(wait * 2, cfg.maxWait)
+                continue
+
+            # Every worker is busy, so there is no point asking for more tasks until one finishes
+            if len(running) >= numWorkers or stopping:
+                timeout = None
+            else:
+                timeout = wait
+                wait = min(wait * 2, cfg.maxWait)
+
+            done, running = concurrent.futures.wait(running,
+                                                    timeout=timeout,
+                                                    return_when=concurrent.futures.FIRST_COMPLETED)
+
+            for future in done:
+                # The server puts the task back once its lease expires, so just keep going
+                if future.exception() is not None:
+                    print('Task failed', repr(future.exception()))
+
+                lastTask = time.time()
+
+
 if __name__ == '__main__':
-    if runTask():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--worker', action='store_true', help='Keep running tasks instead of running one')
+    args = parser.parse_args()
+
+    if args.worker:
+        runWorker()
+    elif runTask():
         time.sleep(15)
@@ -7,36 +7,59 @@ problemColumns = ['chrom', 'chromStart', 'chromEnd']
 
 
 def getProblemsForChrom(genome, chrom, txn=None):
-    problems = db.Problems(genome).get(txn=txn)
+    problems = db.ChromProblems(genome, chrom).getAll(txn=txn)
 
-    return problems[problems['chrom'] == chrom].copy()
+    if problems is None:
+        return partitionProblems(genome, chrom, txn=txn)
+
+    return problems
 
 
 def getProblems(data, txn=None):
     if 'genome' not in data:
         data['genome'] = getGenome(data, txn=txn)
 
-    problems = db.Problems(data['genome'])
+    problems = db.ChromProblems(data['genome'], data['ref'])
 
-    problemsInBounds = problems.getInBounds(data['ref'], data['start'], data['end'], txn=txn)
+    problemsInBounds = problems.getInBounds(data['start'], data['end'], txn=txn)
 
     if problemsInBounds is None:
-        problemsPath = os.path.join(cfg.jbrowsePath, cfg.dataPath, 'genomes', data['genome'], 'problems.bed')
+        partitionProblems(data['genome'], data['ref'], txn=txn)
+
+        problemsInBounds = problems.getInBounds(data['start'], data['end'], txn=txn)
+
+    return problemsInBounds.to_dict('records')
+
+
+def partitionProblems(genome, chrom, txn=None):
+    """Stores the genome wide problems split up by chrom, returning the problems for chrom
+
+    Genomes which were added before problems were stored by chrom only have the genome wide problems,
+    so those are split up the first time a chrom is looked up
+    """
+    problemsDf = db.Problems(genome).get(txn=txn)
+
+    if problemsDf is None:
+        problemsPath = os.path.join(cfg.jbrowsePath, cfg.dataPath, 'genomes', genome, 'problems.bed')
 
         if not os.path.exists(problemsPath):
-            location = Hubs.generateProblems(data['genome'], problemsPath)
+            location = Hubs.generateProblems(genome, problemsPath)
             if not location == problemsPath:
                 raise Exception
 
         problemsDf = pd.read_csv(problemsPath, sep='\t', header=None)
         problemsDf.columns = problemColumns
-        problems.put(problemsDf, txn=txn)
+        db.Problems(genome).put(problemsDf, txn=txn)
+
+    db.ChromProblems.putGenome(genome, problemsDf, txn=txn)
+
+    chromProblems = db.ChromProblems(genome, chrom)
 
-        problemsIsInBounds = problemsDf.apply(db.checkInBounds, axis=1, args=(data['ref'], data['start'], data['end']))
+    # Store an empty index for chroms without problems so this isn't done again
+    if chrom not in problemsDf['chrom'].values:
+        chromProblems.put(problemsDf[problemsDf['chrom'] == chrom], txn=txn)
 
-        return problemsDf[problemsIsInBounds].to_dict('records')
-    else:
-        return problemsInBounds.to_dict('records')
+    return chromProblems.getAll(txn=txn)
 
 
 def getGenome(data, txn=None):
@@ -1,18 +1,45 @@
 import os
 import json
 import gzip
+import time
+import logging
 import requests
 import tempfile
 import threading
+import concurrent.futures
+import numpy as np
 import pandas as pd
 from core.Jobs import Jobs
 from core.Labels import Labels
 from core.Models import Models
 from core.Handlers import Tracks
 from core.Permissions import Permissions
-from core.util import PLConfig as cfg, PLdb as db
+from core.util import PLConfig as cfg, PLdb as db, intervalUtil as iu, assetUtil
 from simpleBDB import retry, txnAbortOnError, AbortTXNException
 
+log = logging.getLogger(__name__)
+
+# Number of tracks to fetch labels for at once when importing a hub
+labelFetchThreads = 16
+
+ingestThread = None
+ingestLock = threading.Lock()
+
+try:  # pragma: no cover
+    import uwsgi
+    import uwsgidecorators
+
+    ingestInMule = True
+
+    # Hubs are set up in a thread of the mule so the upload request can return straight away
+    @uwsgidecorators.timer(10, target='mule')
+    def start_hub_ingest(num):
+        if db.isLoaded():
+            startIngestThread()
+
+except ModuleNotFoundError:  # pragma: no cover
+    ingestInMule = False
+
 
 @retry
 @txnAbortOnError
@@ -68,6 +95,44 @@ def goToRegion(data, txn=None):
     return region
 
 
+@retry
+@txnAbortOnError
+def getTracksFeatures(data, txn=None):
+    """Models and labels in a region for each track in data['tracks'], keyed by track then handler
+
+    The hub info and problems are looked up once for all of the tracks, data['handlers'] can be used to only get
+    the models or labels
+    """
+    hubInfo = db.HubInfo(data['user'], data['hub']).get(txn=txn)
+
+    data['hubInfo'] = hubInfo
+    data['genome'] = hubInfo['genome']
+
+    handlers = data.get('handlers', ['models', 'labels'])
+
+    if 'models' in handlers:
+        problems = Tracks.getProblems(data, txn=txn)
+
+    output = {}
+
+    for track in data['tracks']:
+        if track not in hubInfo['tracks']:
+            continue
+
+        trackData = {**data, 'track': track}
+        trackOutput = {}
+
+        if 'models' in handlers:
+            trackOutput['models'] = Models.getProblemModels(trackData, problems, txn=txn)
+
+        if 'labels' in handlers:
+            trackOutput['labels'] = Labels.labelsInBounds(trackData, txn)
+
+        output[track] = trackOutput
+
+    return output
+
+
 def checkPossibleRegion(row):
     return row['labeled'].any()
 
@@ -77,10 +142,10 @@ def checkProblemForLabels(chromGroup, track, txn):
 
     key = (track['user'], track['hub'], track['track'], chrom)
 
-    if db.Labels.has_key(key):
+    if db.hasKey(db.Labels, key, txn=txn):
         labels = db.Labels(track['user'], track['hub'], track['track'], chrom).get(txn=txn)
 
-        chromGroup['labeled'] = chromGroup.apply(checkLabelsInBoundsOnChrom, axis=1, args=(labels,))
+        chromGroup['labeled'] = checkLabelsInBoundsOnChrom(chromGroup, labels)
 
     else:
         chromGroup['labeled'] = False
@@ -88,9 +153,15 @@ def checkProblemForLabels(chromGroup, track, txn):
     return chromGroup
 
 
-def checkLabelsInBoundsOnChrom(row, labels):
-    inBounds = labels.apply(db.checkInBounds, axis=1, args=(row['chrom'], row['chromStart'], row['chromEnd']))
-    return inBounds.any()
+def checkLabelsInBoundsOnChrom(problems, labels):
+    """Mask of which problems have at least one label in them, both being on the same chrom"""
+    if labels.empty:
+        return np.zeros(len(problems.index), dtype=bool)
+
+    labelStarts, labelEnds = iu.toArrays(labels)
+    problemStarts, problemEnds = iu.toArrays(problems)
+
+    return iu.anyInBounds(labelStarts, labelEnds, problemStarts, problemEnds)
 
 
 @retry
@@ -254,44 +325,191 @@ def createTrackListWithHubInfo(info, owner, hub):
 
 def parseHub(data):
     parsed = parseUCSC(data)
+
+    if parsed is None:
+        return None
+
     # Add a way to configure hub here somehow instead of just loading everythingS
-    return createHubFromParse(parsed)
+    output = queueHubIngest(parsed)
 
+    if not ingestInMule:
+        startIngestThread()
 
-# All this should probably be done asynchronously
-def createHubFromParse(parsed):
-    # Will need to add a way to add additional folder depth for userID once authentication is added
-    hub = parsed['hub']
+    return output
+
+
+@retry
+@txnAbortOnError
+def queueHubIngest(parsed, txn=None):
+    """Stores a parsed hub to be set up in the background, returning the hub's path and where to check on it
+
+    A hub which is being set up can't be uploaded again until that is done, the running ingest would overwrite it
+    """
     user = parsed['user']
-    genomesFile = parsed['genomesFile']
+    hub = parsed['hub']
 
-    # This will need to be updated if there are multiple genomes in file
-    genome = genomesFile['genome']
+    path = '/%s/' % os.path.join(str(user), hub)
+    output = {'path': path, 'status': '%singest/' % path}
 
-    hubInfo = {'genome': genome,
-               'isPublic': parsed['isPublic'],
-               'owner': user}
+    ingestDb = db.HubIngest(user, hub)
+
+    ingest = ingestDb.get(txn=txn, write=True)
+
+    if ingest is not None and ingest['status'] == 'running':
+        output['error'] = 'This hub is still being set up, upload it again once that is done'
+        return output
+
+    # A hub which failed to be set up carries on from the step it failed on
+    if ingest is None or ingest['status'] == 'done':
+        ingest = {'status': 'queued', 'steps': [], 'stage': None, 'error': None}
+
+    ingest['status'] = 'queued'
+    ingest['error'] = None
+    ingest['parsed'] = parsed
+    ingest['lastModified'] = time.time()
+
+    ingestDb.put(ingest, txn=txn)
+
+    return output
+
+
+@retry
+@txnAbortOnError
+def getIngestStatus(data, txn=None):
+    """Gets how setting up a hub is going, only the user who uploaded it can see this"""
+    if str(data['currentUser']) != str(data['user']):
+        return None
+
+    ingest = db.HubIngest(data['user'], data['hub']).get(txn=txn)
+
+    if ingest is None:
+        return None
+
+    return {key: ingest.get(key) for key in ['status', 'stage', 'steps', 'error', 'lastModified']}
+
+
+@retry
+@txnAbortOnError
+def putIngest(user, hub, ingest, txn=None):
+    ingest['lastModified'] = time.time()
+
+    db.HubIngest(user, hub).put(ingest, txn=txn)
+
+
+def startIngestThread():
+    """Starts setting up the queued hubs in a thread, if one isn't already"""
+    global ingestThread
+
+    with ingestLock:
+        if ingestThread is not None and ingestThread.is_alive():
+            return
+
+        ingestThread = threading.Thread(target=runIngests, daemon=True)
+        ingestThread.start()
+
+
+def runIngests():
+    """Sets up the queued hubs one at a time until there aren't any left"""
+    while True:
+        key = nextIngest()
+
+        if key is None:
+            return
+
+        runIngest(*key)
+
+
+def nextIngest():
+    # Only one thread runs ingests, so running ones were stopped part way by a restart and are resumed
+    for key in db.HubIngest.db_key_tuples():
+        ingest = db.HubIngest(*key).get()
+
+        if ingest is not None and ingest['status'] in ('queued', 'running'):
+            return key
+
+    return None
+
+
+def runIngest(user, hub):
+    """Runs the steps to set up a hub which haven't been done yet, saving the progress after each one"""
+    ingest = db.HubIngest(user, hub).get()
+
+    ingest['status'] = 'running'
+
+    for step, stepFunc in ingestSteps:
+        if step in ingest['steps']:
+            continue
+
+        ingest['stage'] = step
+        putIngest(user, hub, ingest)
+
+        try:
+            stepFunc(ingest)
+        except Exception:
+            log.exception('Hub ingest failed at %s for %s %s', step, user, hub)
+            ingest['status'] = 'error'
+            # The exception can have paths and urls from the server in it, so that only goes to the log
+            ingest['error'] = 'Setting up the hub failed at the %s step' % step
+            putIngest(user, hub, ingest)
+            return
 
+        ingest['steps'].append(step)
+
+    ingest['status'] = 'done'
+    ingest['stage'] = None
+    putIngest(user, hub, ingest)
+
+
+def ingestGeneTracks(ingest):
+    genome = ingest['parsed']['genomesFile']['genome']
     dataPath = os.path.join(cfg.jbrowsePath, cfg.dataPath)
 
-    includes = getGeneTracks(genome, dataPath)
+    ingest['includes'] = getGeneTracks(genome, dataPath)
 
-    # Generate problems for this genome
 
-    txn = db.getTxn()
-    problems = generateProblems(genome, dataPath, txn)
-    txn.commit()
+def ingestProblems(ingest):
+    genome = ingest['parsed']['genomesFile']['genome']
+    dataPath = os.path.join(cfg.jbrowsePath, cfg.dataPath)
+
+    # Not in a txn, the problems are shared by every hub on the genome and have to be there once the lock is released
+    ingest['problemsPath'] = generateProblems(genome, dataPath)
+
+
+def ingestProblemTrack(ingest):
+    ingest['problemTrackPath'] = generateProblemTrack(ingest['problemsPath'])
+
+
+def ingestRefSeq(ingest):
+    genome = ingest['parsed']['genomesFile']['genome']
+    dataPath = os.path.join(cfg.jbrowsePath, cfg.dataPath)
 
-    problemPath = generateProblemTrack(problems)
+    getRefSeq(genome, dataPath, ingest['includes'] + [ingest['problemTrackPath']])
 
-    includes.append(problemPath)
 
-    getRefSeq(genome, dataPath, includes)
+def ingestHubInfo(ingest):
+    # Will need to add a way to add additional folder depth for userID once authentication is added
+    parsed = ingest['parsed']
+    hub = parsed['hub']
+    user = parsed['user']
+    genomesFile = parsed['genomesFile']
+
+    # This will need to be updated if there are multiple genomes in file
+    genome = genomesFile['genome']
+
+    hubInfo = {'genome': genome,
+               'isPublic': parsed['isPublic'],
+               'owner': user}
 
-    path = storeHubInfo(user, hub, genomesFile['trackDb'], hubInfo, genome)
+    ingest['path'] = storeHubInfo(user, hub, genomesFile['trackDb'], hubInfo, genome)
     Permissions.Permission(user, hub).putNewPermissions()
 
-    return path
+
+# The steps of setting up a hub in order, the hub info is last so the hub isn't shown until it's ready
+ingestSteps = [('geneTracks', ingestGeneTracks),
+               ('problems', ingestProblems),
+               ('problemTrack', ingestProblemTrack),
+               ('refSeq', ingestRefSeq),
+               ('hubInfo', ingestHubInfo)]
 
 
 def storeHubInfo(user, hub, tracks, hubInfo, genome):
@@ -318,7 +536,8 @@ def storeHubInfo(user, hub, tracks, hubInfo, genome):
                     else:
                         parent['children'].append(track)
 
-    txn = db.getTxn()
+    coverageTracks = []
+
     for track in trackList:
         # Determine which track is the coverage data
         coverage = None
@@ -337,109 +556,104 @@ def storeHubInfo(user, hub, tracks, hubInfo, genome):
                                              'key': track['shortLabel'],
                                              'url': coverage['bigDataUrl']}
 
-            trackTxn = db.getTxn(parent=txn)
-            if not checkForPrexistingLabels(coverage['bigDataUrl'], user, hub, track, genome, trackTxn):
-                trackTxn.abort()
-                continue
-            trackTxn.commit()
+            coverageTracks.append((track, coverage['bigDataUrl']))
 
+    importHubLabels(user, hub, genome, coverageTracks)
 
     hubInfo['tracks'] = hubInfoTracks
+    txn = db.getTxn()
     db.HubInfo(user, hub).put(hubInfo, txn=txn)
     txn.commit()
     return '/%s/' % os.path.join(str(user), hub)
 
 
-def checkForPrexistingLabels(coverageUrl, user, hub, track, genome, txn):
-    trackUrl = coverageUrl.rsplit('/', 1)[0]
-    labelUrl = '%s/labels.bed' % trackUrl
-    with requests.get(labelUrl, verify=False) as r:
-        if not r.status_code == 200:
-            return False
-
-        with tempfile.TemporaryFile() as f:
-            f.write(r.content)
-            f.flush()
-            f.seek(0)
-            labels = pd.read_csv(f, sep='\t', header=None)
-            labels.columns = Labels.labelColumns
-
-    grouped = labels.groupby(['chrom'], as_index=False)
-    grouped.apply(saveLabelGroup, user, hub, track, genome, coverageUrl, txn)
+def importHubLabels(user, hub, genome, coverageTracks):
+    """Imports the labels.bed next to each track's coverage, coverageTracks being a list of (track, coverageUrl)
 
-    return True
-
-
-def saveLabelGroup(group, user, hub, track, genome, coverageUrl, txn):
-    group = group.sort_values('chromStart', ignore_index=True)
-
-    group['annotation'] = group.apply(fixNoPeaks, axis=1)
-    chrom = group['chrom'].loc[0]
-
-    txn = db.getTxn()
+    The labels are fetched and parsed in a pool over one keep-alive session while the db writes happen here as each
+    track arrives, one txn per track
+    """
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=labelFetchThreads, pool_maxsize=labelFetchThreads)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+
+    with session, concurrent.futures.ThreadPoolExecutor(labelFetchThreads) as pool:
+        futures = {pool.submit(fetchLabels, session, coverageUrl): (track, coverageUrl)
+                   for track, coverageUrl in coverageTracks}
+
+        for future in concurrent.futures.as_completed(futures):
+            track, coverageUrl = futures[future]
+
+            # A track with labels which can't be fetched or read is left out rather than failing the whole hub
+            try:
+                labels = future.result()
+            except Exception:
+                log.exception('Failed to fetch the labels of %s from %s', track['track'], coverageUrl)
+                continue
 
-    numLabels = len(group.index)
+            if labels is None or labels.empty:
+                continue
 
-    changes = db.Prediction('changes').get(write=True, txn=txn)
+            saveTrackLabels(labels, user, hub, track, genome, coverageUrl)
 
-    changes = changes + numLabels
 
-    db.Prediction('changes').put(changes, txn=txn)
+def fetchLabels(session, coverageUrl):
+    """Streams the labels.bed which is next to a coverage file into a DataFrame, None if there isn't one"""
+    trackUrl = coverageUrl.rsplit('/', 1)[0]
+    labelUrl = '%s/labels.bed' % trackUrl
+    with session.get(labelUrl, verify=False, stream=True) as r:
+        if not r.status_code == 200:
+            return None
 
-    db.Labels(user, hub, track['track'], chrom).put(group, txn=txn)
+        r.raw.decode_content = True
 
-    chromProblems = Tracks.getProblemsForChrom(genome, chrom, txn)
+        try:
+            # Only the label columns, read_csv puts any extra ones into the index
+            return pd.read_csv(r.raw, sep='\t', header=None, names=Labels.labelColumns,
+                               usecols=range(len(Labels.labelColumns)))
+        except pd.errors.EmptyDataError:
+            return None
 
-    withLabels = chromProblems.apply(checkIfProblemHasLabels, axis=1, args=(group,))
 
-    doPregen = chromProblems[withLabels]
+@retry
+@txnAbortOnError
+def saveTrackLabels(labels, user, hub, track, genome, coverageUrl, txn=None):
+    labels['annotation'] = labels['annotation'].replace('noPeaks', 'noPeak')
 
-    submitPregenWithData(doPregen, user, hub, track, numLabels, coverageUrl, txn)
+    changes = db.Prediction('changes').get(write=True, txn=txn)
 
-    txn.commit()
+    db.Prediction('changes').put(changes + len(labels.index), txn=txn)
 
+    jobs = []
 
-def submitPregenWithData(doPregen, user, hub, track, numLabels, coverageUrl, txn):
-    recs = doPregen.to_dict('records')
-    for problem in recs:
-        problemTxn = db.getTxn(parent=txn)
-        penalties = Models.peakSegDiskPrePenalties
-        job = Jobs.PregenJob(user,
-                             hub,
-                             track['track'],
-                             problem,
-                             penalties,
-                             numLabels,
-                             trackUrl=coverageUrl)
-
-        if job.putNewJob(problemTxn) is None:
-            problemTxn.abort()
-            continue
+    for chrom, group in labels.groupby('chrom'):
+        group = group.sort_values('chromStart', ignore_index=True)
 
-        placeHolders = job.getJobModelSumPlaceholder()
+        db.Labels(user, hub, track['track'], chrom).put(group, txn=txn)
 
-        modelSummaries = db.ModelSummaries(user, hub, track['track'], problem['chrom'],
-                                           problem['chromStart'])
+        chromProblems = Tracks.getProblemsForChrom(genome, chrom, txn)
 
-        modelSummaries.put(placeHolders, txn=problemTxn)
+        withLabels = checkLabelsInBoundsOnChrom(chromProblems, group)
 
-        problemTxn.commit()
+        doPregen = chromProblems[withLabels]
 
+        jobs.extend(createPregenJobs(doPregen, user, hub, track, len(group.index), coverageUrl))
 
-def checkIfProblemHasLabels(problem, labels):
-    inBounds = labels.apply(db.checkInBounds,
-                            axis=1,
-                            args=(problem['chrom'],
-                                  problem['chromStart'],
-                                  problem['chromEnd']))
+    # All of the track's jobs take their ids in one go
+    Jobs.putNewJobsWithPlaceholders(jobs, txn)
 
-    return inBounds.any()
 
+def createPregenJobs(doPregen, user, hub, track, numLabels, coverageUrl):
+    penalties = Models.peakSegDiskPrePenalties
 
-def fixNoPeaks(row):
-    if row['annotation'] == 'noPeaks':
-        return 'noPeak'
-    return row['annotation']
+    return [Jobs.PregenJob(user,
+                           hub,
+                           track['track'],
+                           problem,
+                           penalties,
+                           numLabels,
+                           trackUrl=coverageUrl) for problem in doPregen.to_dict('records')]
 
 
 def getRefSeq(genome, path, includes):
@@ -460,7 +674,8 @@ def getRefSeq(genome, path, includes):
     genomeFaPath = os.path.join(genomePath, genome + '.fa')
     genomeFaiPath = genomeFaPath + '.fai'
 
-    downloadRefSeq(genomeUrl, genomeFaPath, genomeFaiPath)
+    assetUtil.getAsset(genome, 'refSeq', genomePath,
+                       lambda: downloadRefSeq(genomeUrl, genomeFaPath, genomeFaiPath))
 
     genomeConfigPath = os.path.join(genomePath, 'trackList.json')
 
@@ -477,17 +692,34 @@ def getRefSeq(genome, path, includes):
 def downloadRefSeq(genomeUrl, genomeFaPath, genomeFaiPath):
     if not os.path.exists(genomeFaiPath):
         if not os.path.exists(genomeFaPath):
-            with open(genomeFaPath + '.gz', 'wb') as temp:
+            genomeGzPath = genomeFaPath + '.gz'
+
+            with open(genomeGzPath, 'wb') as temp:
                 # Gets FASTA file for genome
-                with requests.get(genomeUrl, allow_redirects=True, verify=False) as r:
-                    temp.write(r.content)
-                    temp.flush()
-                    temp.seek(0)
+                with requests.get(genomeUrl, allow_redirects=True, verify=False, stream=True) as r:
+                    if not r.status_code == 200:
+                        raise assetUtil.AssetBuildError('%s returned %s' % (genomeUrl, r.status_code))
 
-            os.system('gzip -d %s' % genomeFaPath + '.gz')
+                    for chunk in r.iter_content(chunk_size=1 << 20):
+                        temp.write(chunk)
+
+            if os.system('gzip -df %s' % genomeGzPath) != 0:
+                removeFiles(genomeGzPath, genomeFaPath)
+                raise assetUtil.AssetBuildError('Could not unpack %s' % genomeGzPath)
 
         # Run samtools faidx {genome Fasta File}, creating an indexed Fasta file
-        os.system('samtools faidx %s' % genomeFaPath)
+        if os.system('samtools faidx %s' % genomeFaPath) != 0:
+            # The FASTA is most likely truncated, so it is downloaded again next time
+            removeFiles(genomeFaPath, genomeFaiPath)
+            raise assetUtil.AssetBuildError('samtools faidx failed on %s' % genomeFaPath)
+
+    return [genomeFaPath, genomeFaiPath]
+
+
+def removeFiles(*paths):
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
 
 
 def getGeneTracks(genome, dataPath):
@@ -505,30 +737,47 @@ def getGeneTracks(genome, dataPath):
 
     genes = ['ensGene', 'knownGene', 'ncbiRefSeq', 'refGene', 'ccdsGene']
 
-    getDbFiles('trackDb', genesUrl, genesPath)
+    assetUtil.getAsset(genome, 'trackDb', genomePath, lambda: getDbFiles('trackDb', genesUrl, genesPath))
 
     includes = []
 
-    geneThreads = []
+    with concurrent.futures.ThreadPoolExecutor(len(genes)) as pool:
+        futures = {}
+
+        for gene in genes:
+            geneTrackPath = os.path.join(genomePath, gene)
 
-    for gene in genes:
-        geneTrackPath = os.path.join(genomePath, gene)
+            args = (genome, gene, genomePath, genesUrl, genesPath, geneTrackPath)
 
-        args = (gene, genesUrl, genesPath, geneTrackPath)
+            futures[gene] = pool.submit(getGeneTrack, *args)
 
-        geneThread = threading.Thread(target=getAndProcessGeneTrack, args=args)
-        geneThreads.append(geneThread)
-        geneThread.start()
+        for gene in genes:
+            trackListPath = futures[gene].result()
 
-        includes.append(os.path.join(geneTrackPath, 'trackList.json'))
-    for thread in geneThreads:
-        thread.join()
+            # Not every genome has every gene table
+            if trackListPath is not None:
+                includes.append(trackListPath)
 
     return includes
 
 
+def getGeneTrack(genome, gene, genomePath, genesUrl, genesPath, geneTrackPath):
+    """Returns the trackList.json of the gene track, or None if it couldn't be made"""
+    try:
+        files = assetUtil.getAsset(genome, gene, genomePath,
+                                   lambda: getAndProcessGeneTrack(gene, genesUrl, genesPath, geneTrackPath))
+    except assetUtil.AssetBuildError:
+        log.warning('Gene track %s for %s could not be made', gene, genome, exc_info=True)
+        return None
+
+    if files is None:
+        return None
+
+    return os.path.join(geneTrackPath, 'trackList.json')
+
+
 def getAndProcessGeneTrack(gene, genesUrl, genesPath, geneTrackPath):
-    getDbFiles(gene, genesUrl, genesPath)
+    files = getDbFiles(gene, genesUrl, genesPath)
 
     trackListPath = os.path.join(geneTrackPath, 'trackList.json')
 
@@ -544,44 +793,67 @@ def getAndProcessGeneTrack(gene, genesUrl, genesPath, geneTrackPath):
         generateTrack = "%s -q --in %s --out %s --track %s" % (command, genesPath, geneTrackPath, gene)
 
         # This will use Jbrowse perl files to generate a track for that specific gene
-        os.system(generateTrack)
+        if os.system(generateTrack) != 0 or not os.path.exists(trackListPath):
+            raise assetUtil.AssetBuildError('ucsc-to-json.pl failed for %s' % gene)
 
         addGeneCategory(geneTrackPath, 'Reference / Genes')
 
+    return files + [trackListPath]
+
 
 def generateProblemTrack(path):
     trackFolder = '%s/' % path.rsplit('.', 1)[0]
+    genomePath = os.path.dirname(path)
+    genome = os.path.basename(genomePath)
 
+    files = assetUtil.getAsset(genome, 'problemTrack', genomePath, lambda: makeProblemTrack(path, trackFolder))
+
+    if files is None:
+        return
+
+    return os.path.join(trackFolder, 'trackList.json')
+
+
+def makeProblemTrack(path, trackFolder):
     if not os.path.exists(trackFolder):
         try:
             os.makedirs(trackFolder)
         except OSError:
             return
 
-        command = os.path.join(cfg.jbrowsePath, 'bin', 'flatfile-to-json.pl')
+    command = os.path.join(cfg.jbrowsePath, 'bin', 'flatfile-to-json.pl')
 
-        generateTrack = '%s --bed %s --out %s --trackLabel Contigs' % (command, path, trackFolder)
+    generateTrack = '%s --bed %s --out %s --trackLabel Contigs' % (command, path, trackFolder)
 
-        # Will generate a jbrowse track using the problems.bed flatfile
-        os.system(generateTrack)
+    trackListPath = os.path.join(trackFolder, 'trackList.json')
 
-        addGeneCategory(trackFolder, 'Reference')
+    # Will generate a jbrowse track using the problems.bed flatfile
+    if os.system(generateTrack) != 0 or not os.path.exists(trackListPath):
+        raise assetUtil.AssetBuildError('flatfile-to-json.pl failed for %s' % path)
 
-    return os.path.join(trackFolder, 'trackList.json')
+    addGeneCategory(trackFolder, 'Reference')
+
+    return [trackListPath]
 
 
 def getDbFiles(name, url, output):
     files = ['%s.txt.gz' % name, '%s.sql' % name]
 
+    paths = []
+
     for file in files:
         path = os.path.join(output, file)
+        paths.append(path)
         if not os.path.exists(path):
             with requests.get(url + file, allow_redirects=True, verify=False) as r:
+                # Don't save the error page as if it was the file
                 if not r.status_code == 200:
-                    print("getDbFile Error", r.status_code)
+                    raise assetUtil.AssetBuildError('%s returned %s' % (url + file, r.status_code))
                 with open(path, 'wb') as f:
                     f.write(r.content)
 
+    return paths
+
 
 def addGeneCategory(genePath, label):
     confFile = os.path.join(genePath, 'trackList.json')
@@ -702,12 +974,7 @@ def readUCSCLines(lines):
 
 
 def generateProblems(genome, path, txn=None):
-    genesUrl = "%s%s/database/" % (cfg.geneUrl, genome)
     genomePath = os.path.join(path, 'genomes', genome)
-    outputFile = os.path.join(genomePath, 'problems.bed')
-
-    if db.Problems.has_key(genome):
-        return outputFile
 
     if not os.path.exists(genomePath):
         try:
@@ -715,6 +982,21 @@ def generateProblems(genome, path, txn=None):
         except OSError:
             return
 
+    files = assetUtil.getAsset(genome, 'problems', genomePath, lambda: makeProblems(genome, genomePath, txn))
+
+    if files is None:
+        return
+
+    return files[0]
+
+
+def makeProblems(genome, genomePath, txn=None):
+    genesUrl = "%s%s/database/" % (cfg.geneUrl, genome)
+    outputFile = os.path.join(genomePath, 'problems.bed')
+
+    if db.hasKey(db.Problems, (genome,)) and os.path.exists(outputFile):
+        return [outputFile]
+
     files = []
 
     for file in ['chromInfo', 'gap']:
@@ -750,12 +1032,17 @@ def generateProblems(genome, path, txn=None):
     problemsTxn = db.getTxn(parent=txn)
 
     db.Problems(genome).put(output, txn=problemsTxn)
+    db.ChromProblems.putGenome(genome, output, txn=problemsTxn)
 
     problemsTxn.commit()
 
     output.to_csv(outputFile, sep='\t', index=False, header=False)
 
-    return outputFile
+    # The problem track is made from problems.bed so it needs making again
+    if db.hasKey(db.GenomeAsset, (genome, 'problemTrack')):
+        db.GenomeAsset(genome, 'problemTrack').put(None)
+
+    return [outputFile]
 
 
 def createNanProblems(args):
@@ -787,6 +1074,8 @@ def downloadAndUnpackFile(url, path):
         with tempfile.NamedTemporaryFile(suffix='.txt.gz') as temp:
             # Gets FASTA file for genome
             with requests.get(url, allow_redirects=True, verify=False) as r:
+                if not r.status_code == 200:
+                    raise assetUtil.AssetBuildError('%s returned %s' % (url, r.status_code))
                 temp.write(r.content)
                 temp.flush()
                 temp.seek(0)
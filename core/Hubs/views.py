@@ -1,9 +1,11 @@
 import json
+import pandas as pd
 from core.Hubs import Hubs
 from core.Labels import Labels
 from pyramid_google_login import *
 from pyramid.view import view_config
 from pyramid.response import Response
+from core.util import binaryUtil
 
 
 @view_config(route_name='hubInfo', request_method='GET', renderer='website:hubInfo.html')
@@ -27,6 +29,51 @@ def getHubInfo(request):
     return Response(status=404)
 
 
+@view_config(route_name='hubTrackFeatures', request_method='GET')
+def getTracksFeatures(request):
+    query = request.matchdict
+    query['ref'] = request.params['ref']
+    query['start'] = int(request.params['start'])
+    query['end'] = int(request.params['end'])
+    query['tracks'] = request.params['tracks'].split(',')
+    query['currentUser'] = request.authenticated_userid
+
+    if 'handlers' in request.params:
+        query['handlers'] = request.params['handlers'].split(',')
+
+    try:
+        query['modelType'] = request.params['modelType']
+    except KeyError:
+        query['modelType'] = 'NONE'
+
+    # Only really needed when generating alternative models
+    try:
+        query['scale'] = float(request.params['scale'])
+        query['visibleStart'] = int(request.params['visibleStart'])
+        query['visibleEnd'] = int(request.params['visibleEnd'])
+    except KeyError:
+        pass
+
+    output = Hubs.getTracksFeatures(query)
+
+    if request.headers.get('Accept') == binaryUtil.contentType:
+        tables = []
+        for track, trackOutput in output.items():
+            for handler, features in trackOutput.items():
+                if isinstance(features, list):
+                    features = pd.DataFrame()
+                tables.append(('%s\t%s' % (track, handler), features))
+
+        return Response(body=binaryUtil.tablesToBinary(tables), content_type=binaryUtil.contentType)
+
+    for trackOutput in output.values():
+        for handler, features in trackOutput.items():
+            if not isinstance(features, list):
+                trackOutput[handler] = features.to_dict('records')
+
+    return Response(json.dumps(output), charset='utf8', content_type='application/json')
+
+
 @view_config(route_name='jbrowseJson', request_method='GET')
 def getJbrowseJsons(request):
     query = request.matchdict
@@ -62,6 +109,19 @@ def deleteHub(request):
     return HTTPFound(location=url)
 
 
+@view_config(route_name='hubIngest', request_method='GET', renderer='json')
+def getHubIngest(request):
+    query = request.matchdict
+    query['currentUser'] = request.authenticated_userid
+
+    output = Hubs.getIngestStatus(query)
+
+    if output is None:
+        return Response(status=404)
+
+    return output
+
+
 @view_config(route_name='uploadHubUrl', request_method='PUT', renderer='json')
 def uploadHubUrl(request):
     try:
@@ -75,6 +135,9 @@ def uploadHubUrl(request):
 
     print('uhu out')
 
+    if output is not None and 'error' in output:
+        request.response.status = 409
+
     return output
 
 
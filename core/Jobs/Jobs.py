@@ -96,8 +96,17 @@ class Job(metaclass=JobType):
 
     def putNewJob(self, txn):
         """puts Job into job list if the job doesn't exist"""
+        return self.putNewJobWithId(db.JobInfo('Id').incrementId(txn=txn), txn)
 
-        self.id = str(db.JobInfo('Id').incrementId(txn=txn))
+    def putNewJobWithId(self, jobId, txn):
+        """Puts the job with an id which has already been taken from the id counter
+
+        Returns None without putting the job if all of its work is already waiting in other jobs
+        """
+        if not self.removeWaitingWork(txn):
+            return None
+
+        self.id = str(jobId)
         self.iteration = str(db.Iteration(self.user,
                                           self.hub,
                                           self.track,
@@ -110,6 +119,41 @@ class Job(metaclass=JobType):
 
         return self.id
 
+    def removeWaitingWork(self, txn):
+        """Removes the work which is already waiting in other jobs from this job's tasks
+
+        The jobs which have that work get this job's priority if it is higher. Returns whether there is work left
+        """
+        checkJobWorkIndexed(txn=txn)
+
+        waiting = {}
+
+        for key in db.JobWork.jobWork(self):
+            if db.hasKey(db.JobWork, key, txn=txn):
+                waiting[key[-1]] = db.JobWork(*key).get(txn=txn)
+
+        if not waiting:
+            return True
+
+        for jobId in set(waiting.values()):
+            raiseJobPriority(jobId, self.priority, txn=txn)
+
+        for taskId, task in list(self.tasks.items()):
+            taskType = task['type'].lower()
+
+            if taskType == 'model':
+                if task['penalty'] in waiting:
+                    del self.tasks[taskId]
+            elif taskType == 'multimodel':
+                task['penalties'] = [penalty for penalty in task['penalties'] if penalty not in waiting]
+
+                if not task['penalties']:
+                    del self.tasks[taskId]
+            elif taskType in waiting:
+                del self.tasks[taskId]
+
+        return len(self.tasks) > 0
+
     def equals(self, jobToCheck):
         """Check if current job is equal to the job to check"""
         if self.user != jobToCheck.user:
@@ -140,17 +184,15 @@ class Job(metaclass=JobType):
                 task.status = 'Queued'
 
     def updateTask(self, task, txn=None):
-        """Updates a task given a dict with keys to put/update"""
+        """Updates a task given a dict with keys to put/update, None if the job doesn't have the task"""
         taskToUpdate = None
         for key in self.tasks.keys():
-            taskToUpdate = self.tasks[key]
-            updateId = int(taskToUpdate['taskId'])
-            taskId = int(task['taskId'])
-            if updateId == taskId:
+            if int(self.tasks[key]['taskId']) == int(task['taskId']):
+                taskToUpdate = self.tasks[key]
                 break
 
         if taskToUpdate is None:
-            raise Exception
+            return None
 
         for key in task.keys():
             taskToUpdate[key] = task[key]
@@ -216,6 +258,9 @@ class Job(metaclass=JobType):
 
             if task['type'].lower() == 'model':
                 out = out.append(Models.getErrorSeries(task['penalty'], -1, -1), ignore_index=True)
+            elif task['type'].lower() == 'multimodel':
+                for penalty in task['penalties']:
+                    out = out.append(Models.getErrorSeries(penalty, -1, -1), ignore_index=True)
 
         return out
 
@@ -276,6 +321,18 @@ def createModelTask(taskId, penalty):
     return output
 
 
+def createMultiModelTask(taskId, penalties):
+    """Task for running every penalty on the same coverage in one go"""
+    output = {
+        'status': 'New',
+        'type': 'multiModel',
+        'taskId': str(taskId),
+        'penalties': [str(penalty) for penalty in penalties]
+    }
+
+    return output
+
+
 def createFeatureTask(taskId):
     output = {
         'status': 'New',
@@ -310,9 +367,8 @@ class GridSearchJob(Job):
     def __init__(self, user, hub, track, problem, penalties, priority, trackUrl=None, tasks=None):
         if tasks is None:
             tasks = {}
-        for penalty in penalties:
-            taskId = str(len(tasks.keys()))
-            tasks[taskId] = createModelTask(taskId, penalty)
+        taskId = str(len(tasks.keys()))
+        tasks[taskId] = createMultiModelTask(taskId, penalties)
         super().__init__(user, hub, track, problem, priority, trackUrl=trackUrl, tasks=tasks)
 
 
@@ -328,7 +384,12 @@ class PregenJob(GridSearchJob):
 
         super().__init__(user, hub, track, problem, penalties, priority, trackUrl=trackUrl, tasks=tasks)
 
-    def putNewJob(self, txn):
+    def putNewJobWithId(self, jobId, txn):
+        output = super().putNewJobWithId(jobId, txn)
+
+        if output is None:
+            return None
+
         # Put placeholder features
         featureKey = (self.user,
                     self.hub,
@@ -337,39 +398,43 @@ class PregenJob(GridSearchJob):
                     self.problem['chromStart'])
         db.Features(*featureKey).put(pd.Series(), txn)
 
-        return super().putNewJob(txn)
+        return output
 
 
-timeUntilRestart = 3600
+def putNewJobs(jobs, txn):
+    """Puts many new jobs, reserving a range of ids with one update of the id counter rather than one per job
 
+    Returns the ids of the jobs, None for those which were merged into jobs already waiting. Their reserved ids go
+    unused
+    """
+    if len(jobs) < 1:
+        return []
 
-@retry
-@txnAbortOnError
-def checkRestartJobs(data, txn=None):
-    jobKeys = db.Job.db_key_tuples()
+    firstId = db.JobInfo('Id').reserveIds(len(jobs), txn=txn)
 
-    currentTime = time.time()
+    return [job.putNewJobWithId(firstId + offset, txn) for offset, job in enumerate(jobs)]
 
-    for key in jobKeys:
-        jobTxn = db.getTxn(parent=txn)
-        jobDb = db.Job(*key)
-        jobToCheck = jobDb.get(txn=jobTxn, write=True)
 
-        try:
-            timeDiff = currentTime - jobToCheck.lastModified
-        except AttributeError:
-            jobToCheck.lastModified = time.time()
-            jobDb.put(jobToCheck, txn=jobTxn)
-            jobTxn.commit()
-            continue
+def putNewJobsWithPlaceholders(jobs, txn):
+    """Puts new jobs along with placeholder model summaries for the models they will make"""
+    ids = putNewJobs(jobs, txn)
 
-        if timeDiff > timeUntilRestart:
-            jobToCheck.restartUnfinished()
-            jobDb.put(jobToCheck, txn=jobTxn)
-            jobTxn.commit()
+    for job, jobId in zip(jobs, ids):
+        if jobId is None:
             continue
 
-        jobTxn.abort()
+        modelSummaries = db.ModelSummaries(job.user, job.hub, job.track, job.problem['chrom'],
+                                           job.problem['chromStart'])
+
+        modelSummaries.put(job.getJobModelSumPlaceholder(), txn=txn)
+
+    return ids
+
+
+timeUntilRestart = 3600
+
+# Most tasks one lease request can take, the queue is locked while they are taken
+maxLeaseCount = 100
 
 
 @retry
@@ -404,12 +469,48 @@ def restartJob(data, txn=None):
 @txnAbortOnError
 def updateTask(data, txn=None):
     """Updates a task given the job/task id and stuff to update it with"""
-    jobId = data['id']
-    task = data['task']
+    return updateJobTask(data['id'], data['task'], txn=txn)
+
+
+@retry
+@txnAbortOnError
+def updateTasks(data, txn=None):
+    """Updates a batch of tasks, each task having the id of the job it belongs to
+
+    A task which can't be updated gets an entry with an error in the output, the rest of the batch is still updated
+    """
+    output = []
+
+    for task in data['tasks']:
+        task = dict(task)
+        jobId = task.pop('id', None)
+
+        output.append(updateJobTask(jobId, task, txn=txn))
+
+    return output
+
+
+def updateJobTask(jobId, task, txn=None):
+    """Updates a task of a job, returning the task with an error if the job or the task doesn't exist"""
+    # The job could have been finished or removed since the task was leased
+    if jobId is None or not db.hasKey(db.Job, (jobId,), txn=txn, write=True):
+        return {'id': jobId, 'taskId': task.get('taskId'), 'error': 'Job not found'}
+
+    if 'taskId' not in task:
+        return {'id': jobId, 'taskId': None, 'error': 'Task not found'}
 
     jobDb = db.Job(jobId)
     jobToUpdate = jobDb.get(txn=txn, write=True)
-    task = jobToUpdate.updateTask(task, txn=txn)
+    updated = jobToUpdate.updateTask(task, txn=txn)
+
+    if updated is None:
+        return {'id': jobId, 'taskId': task['taskId'], 'error': 'Task not found'}
+
+    task = updated
+
+    if task['status'].lower() in ['done', 'error']:
+        releaseLease(jobId, task, txn=txn)
+
     if jobToUpdate.status.lower() == 'done':
         jobDb.put(None, txn=txn)
         db.DoneJob(jobId).put(jobToUpdate, txn=txn)
@@ -432,58 +533,188 @@ def getJob(data, txn=None):
 @retry
 @txnAbortOnError
 def queueNextTask(data, txn=None):
-    db.Job.syncDb()
+    checkJobQueueIndexed(txn=txn)
 
-    cursor = db.Job.getCursor(txn=txn, bulk=True)
+    reclaimExpiredLeases(txn=txn)
 
-    job, key, cursorAtBest = getJobWithHighestPriority(cursor)
+    return queueTask(timeUntilRestart, txn=txn)
 
-    if job is None:
-        return
+
+@retry
+@txnAbortOnError
+def leaseTasks(data, txn=None):
+    """Queues up to count tasks at once, each leased to the worker for leaseTime seconds"""
+    count = min(int(data.get('count', 1)), maxLeaseCount)
+    leaseTime = int(data.get('leaseTime', timeUntilRestart))
+
+    checkJobQueueIndexed(txn=txn)
+
+    reclaimExpiredLeases(txn=txn)
+
+    tasks = []
+
+    while len(tasks) < count:
+        task = queueTask(leaseTime, txn=txn)
+
+        if task is None:
+            break
+
+        tasks.append(task)
+
+    return tasks
+
+
+def queueTask(leaseTime, txn=None):
+    """Queues the next new task from the highest priority job and leases it"""
+    while True:
+        queueKey = db.JobQueue.first('New', txn=txn)
+
+        if queueKey is None:
+            return
+
+        status, priority, jobId = queueKey
+
+        jobDb = db.Job(jobId)
+        job = jobDb.get(txn=txn, write=True)
+
+        if isinstance(job, Job) and job.status.lower() == 'new':
+            break
+
+        # The queue is out of date for this job, so put it where it belongs and try the next one
+        db.JobQueue(*queueKey).put(None, txn=txn)
+        db.JobQueue.updateJob(jobId, None, job, txn=txn)
 
     key = getNextTaskInJob(job)
 
     taskToUpdate = job.tasks[key]
 
     taskToUpdate['status'] = 'Queued'
+    taskToUpdate['leaseExpires'] = int(time.time() + leaseTime)
 
     job.updateJobStatus()
 
-    cursorAtBest.put(key, job)
+    jobDb.put(job, txn=txn)
 
-    cursorAtBest.close()
+    db.TaskLease(taskToUpdate['leaseExpires'], jobId, taskToUpdate['taskId']).put(jobId, txn=txn)
 
-    task = job.addJobInfoOnTask(taskToUpdate)
+    task = job.addJobInfoOnTask(dict(taskToUpdate))
 
     return task
 
 
-def getJobWithHighestPriority(cursor):
-    jobWithTask = None
-    keyWithTask = None
-    cursorAtBest = None
+def releaseLease(jobId, task, txn=None):
+    """Removes the lease on a task which was finished by the worker"""
+    if 'leaseExpires' not in task:
+        return
 
-    current = cursor.next(flags=berkeleydb.db.DB_RMW)
+    leaseKey = (task.pop('leaseExpires'), jobId, task['taskId'])
+
+    if db.hasKey(db.TaskLease, leaseKey, txn=txn, write=True):
+        db.TaskLease(*leaseKey).put(None, txn=txn)
+
+
+@retry
+@txnAbortOnError
+def reclaimLeases(data, txn=None):
+    reclaimExpiredLeases(txn=txn)
+
+
+def reclaimExpiredLeases(txn=None):
+    """Puts tasks whose lease ran out back to new so another worker can pick them up"""
+    for leaseKey in db.TaskLease.expired(time.time(), txn=txn):
+        expires, jobId, taskId = leaseKey
+
+        db.TaskLease(*leaseKey).put(None, txn=txn)
+
+        jobDb = db.Job(jobId)
+        job = jobDb.get(txn=txn, write=True)
+
+        if not isinstance(job, Job):
+            continue
+
+        task = job.tasks.get(taskId)
+
+        # The task may have been restarted and leased again since this lease was made
+        if task is None or task.get('leaseExpires') != expires:
+            continue
+
+        del task['leaseExpires']
+
+        if task['status'].lower() in ['done', 'error']:
+            continue
+
+        task['status'] = 'New'
+
+        job.updateJobStatus()
+        job.lastModified = time.time()
+
+        jobDb.put(job, txn=txn)
+
+
+def checkJobQueueIndexed(txn=None):
+    """Adds the jobs which were created before the job queue existed to the queue"""
+    queueIndexed = db.JobInfo('queueIndexed')
+
+    if queueIndexed.get(txn=txn):
+        return
+
+    if queueIndexed.get(txn=txn, write=True):
+        return
+
+    cursor = db.Job.getCursor(txn=txn, bulk=True)
+
+    current = cursor.next()
 
     while current is not None:
         key, job = current
 
-        if job.status.lower() == 'new':
-            if jobWithTask is None:
-                jobWithTask = job
-                keyWithTask = key
-                cursorAtBest = cursor.dup()
+        db.JobQueue.updateJob(key[0], None, job, txn=txn)
 
-            elif jobWithTask.getPriority() < job.getPriority():
-                jobWithTask = job
-                keyWithTask = key
-                cursorAtBest.close()
-                cursorAtBest = cursor.dup()
+        current = cursor.next()
+
+    cursor.close()
 
-        current = cursor.next(flags=berkeleydb.db.DB_RMW)
+    queueIndexed.put(1, txn=txn)
+
+
+def checkJobWorkIndexed(txn=None):
+    """Adds the work of the jobs which were created before the work index existed"""
+    workIndexed = db.JobInfo('workIndexed')
+
+    if workIndexed.get(txn=txn):
+        return
+
+    if workIndexed.get(txn=txn, write=True):
+        return
+
+    cursor = db.Job.getCursor(txn=txn, bulk=True)
+
+    current = cursor.next()
+
+    while current is not None:
+        key, job = current
+
+        db.JobWork.updateJob(key[0], None, job, txn=txn)
+
+        current = cursor.next()
 
     cursor.close()
-    return jobWithTask, keyWithTask, cursorAtBest
+
+    workIndexed.put(1, txn=txn)
+
+
+def raiseJobPriority(jobId, priority, txn=None):
+    """Raises a waiting job's priority when more work is merged into it"""
+    jobDb = db.Job(jobId)
+    job = jobDb.get(txn=txn, write=True)
+
+    if not isinstance(job, Job) or job.priority >= int(priority):
+        return
+
+    job.priority = int(priority)
+    job.lastModified = time.time()
+
+    jobDb.put(job, txn=txn)
 
 
 def getNextTaskInJob(job):
@@ -629,9 +860,10 @@ try: # pragma: no cover
         spawnJobs(num)
 
 
-    @uwsgidecorators.timer(3600, target='mule')
-    def start_restart_jobCheck(num):
-        checkRestartJobs(num)
+    # Tasks are leased to workers, so unfinished tasks are restarted once their lease runs out
+    @uwsgidecorators.timer(60, target='mule')
+    def start_lease_reclaimer(num):
+        reclaimLeases(num)
 
 except ModuleNotFoundError: # pragma: no cover
     print('Running in none uwsgi mode, Jobs wont automatically be spawned or restarted')
@@ -657,11 +889,15 @@ def cleanJobs(data, txn=None):
         if job.status.lower() == 'done':
             jobTxn = db.getTxn(txn)
             db.DoneJob(*key).put(job, txn=jobTxn)
+            db.JobQueue.removeJob(key[0], job, txn=jobTxn)
+            db.JobWork.removeJob(key[0], job, txn=jobTxn)
             jobTxn.commit()
             cursor.delete()
 
         # Delete the predict jobs, predict jobs were removed
         elif job.jobType.lower() == 'predict':
+            db.JobQueue.removeJob(key[0], job, txn=txn)
+            db.JobWork.removeJob(key[0], job, txn=txn)
             cursor.delete()
 
         current = cursor.next()
@@ -683,45 +919,31 @@ def spawnJobs(data, txn=None):
 
 
 def getNoCorrectModelsJobs(txn=None):
-    modelSumCursor = db.ModelSummaries.getCursor(txn, bulk=True)
-
     numJobs = 0
 
-    currentSum = modelSumCursor.next()
-
-    while currentSum is not None:
-        key, modelSum = currentSum
-
-        # These values are checked due to how Models::getErrorSeries works
-        errorModels = modelSum[modelSum['numPeaks'] == -1]
-        processingModels = errorModels[errorModels['errors'] == -1]
-
-        if len(processingModels.index) > 0:
-            currentSum = modelSumCursor.next()
-            continue
+    # Only the problems which aren't processing and don't have a zero error model
+    for key in db.ModelStatusIndex.problems('refine', txn=txn):
+        modelSumsDb = db.ModelSummaries(*key)
+        modelSum = modelSumsDb.get(txn=txn, write=True)
 
         job = jobToRefine(key, modelSum, txn=txn)
 
-        if job is not None:
+        if job is not None and job.putNewJob(txn=txn) is not None:
             placeHolder = job.getJobModelSumPlaceholder()
 
-            modelSumCursor.put(key, addModelSummaries(modelSum, placeHolder))
-
-            job.putNewJob(txn=txn)
+            modelSumsDb.put(addModelSummaries(modelSum, placeHolder), txn=txn)
 
             numJobs += 1
 
         if numJobs >= cfg.maxJobsToSpawn:
             break
 
-        currentSum = modelSumCursor.next()
-
-    modelSumCursor.close()
-
     return numJobs
 
 
 def checkForPredictJobs(numJobs, txn=None):
+    predictor = Models.getPredictor(txn=txn)
+
     hubInfoCursor = db.HubInfo.getCursor(txn=txn, bulk=True)
 
     current = hubInfoCursor.next()
@@ -734,56 +956,63 @@ def checkForPredictJobs(numJobs, txn=None):
         problems = db.Problems(hubInfo['genome']).get(txn=txn)
 
         for track in hubInfo['tracks']:
+            toPredict = []
+
             for problemRowKey, row in problems.iterrows():
                 featureKey = (user, hub, track, row['chrom'], str(row['chromStart']))
 
                 # If the feature already exists, then make a single model job
-                if db.Features.has_key(featureKey, txn=txn):
+                if db.hasKey(db.Features, featureKey, txn=txn):
                     feature = db.Features(*featureKey).get(txn=txn)
                     if len(feature.keys()) < 1:
                         # The feature vec is currently being processed
                         continue
 
-                    predictionModel = db.Prediction('model').get(txn=txn)
+                    if predictor is None:
+                        continue
+
+                    toPredict.append((row, feature))
+                else:
+                    outputJob = FeatureJob(user, hub, track, row.to_dict())
 
-                    if not isinstance(predictionModel, dict):
+                    if outputJob.putNewJob(txn=txn) is None:
                         continue
 
-                    colsToDrop = db.Prediction('badCols').get(txn=txn)
+                    featureTxn = db.getTxn(parent=txn)
+
+                    db.Features(*featureKey).put(pd.Series(), txn=featureTxn)
+
+                    featureTxn.commit()
+
+                    numJobs += 1
+
+                if numJobs >= cfg.maxJobsToSpawn:
+                    break
 
-                    featuresDropped = feature.drop(labels=colsToDrop)
+            if toPredict:
+                # Every problem of the track is predicted at once
+                predictions = Models.predictPenalties(predictor, [feature for row, feature in toPredict])
 
-                    prediction = Models.predictWithFeatures(featuresDropped, predictionModel)
+                for (row, feature), prediction in zip(toPredict, predictions):
+                    if numJobs >= cfg.maxJobsToSpawn:
+                        break
 
-                    if prediction is None:
+                    if np.isnan(prediction):
                         continue
 
                     penaltyToUse = float(10**prediction)
 
                     job = SingleModelJob(user, hub, track, row.to_dict(), penaltyToUse, 0)
 
-                    job.putNewJob(txn=txn)
+                    if job.putNewJob(txn=txn) is None:
+                        continue
 
                     placeHolder = job.getJobModelSumPlaceholder()
 
                     db.ModelSummaries(user, hub, track, row['chrom'], row['chromStart']).add(placeHolder, txn=txn)
 
                     numJobs += 1
-                else:
-                    outputJob = FeatureJob(user, hub, track, row.to_dict())
 
-                    outputJob.putNewJob(txn=txn)
-
-                    featureTxn = db.getTxn(parent=txn)
-
-                    db.Features(*featureKey).put(pd.Series(), txn=featureTxn)
-
-                    featureTxn.commit()
-
-                    numJobs += 1
-
-                if numJobs >= cfg.maxJobsToSpawn:
-                    break
             if numJobs >= cfg.maxJobsToSpawn:
                 break
         if numJobs >= cfg.maxJobsToSpawn:
@@ -814,9 +1043,7 @@ def jobToRefine(key, modelSums, txn=None):
 
     genome = db.HubInfo(user, hub).get(txn=txn)['genome']
 
-    problems = db.Problems(genome).get(txn=txn)
-
-    chrom = problems[problems['chrom'] == ref]
+    chrom = Tracks.getProblemsForChrom(genome, ref, txn=txn)
     start = chrom[chrom['chromStart'] == int(start)]
 
     problem = start.to_dict('records')[0]
@@ -969,16 +1196,3 @@ def submitSearch(data, problem, bottom, top, regions, txn=None):
                           problem,
                           penalty,
                           regions)
-
-
-if cfg.testing:
-    @retry
-    @txnAbortOnError
-    def makeJobHaveBadTime(data, txn=None):
-        jobDb = db.Job('0')
-        job = jobDb.get(txn=txn, write=True)
-
-        job.lastModified = 0
-        job.status = 'Queued'
-
-        jobDb.put(job.__dict__(), txn=txn)
@@ -45,6 +45,28 @@ def queueNextTask(request):
         return Response(json.dumps(task), charset='utf8', content_type='application/json')
 
 
+@view_config(route_name='jobLease', request_method='POST')
+def leaseTasks(request):
+    data = {}
+
+    if request.body:
+        data = request.json_body
+
+    tasks = Jobs.leaseTasks(data)
+
+    if len(tasks) < 1:
+        return Response(status=204)
+    else:
+        return Response(json.dumps(tasks), charset='utf8', content_type='application/json')
+
+
+@view_config(route_name='jobTasks', request_method='POST', renderer='json')
+def updateTasks(request):
+    data = {'tasks': request.json_body}
+
+    return Jobs.updateTasks(data)
+
+
 @view_config(route_name='jobsWithId', request_method='GET', renderer='website:stats/job.html')
 @jobOutput
 def getJobWithId(request):
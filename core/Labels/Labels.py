@@ -1,7 +1,7 @@
 import time
 
 import pandas as pd
-from core.util import PLdb as db
+from core.util import PLdb as db, intervalUtil as iu
 from core.Models import Models
 from simpleBDB import retry, txnAbortOnError
 
@@ -25,7 +25,7 @@ def addLabel(data, txn=None):
         labelsDb = db.Labels(data['user'], data['hub'], data['track'], data['ref'])
         labels = labelsDb.get(txn=txn, write=True)
         if not labels.empty:
-            inBounds = labels.apply(db.checkInBounds, axis=1, args=(data['ref'], data['start'], data['end']))
+            inBounds = iu.dfInBounds(labels, data['ref'], data['start'], data['end'])
             # If there are any labels currently stored within the region which the new label is being added
             if inBounds.any():
                 raise db.AbortTXNException
@@ -64,7 +64,7 @@ def addHubLabels(data, txn=None):
             labelsDb = db.Labels(data['user'], data['hub'], data['track'], data['ref'])
             labels = labelsDb.get(txn=trackTxn, write=True)
             if not labels.empty:
-                inBounds = labels.apply(db.checkInBounds, axis=1, args=(data['ref'], data['start'], data['end']))
+                inBounds = iu.dfInBounds(labels, data['ref'], data['start'], data['end'])
                 # If there are any labels currently stored within the region which the new label is being added
                 if inBounds.any():
                     trackTxn.abort()
@@ -178,6 +178,11 @@ def updateHubLabels(data, txn=None):
 @retry
 @txnAbortOnError
 def getLabels(data, txn=None):
+    return labelsInBounds(data, txn)
+
+
+def labelsInBounds(data, txn):
+    """getLabels with an existing txn"""
     labels = db.Labels(data['user'], data['hub'], data['track'], data['ref'])
     labelsDf = labels.getInBounds(data['ref'], data['start'], data['end'], txn=txn)
     if len(labelsDf.index) < 1:
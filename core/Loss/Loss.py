@@ -24,15 +24,19 @@ def putLoss(data, txn=None):
     track = lossInfo['track']
     problem = lossInfo['problem']
 
-    lossData = pd.read_json(data['lossData'])
+    putLossData(user, hub, track, problem, penalty, data['lossData'], txn=txn)
+
+    return True
+
+
+def putLossData(user, hub, track, problem, penalty, lossJson, txn=None):
+    lossData = pd.read_json(lossJson)
     lossData['meanLoss'] = lossData['meanPenalizedCost'] - lossData['peaks']*lossData['penalty']
 
     lossDb = db.Loss(user, hub, track, problem['chrom'], problem['chromStart'], penalty)
 
     lossDb.put(lossData, txn=txn)
 
-    return True
-
 
 @retry
 @txnAbortOnError
@@ -1,3 +1,4 @@
+import math
 import LOPART
 import FLOPART
 import logging
@@ -7,14 +8,19 @@ import pandas as pd
 from simpleBDB import retry, txnAbortOnError
 
 log = logging.getLogger(__name__)
-from glmnet_python import cvglmnetPredict
-from core.util import PLConfig as cfg, PLdb as db, bigWigUtil as bw
+from glmnet_python import cvglmnetCoef
+from core.util import PLConfig as cfg, PLdb as db, bigWigUtil as bw, intervalUtil as iu
 from core.Handlers import Tracks
 from core.Jobs import Jobs
+from core.Loss import Loss
 
 summaryColumns = ['regions', 'fp', 'possible_fp', 'fn', 'possible_fn', 'errors']
+labelErrorColumns = ['penalty', 'chromStart', 'chromEnd', *summaryColumns]
 modelColumns = ['chrom', 'chromStart', 'chromEnd', 'annotation', 'height']
 jbrowseModelColumns = ["ref", "start", "end", "type", "score"]
+
+# The prediction model of this process, and the db.Prediction('modelVersion') it was loaded at
+predictorCache = {'version': None, 'predictor': None}
 peakSegDiskPrePenalties = [1000, 10000, 100000, 1000000]
 flopartLabels = {'noPeak': 0,
                  'peakStart': 1,
@@ -23,92 +29,57 @@ flopartLabels = {'noPeak': 0,
 modelTypes = ['lopart', 'flopart']
 pd.set_option('mode.chained_assignment', None)
 
+# Number of records from before a change to how models are kept which are moved over each time the mule checks
+migrationBatch = 100
+
+try:  # pragma: no cover
+    import uwsgi
+    import uwsgidecorators
+
+    @uwsgidecorators.timer(60, target='mule')
+    def start_model_migrations(num):
+        if db.isLoaded():
+            chunkOldModels()
+            backfillDisplayModels()
+except ModuleNotFoundError:  # pragma: no cover
+    pass
+
 
 @retry
 @txnAbortOnError
 def getModels(data, txn=None):
     problems = Tracks.getProblems(data, txn=txn)
 
+    return getProblemModels(data, problems, txn=txn)
+
+
+def getProblemModels(data, problems, txn=None):
+    """Models for data's track in the problems, so tracks in the same region can share the problem lookup"""
     output = pd.DataFrame()
 
     for problem in problems:
+        problemKey = (data['user'], data['hub'], data['track'], problem['chrom'], problem['chromStart'])
 
-        modelSummaries = db.ModelSummaries(data['user'], data['hub'], data['track'], problem['chrom'],
-                                           problem['chromStart']).get(txn=txn)
+        display = db.DisplayModel(*problemKey).get(txn=txn)
 
-        if len(modelSummaries.index) < 1:
-            altout = generateAltModel(data, problem, txn=txn)
-            if isinstance(altout, pd.DataFrame):
-                output = output.append(altout, ignore_index=True)
-            continue
+        # Problems which backfillDisplayModels hasn't got to yet pick without the prediction, and don't write
+        if display is None:
+            modelSummaries = db.ModelSummaries(*problemKey).get(txn=txn)
 
-        if len(modelSummaries.index) == 1:
-            sum = modelSummaries.iloc[0]
-
-            # This is probably a predict model then
-            if sum['regions'] == 0:
-                penalty = '%g' % sum['penalty'].item()
-                minErrorModelDb = db.Model(data['user'], data['hub'], data['track'], problem['chrom'],
-                                           problem['chromStart'],
-                                           penalty)
-                try:
-                    minErrorModel = minErrorModelDb.get(txn=txn)
-                except KeyError:
-                    log.warning('Missing a model for summary', modelSummaries)
-                    continue
-                minErrorModel = minErrorModel[minErrorModel['annotation'] == 'peak']
-                minErrorModel.columns = jbrowseModelColumns
-
-                output = output.append(minErrorModel, ignore_index=True)
-                continue
-
-        # Remove processing models from ones which can be displayed
-        modelSummaries = modelSummaries[modelSummaries['errors'] >= 0]
+            if len(modelSummaries.index) > 0:
+                display = {'penalty': displayPenalty(problemKey, modelSummaries, predict=False)}
 
-        if len(modelSummaries.index) < 1:
+        if display is None or display['penalty'] is None:
             altout = generateAltModel(data, problem, txn=txn)
             if isinstance(altout, pd.DataFrame):
                 output = output.append(altout, ignore_index=True)
             continue
 
-        nonZeroRegions = modelSummaries[modelSummaries['regions'] > 0]
-
-        if len(nonZeroRegions.index) < 1:
-            altout = generateAltModel(data, problem, txn=txn)
-            if isinstance(altout, pd.DataFrame):
-                output = output.append(altout, ignore_index=True)
+        modelKey = (*problemKey, display['penalty'])
+        minErrorModel = db.ModelPeaks.getInBounds(modelKey, data['ref'], data['start'], data['end'], txn=txn)
+        if minErrorModel is None:
+            log.warning('Missing a model for display %s', modelKey)
             continue
-
-        withPeaks = nonZeroRegions[nonZeroRegions['numPeaks'] > 0]
-
-        if len(withPeaks.index) < 1:
-            altout = generateAltModel(data, problem, txn=txn)
-            if isinstance(altout, pd.DataFrame):
-                output = output.append(altout, ignore_index=True)
-            continue
-
-        noError = withPeaks[withPeaks['errors'] < 1]
-
-        if len(noError.index) < 1:
-            altout = generateAltModel(data, problem, txn=txn)
-            if isinstance(altout, pd.DataFrame):
-                output = output.append(altout, ignore_index=True)
-            continue
-
-        elif len(noError.index) > 1:
-            # Select which model to display from modelSums with 0 error
-            noError = whichModelToDisplay(data, problem, noError)
-
-        penalty = noError['penalty'].iloc[0]
-
-        minErrorModelDb = db.Model(data['user'], data['hub'], data['track'], problem['chrom'], problem['chromStart'],
-                                   penalty)
-        try:
-            minErrorModel = minErrorModelDb.getInBounds(data['ref'], data['start'], data['end'], txn=txn)
-        except KeyError:
-            log.warning('Missing a model for summary', modelSummaries)
-            continue
-        minErrorModel = minErrorModel[minErrorModel['annotation'] == 'peak']
         minErrorModel.columns = jbrowseModelColumns
         output = output.append(minErrorModel, ignore_index=True)
 
@@ -122,55 +93,168 @@ def getModels(data, txn=None):
         return []
 
 
+def displayPenalty(problemKey, modelSummaries, predict=True, txn=None):
+    """Picks the penalty of the model to display for a problem, None if an alternate model should be shown
+
+    Without predict, problems with more than one zero error model pick the one with the fewest peaks
+    """
+    user, hub, track, chrom, chromStart = problemKey
+    data = {'user': user, 'hub': hub, 'track': track}
+    problem = {'chrom': chrom, 'chromStart': chromStart}
+
+    if len(modelSummaries.index) < 1:
+        return None
+
+    if len(modelSummaries.index) == 1:
+        sum = modelSummaries.iloc[0]
+
+        # This is probably a predict model then
+        if sum['regions'] == 0:
+            return '%g' % float(sum['penalty'])
+
+    # Remove processing models from ones which can be displayed
+    modelSummaries = modelSummaries[modelSummaries['errors'] >= 0]
+
+    nonZeroRegions = modelSummaries[modelSummaries['regions'] > 0]
+
+    withPeaks = nonZeroRegions[nonZeroRegions['numPeaks'] > 0]
+
+    noError = withPeaks[withPeaks['errors'] < 1]
+
+    if len(noError.index) < 1:
+        return None
+
+    elif len(noError.index) > 1 and predict:
+        # Select which model to display from modelSums with 0 error
+        noError = whichModelToDisplay(data, problem, noError, txn=txn)
+    elif len(noError.index) > 1:
+        noError = noPredictGuess(noError)
+
+    return noError['penalty'].iloc[0]
+
+
+def modelStatus(modelSums):
+    """Summarizes the ModelSummaries of a problem for db.ModelStatus"""
+    # These values are checked due to how Models::getErrorSeries works
+    placeHolders = modelSums[(modelSums['numPeaks'] == -1) & (modelSums['errors'] == -1)]
+    processing = len(placeHolders.index) > 0
+
+    minError = modelSums['errors'].min()
+    regions = modelSums['regions'].max()
+
+    withPeaks = modelSums[modelSums['numPeaks'] > 0]
+    noError = withPeaks[withPeaks['errors'] < 1]
+
+    if regions < 1:
+        correctPenalties = []
+    else:
+        correctPenalties = noError['penalty'].astype(str).tolist()
+
+    return {'processing': processing,
+            'zeroErrors': len(noError[noError['regions'] > 0].index),
+            'needsRefine': bool(not processing and pd.notna(minError) and minError != 0),
+            'minError': float(minError),
+            'regions': float(regions),
+            'correctPenalties': correctPenalties}
+
+
+def updateDisplayModels():
+    """Picks the display model again for when the prediction model changes
+
+    Only problems with more than one zero error model pick using the prediction, each is updated in its own txn
+    """
+    for key in predictedDisplayProblems():
+        updateDisplayModel(key)
+
+
 @retry
 @txnAbortOnError
-def getHubModels(data, txn=None):
-    modelSumKeys = db.ModelSummaries.keysWhichMatch(data['user'], data['hub'])
+def predictedDisplayProblems(txn=None):
+    db.ModelStatus.build(txn=txn)
 
-    output = pd.DataFrame()
+    output = []
+
+    cursor = db.ModelStatus.getCursor(txn=txn, bulk=True)
+
+    current = cursor.next()
+
+    while current is not None:
+        key, status = current
+
+        if status is not None and status['zeroErrors'] > 1:
+            output.append(key)
+
+        current = cursor.next()
+
+    cursor.close()
+
+    return output
+
+
+@retry
+@txnAbortOnError
+def updateDisplayModel(key, txn=None):
+    modelSums = db.ModelSummaries(*key).get(txn=txn, write=True)
+
+    db.DisplayModel.update(key, modelSums, txn=txn)
+
+
+def getHubModels(data):
+    """Generator of the displayed model for each problem in a hub, one DataFrame per problem
+
+    Each problem is read in its own transaction and yielded, so the models of the whole hub are never in memory
+    at once
+    """
+    modelSumKeys = db.ModelSummaries.keysWhichMatch(data['user'], data['hub'])
 
     for key in modelSumKeys:
-        user, hub, track, ref, start = key
-        currentSum = db.ModelSummaries(*key).get(txn=txn)
+        model = getHubProblemModel(key)
 
-        whichModel = noPredictGuess(currentSum)
+        if model is not None:
+            yield model
 
-        if len(whichModel.index) > 1:
-            whichModel = whichModel[whichModel['penalty'] == whichModel['penalty'].min()]
 
-        penalty = whichModel['penalty'].values[0]
+@retry
+@txnAbortOnError
+def getHubProblemModel(key, txn=None):
+    user, hub, track, ref, start = key
+    currentSum = db.ModelSummaries(*key).get(txn=txn)
 
-        model = db.Model(user, hub, track, ref, start, penalty).get(txn=txn)
+    if len(currentSum.index) < 1:
+        return None
 
-        model['track'] = track
-        model['penalty'] = penalty
+    whichModel = noPredictGuess(currentSum)
 
-        output = output.append(model, ignore_index=True)
+    if len(whichModel.index) > 1:
+        whichModel = whichModel[whichModel['penalty'] == whichModel['penalty'].min()]
 
-    if len(output.index) < 1:
-        return []
+    penalty = whichModel['penalty'].values[0]
 
-    return output
+    model = db.ModelPeaks.getAll((user, hub, track, ref, start, penalty), ref, txn=txn)
+
+    if model is None:
+        return None
+
+    model['track'] = track
+    model['penalty'] = penalty
+
+    return model
 
 
 # Called but using pandas.apply, coverage this isn't picked up in coverage
-def whichModelToDisplay(data, problem, summary):  # pragma: no cover
+def whichModelToDisplay(data, problem, summary, txn=None):  # pragma: no cover
     try:
-        prediction = doPrediction(data, problem)
+        prediction = doPrediction(data, problem, txn=txn)
 
         # If no prediction, use traditional system
         if prediction is None or prediction is False:
-            prediction = noPredictGuess(summary)
+            return noPredictGuess(summary)
 
         logPenalties = np.log10(summary['penalty'].astype(float))
 
-        compared = abs(prediction - logPenalties)
-
-        toDisplay = compared[compared == compared.min()]
-
-        toDisplayIndex = toDisplay.index[0]
+        compared = abs(np.log10(prediction) - logPenalties)
 
-        return pd.DataFrame([summary.iloc[toDisplayIndex]])
+        return summary.loc[[compared.idxmin()]]
     except:
         # This could be better and I could work out the errors more,
         # or I can just use the old reliable method whenever it fails and move on with my life.
@@ -186,6 +270,8 @@ def updateAllModelLabels(data, labels, txn):
 
     problems = Tracks.getProblems(data)
 
+    pregenJobs = []
+
     for problem in problems:
         modelTxn = db.getTxn(parent=txn)
 
@@ -195,39 +281,136 @@ def updateAllModelLabels(data, labels, txn):
         modelsums = modelSummaries.get(txn=modelTxn, write=True)
 
         if len(modelsums.index) < 1:
-
-            out = Jobs.PregenJob(data['user'],
-                                 data['hub'],
-                                 data['track'],
-                                 problem,
-                                 peakSegDiskPrePenalties,
-                                 len(labels.index))
-
-            out.putNewJob(txn=modelTxn)
-            placeHolders = out.getJobModelSumPlaceholder()
-            modelSummaries.put(placeHolders, txn=modelTxn)
+            # The track url is looked up once rather than by every job
+            trackUrl = pregenJobs[0].trackUrl if pregenJobs else None
+
+            pregenJobs.append(Jobs.PregenJob(data['user'],
+                                             data['hub'],
+                                             data['track'],
+                                             problem,
+                                             peakSegDiskPrePenalties,
+                                             len(labels.index),
+                                             trackUrl=trackUrl))
             modelTxn.commit()
             continue
 
-        processedSums = modelsums[modelsums['errors'] >= 0]
+        # Placeholders have -1 peaks, models without any labels have -1 errors but still need updating
+        processedSums = modelsums[modelsums['numPeaks'] >= 0]
 
         # Models being processed but not yet available
         if len(processedSums.index) < 1:
             modelTxn.commit()
             continue
 
-        newSum = modelsums.apply(modelSumLabelUpdate, axis=1, args=(labels, data, problem, modelTxn))
+        labelErrorsDb = db.LabelErrors(data['user'], data['hub'], data['track'], problem['chrom'],
+                                       problem['chromStart'])
+
+        labelErrors = labelErrorsDb.get(txn=modelTxn, write=True)
+
+        newSum, newLabelErrors = modelSumsLabelUpdate(modelsums, labelErrors, labels, data, problem, modelTxn)
 
         modelSummaries.put(newSum, txn=modelTxn)
+        labelErrorsDb.put(newLabelErrors, txn=modelTxn)
 
         modelTxn.commit()
 
+    Jobs.putNewJobsWithPlaceholders(pregenJobs, txn)
+
+
+def modelSumsLabelUpdate(modelsums, labelErrors, labels, data, problem, txn):
+    """Updates the model summaries of a problem for the label at data's start and end being added/updated/removed
+
+    Only the errors for the changed label are recalculated, the errors for the other labels come from labelErrors.
+    If labelErrors doesn't have the other labels for a penalty, then all the labels are recalculated for that penalty
+    """
+    labels = labels[labels['annotation'] != 'unknown']
+    numLabels = len(labels.index)
+
+    labelsInProblem = labels[iu.dfInBounds(labels, problem['chrom'], problem['chromStart'], problem['chromEnd'])]
+    isChangedLabel = ((labelsInProblem['chromStart'] == data['start'])
+                      & (labelsInProblem['chromEnd'] == data['end']))
+    changedLabel = labelsInProblem[isChangedLabel]
+    otherLabelKeys = labelKeys(labelsInProblem[~isChangedLabel])
+
+    if labelErrors.empty:
+        labelErrors = pd.DataFrame(columns=labelErrorColumns)
+
+    isChangedError = (labelErrors['chromStart'] == data['start']) & (labelErrors['chromEnd'] == data['end'])
+    otherErrors = labelErrors[~isChangedError]
+
+    newSums = []
+    newLabelErrors = []
+
+    for index, modelSum in modelsums.iterrows():
+        penalty = str(modelSum['penalty'])
+
+        # Models still being processed get their errors calculated when they are put
+        if modelSum['numPeaks'] < 0:
+            newSums.append(modelSum)
+            newLabelErrors.append(labelErrors[labelErrors['penalty'] == penalty])
+            continue
+
+        penaltyErrors = otherErrors[otherErrors['penalty'] == penalty]
+
+        changedErrors = None
+
+        # The stored errors are only reused if they are for exactly the labels which didn't change
+        if labelKeys(penaltyErrors) == otherLabelKeys:
+            changedErrors = changedLabelErrors(changedLabel, data, problem, penalty, txn)
 
-def modelSumLabelUpdate(modelSum, labels, data, problem, txn):
-    model = db.Model(data['user'], data['hub'], data['track'], problem['chrom'],
-                     problem['chromStart'], modelSum['penalty']).get(txn=txn)
+        if changedErrors is None:
+            modelKey = (data['user'], data['hub'], data['track'], problem['chrom'],
+                        problem['chromStart'], modelSum['penalty'])
+            model = db.ModelPeaks.getAll(modelKey, problem['chrom'], txn=txn)
 
-    return calculateModelLabelError(model, labels, problem, modelSum['penalty'])
+            if model is None:
+                model = pd.DataFrame(columns=modelColumns)
+
+            errorSum, penaltyErrors = calculateModelLabelErrors(model, labels, problem, modelSum['penalty'])
+        else:
+            penaltyErrors = penaltyErrors.append(changedErrors, ignore_index=True)
+
+            errorSum = sumLabelErrors(penaltyErrors, modelSum, numLabels)
+
+        newSums.append(errorSum)
+        newLabelErrors.append(penaltyErrors)
+
+    return pd.DataFrame(newSums).reset_index(drop=True), pd.concat(newLabelErrors, ignore_index=True)
+
+
+def labelKeys(df):
+    """The (chromStart, chromEnd) of each label in a labels or label errors DataFrame, sorted"""
+    return sorted(zip(df['chromStart'].astype(int), df['chromEnd'].astype(int)))
+
+
+def changedLabelErrors(changedLabel, data, problem, penalty, txn):
+    """Calculates the errors for only the label which changed, using the peaks which are around that label"""
+    if changedLabel.empty:
+        return pd.DataFrame(columns=labelErrorColumns)
+
+    modelKey = (data['user'], data['hub'], data['track'], problem['chrom'], problem['chromStart'], penalty)
+    peaks = db.ModelPeaks.getInBounds(modelKey, problem['chrom'], data['start'], data['end'], txn=txn)
+
+    if peaks is None:
+        return
+
+    error = PeakError.error(peaks, changedLabel)
+
+    if error is None:
+        return
+
+    return errorPerLabel(error, penalty)
+
+
+def sumLabelErrors(labelErrors, modelSum, numLabels):
+    if labelErrors.empty:
+        return getErrorSeries(modelSum['penalty'], modelSum['numPeaks'], numLabels)
+
+    errorSum = labelErrors[summaryColumns].sum()
+    errorSum['penalty'] = modelSum['penalty']
+    errorSum['numPeaks'] = modelSum['numPeaks']
+
+    return errorSum
 
 
 @retry
@@ -242,37 +425,87 @@ def putModel(data, txn=None):
     hub = modelInfo['hub']
     track = modelInfo['track']
 
-    db.Model(user, hub, track, problem['chrom'], problem['chromStart'], penalty).put(modelData, txn=txn)
+    modelKey = (user, hub, track, problem['chrom'], problem['chromStart'], penalty)
+    db.ModelPeaks.putModel(modelKey, modelData, txn=txn)
     labels = db.Labels(user, hub, track, problem['chrom']).getInBounds(problem['chrom'],
                                                                        problem['chromStart'],
                                                                        problem['chromEnd'], txn=txn)
-    errorSum = calculateModelLabelError(modelData, labels, problem, penalty)
+    errorSum, labelErrors = calculateModelLabelErrors(modelData, labels, problem, penalty)
     db.ModelSummaries(user, hub, track, problem['chrom'], problem['chromStart']).add(errorSum, txn=txn)
+    db.LabelErrors(user, hub, track, problem['chrom'], problem['chromStart']).putPenalty(penalty, labelErrors, txn=txn)
     return modelInfo
 
 
-def calculateModelLabelError(modelDf, labels, problem, penalty):
+@retry
+@txnAbortOnError
+def putModels(data, txn=None):
+    """Puts the models and losses for many penalties of the same problem at once
+
+    The labels are only loaded once, and the summaries and label errors are only written once
+    """
+    modelInfo = data['modelInfo']
+    problem = modelInfo['problem']
+    user = modelInfo['user']
+    hub = modelInfo['hub']
+    track = modelInfo['track']
+
+    labels = db.Labels(user, hub, track, problem['chrom']).getInBounds(problem['chrom'],
+                                                                       problem['chromStart'],
+                                                                       problem['chromEnd'], txn=txn)
+
+    penalties = []
+    errorSums = []
+    labelErrors = pd.DataFrame(columns=labelErrorColumns)
+
+    for model in data['models']:
+        penalty = model['penalty']
+        modelData = pd.read_json(model['modelData'])
+        modelData.columns = modelColumns
+
+        modelKey = (user, hub, track, problem['chrom'], problem['chromStart'], penalty)
+        db.ModelPeaks.putModel(modelKey, modelData, txn=txn)
+        Loss.putLossData(user, hub, track, problem, penalty, model['lossData'], txn=txn)
+
+        errorSum, penaltyLabelErrors = calculateModelLabelErrors(modelData, labels, problem, penalty)
+
+        penalties.append(penalty)
+        errorSums.append(errorSum)
+        labelErrors = labelErrors.append(penaltyLabelErrors, ignore_index=True)
+
+    if len(penalties) < 1:
+        return modelInfo
+
+    db.ModelSummaries(user, hub, track, problem['chrom'], problem['chromStart']).add(pd.DataFrame(errorSums),
+                                                                                      txn=txn)
+    db.LabelErrors(user, hub, track, problem['chrom'], problem['chromStart']).putPenalties(penalties,
+                                                                                        labelErrors,
+                                                                                        txn=txn)
+    return modelInfo
+
+
+def calculateModelLabelErrors(modelDf, labels, problem, penalty):
+    """Calculates the summary of errors for a model, along with the errors for each label which make up that summary"""
     labels = labels[labels['annotation'] != 'unknown']
     peaks = modelDf[modelDf['annotation'] == 'peak']
-    labelsIsInProblem = labels.apply(db.checkInBounds, axis=1,
-                                     args=(problem['chrom'], problem['chromStart'], problem['chromEnd']))
+    labelsIsInProblem = iu.dfInBounds(labels, problem['chrom'], problem['chromStart'], problem['chromEnd'])
     numPeaks = len(peaks.index)
-    numLabels = len(labelsIsInProblem.index)
+    numLabels = len(labels.index)
+    noLabelErrors = pd.DataFrame(columns=labelErrorColumns)
 
     if numPeaks < 1 > numLabels:
-        return getErrorSeries(penalty, numPeaks, numLabels)
+        return getErrorSeries(penalty, numPeaks, numLabels), noLabelErrors
 
     labelsInProblem = labels[labelsIsInProblem]
 
     numLabelsInProblem = len(labelsInProblem.index)
 
     if numLabelsInProblem < 1:
-        return getErrorSeries(penalty, numPeaks, numLabels)
+        return getErrorSeries(penalty, numPeaks, numLabels), noLabelErrors
 
     error = PeakError.error(peaks, labelsInProblem)
 
     if error is None:
-        return getErrorSeries(penalty, numPeaks, numLabels)
+        return getErrorSeries(penalty, numPeaks, numLabels), noLabelErrors
 
     summary = PeakError.summarize(error)
     summary.columns = summaryColumns
@@ -281,7 +514,28 @@ def calculateModelLabelError(modelDf, labels, problem, penalty):
 
     singleRow = summary.iloc[0]
 
-    return singleRow
+    return singleRow, errorPerLabel(error, penalty)
+
+
+def errorPerLabel(error, penalty):
+    """Summarizes each label of a PeakError.error output on its own
+
+    This is PeakError.summarize of each row, done on the columns all at once
+    """
+    fp = error['fp'].to_numpy()
+    fn = error['fn'].to_numpy()
+
+    output = pd.DataFrame({'chromStart': error['chromStart'].to_numpy(),
+                           'chromEnd': error['chromEnd'].to_numpy(),
+                           'regions': np.ones(len(error.index), dtype=int),
+                           'fp': fp,
+                           'possible_fp': error['possible_fp'].to_numpy(),
+                           'fn': fn,
+                           'possible_fn': error['possible_tp'].to_numpy(),
+                           'errors': fp + fn})
+    output['penalty'] = str(penalty)
+
+    return output[labelErrorColumns]
 
 
 def getErrorSeries(penalty, numPeaks, regions=0):
@@ -321,17 +575,43 @@ def generateAltModel(data, problem, txn=None):
     track = data['track']
     chrom = data['ref']
     scale = data['scale']
-    hubInfo = db.HubInfo(user, hub).get(txn=txn)
+    if 'hubInfo' in data:
+        hubInfo = data['hubInfo']
+    else:
+        hubInfo = db.HubInfo(user, hub).get(txn=txn)
     trackUrl = hubInfo['tracks'][data['track']]['url']
 
     start = max(data['visibleStart'], problem['chromStart'], 0)
     end = min(data['visibleEnd'], problem['chromEnd'])
 
-    scaledBins = int(scale * (end - start))
-    lenBin = (end - start) / scaledBins
+    binSize = 1 / scale
+
+    # Scales with a whole number of bases per bin can use the cached tiles, which need the region on the bin grid
+    if binSize >= 1 and math.isclose(binSize, round(binSize)):
+        binSize = int(round(binSize))
+        start = -(-start // binSize) * binSize
+        end = end // binSize * binSize
+
+        if end <= start:
+            return []
+
+        scaledBins = (end - start) // binSize
 
-    # TODO: Cache this
-    sumData = bw.bigWigSummary(trackUrl, chrom, start, end, scaledBins)
+        chromEnd = db.ChromProblems(hubInfo['genome'], chrom).getEnd(txn=txn)
+
+        sumData = []
+
+        if chromEnd is not None:
+            sumData = bw.tiledSummary(trackUrl, chrom, start, end, binSize, chromEnd)
+
+        if len(sumData) < 1:
+            sumData = bw.bigWigSummary(trackUrl, chrom, start, end, scaledBins)
+    else:
+        scaledBins = int(scale * (end - start))
+
+        sumData = bw.bigWigSummary(trackUrl, chrom, start, end, scaledBins)
+
+    lenBin = (end - start) / scaledBins
 
     if len(sumData) < 1:
         log.warning('Sum Data is 0 for alt model', data)
@@ -411,24 +691,19 @@ def sumDataToFlopart(data, lenBin):
 
 
 def lopartToPeaks(lopartOut):
+    """Segments which step up from the segment before are peaks, the first is a peak if it's above the mean"""
     output = lopartOut.copy()
-    output['peak'] = False
-    meanHeight = lopartOut['height'].mean()
-
-    prev = None
-    for index, row in lopartOut.iterrows():
-        if prev is None:
-            prev = row
-            if row['height'] > meanHeight:
-                output['peak'][index] = True
-            continue
+    heights = lopartOut['height'].to_numpy()
+
+    isPeak = np.zeros(len(heights), dtype=bool)
 
-        if row['height'] > prev['height']:
-            output['peak'][index] = True
+    if len(heights) > 0:
+        isPeak[0] = heights[0] > lopartOut['height'].mean()
+        isPeak[1:] = heights[1:] > heights[:-1]
 
-        prev = row
+    output['peak'] = isPeak
 
-    peaks = output[output['peak']]
+    peaks = output[output['peak']].copy()
 
     if peaks.empty:
         return peaks
@@ -439,61 +714,55 @@ def lopartToPeaks(lopartOut):
 
 
 def flopartToPeaksUsingMaxJump(flopartOut, lenBin):
+    """Each run of segments which aren't in the background state becomes one peak"""
     flopartOut = flopartOut.rename(columns={'mean': 'height'})
 
-    flopartOut['height'] = (flopartOut['height'] / lenBin)
+    heights = flopartOut['height'].to_numpy(dtype=float) / lenBin
 
-    output = pd.DataFrame()
+    inPeak = (flopartOut['state'] != 0).to_numpy()
 
-    peakPrev = None
-    currentPeak = pd.DataFrame()
-    for index, row in flopartOut.iterrows():
-        if row['state'] != 0:
-            currentPeak = currentPeak.append(row)
+    if not inPeak.any():
+        return pd.DataFrame()
 
-        # Prev data point is the end of a peak
-        else:
-            if len(currentPeak.index) != 0:
-                output = output.append(maxJumpOnPeaks(currentPeak, peakPrev), ignore_index=True)
+    edges = np.diff(np.concatenate([[0], inPeak.astype(np.int8), [0]]))
+    runStarts = np.flatnonzero(edges == 1)
+    runEnds = np.flatnonzero(edges == -1)
 
-                currentPeak = pd.DataFrame()
+    return maxJumpOnPeaks(flopartOut, heights, runStarts, runEnds)
 
-            peakPrev = row
 
-    # Handles the case where the model ends with a peak
-    if len(currentPeak.index) > 0:
-        output = output.append(maxJumpOnPeaks(currentPeak, peakPrev), ignore_index=True)
+def maxJumpOnPeaks(segments, heights, runStarts, runEnds):
+    """Makes a peak for each run of segments, starting at the biggest jump up and ending at the biggest jump down
 
-    return output
+    The first segment in a run is compared to the segment before the run, the rest to the first segment in the run
+    """
+    runLengths = runEnds - runStarts
+    runIds = np.repeat(np.arange(len(runStarts)), runLengths)
+    runOffsets = np.cumsum(runLengths) - runLengths
 
+    rows = runStarts[runIds] + (np.arange(len(runIds)) - runOffsets[runIds])
 
-def maxJumpOnPeaks(currentPeak, peakPrev):
-    prev = None
+    firstHeights = heights[runStarts]
+    prevHeights = np.where(runStarts > 0, heights[runStarts - 1], 0)
 
-    changes = pd.DataFrame()
+    changes = heights[rows] - firstHeights[runIds]
+    changes[runOffsets] = firstHeights - prevHeights
 
-    # Calculate changes for
-    for curIndex, curRow in currentPeak.iterrows():
-        if prev is None:
-            if peakPrev is None:
-                curRow['change'] = curRow['height']
-                changes = changes.append(curRow)
-            else:
-                curRow['change'] = curRow['height'] - peakPrev['height']
-                changes = changes.append(curRow)
-            prev = curRow
-        else:
-            curRow['change'] = curRow['height'] - prev['height']
-            changes = changes.append(curRow)
+    maxChanges = np.maximum.reduceat(changes, runOffsets)
+    minChanges = np.minimum.reduceat(changes, runOffsets)
 
-    startRow = changes[changes['change'] == changes['change'].max()]
-    endRow = changes[changes['change'] == changes['change'].min()]
+    # First segment in each run with the biggest jump up or down
+    isMax = np.flatnonzero(changes == maxChanges[runIds])
+    isMin = np.flatnonzero(changes == minChanges[runIds])
+    startRows = rows[isMax[np.unique(runIds[isMax], return_index=True)[1]]]
+    endRows = rows[isMin[np.unique(runIds[isMin], return_index=True)[1]]]
 
-    start = startRow['start']
-    end = endRow['end']
-    height = changes['height'].mean()
+    # Summed per run rather than with reduceat so the means round the same as Series.mean
+    runSums = np.array([heights[start:end].sum() for start, end in zip(runStarts, runEnds)])
 
-    return pd.Series({'start': start, 'end': end, 'height': height})
+    return pd.DataFrame({'start': segments['start'].to_numpy()[startRows],
+                         'end': segments['end'].to_numpy()[endRows],
+                         'height': runSums / runLengths})
 
 
 def indexToStartEnd(row, start, scale):
@@ -534,67 +803,133 @@ def convertLabelsToIndexBased(row, modelStart, denom, bins, modelType): # pragma
     return output
 
 
-def doPrediction(job, txn=None):
-    features = db.Features(job.user,
-                           job.hub,
-                           job.track,
-                           job.problem['chrom'],
-                           job.problem['chromStart']).get(txn=txn)
+def doPrediction(data, problem, txn=None):
+    """The predicted penalty for a problem of data's track, False if there can't be one"""
+    features = db.Features(data['user'],
+                           data['hub'],
+                           data['track'],
+                           problem['chrom'],
+                           problem['chromStart']).get(txn=txn)
 
     if not isinstance(features, pd.Series):
         if not features:
             return False
 
-    model = db.Prediction('model').get(txn=txn)
+    predictor = getPredictor(txn=txn)
 
-    if not isinstance(model, dict):
+    if predictor is None:
         return False
 
-    colsToDrop = db.Prediction('badCols').get(txn=txn)
+    prediction = predictPenalties(predictor, [features])[0]
 
-    featuresDropped = features.drop(labels=colsToDrop)
-
-    prediction = predictWithFeatures(featuresDropped, model)
-
-    if prediction is None:
+    if np.isnan(prediction):
         return False
 
     return float(10**prediction)
 
 
-def predictWithFeatures(features, model):
-    if not isinstance(features, pd.Series):
-        raise Exception(features)
+def getPredictor(txn=None):
+    """The prediction model as the intercept and coefficients at lambda_min, None if there isn't a model yet
 
-    featuresDf = pd.DataFrame().append(features, ignore_index=True)
-    guess = cvglmnetPredict(model, newx=featuresDf, s='lambda_min')[0][0]
+    Kept in memory until the model version in the db changes, instead of loading the model for every prediction
+    """
+    version = db.Prediction('modelVersion').get(txn=txn)
 
-    if np.isnan(guess):
-        return
+    if predictorCache['version'] == version:
+        return predictorCache['predictor']
 
-    return guess
+    model = db.Prediction('model').get(txn=txn)
+
+    if isinstance(model, dict):
+        coef = cvglmnetCoef(model, s='lambda_min')[:, 0]
+
+        columns = db.Prediction('columns').get(txn=txn)
+
+        predictor = {'intercept': coef[0],
+                     'coef': coef[1:],
+                     'badCols': db.Prediction('badCols').get(txn=txn),
+                     # Models fit before the columns were saved go off of the order of the features
+                     'columns': columns if isinstance(columns, list) else None}
+    else:
+        predictor = None
+
+    predictorCache['version'] = version
+    predictorCache['predictor'] = predictor
+
+    return predictor
+
+
+def predictPenalties(predictor, features):
+    """Predicts the log penalty for each of a list of feature Series, NaN where it can't be predicted"""
+    featuresDf = pd.DataFrame(features)
+
+    if predictor['columns'] is None:
+        featuresDf = featuresDf.drop(columns=predictor['badCols'])
+    else:
+        featuresDf = featuresDf.reindex(columns=predictor['columns'])
+
+    return predictor['intercept'] + featuresDf.to_numpy(dtype=np.float64) @ predictor['coef']
 
 
 def numModels():
-    return db.Model.length()
+    # Models which haven't been moved over to ModelPeaks yet are only in Model
+    return db.ModelPeaks.numModels() + db.Model.length()
 
 
-def numCorrectModels():
-    correct = 0
+def chunkOldModels():
+    """Moves a batch of the models stored whole in db.Model over to db.ModelPeaks, with a txn for each model"""
+    for key in db.Model.db_key_tuples()[:migrationBatch]:
+        chunkOldModel(key)
 
-    for key in db.ModelSummaries.db_key_tuples():
-        modelSum = db.ModelSummaries(*key).get()
 
-        if modelSum.empty:
-            continue
+def backfillDisplayModels():
+    """Picks the display model of a batch of the problems whose summaries were put before it was kept
+
+    Each problem is picked in its own txn, once every problem has one this stops looking
+    """
+    if db.JobInfo('displayModelsBuilt').get():
+        return
+
+    missing = [key for key in db.ModelSummaries.db_key_tuples() if not db.hasKey(db.DisplayModel, key)]
+
+    for key in missing[:migrationBatch]:
+        updateDisplayModel(key)
+
+    # Summaries put from now on pick their display model when they are put
+    if len(missing) <= migrationBatch:
+        putDisplayModelsBuilt()
+
+
+@retry
+@txnAbortOnError
+def putDisplayModelsBuilt(txn=None):
+    db.JobInfo('displayModelsBuilt').put(1, txn=txn)
 
-        withRegions = modelSum[modelSum['regions'] > 0]
 
-        withPeaks = withRegions[withRegions['numPeaks'] > 0]
+@retry
+@txnAbortOnError
+def chunkOldModel(key, txn=None):
+    if not db.hasKey(db.Model, key, txn=txn, write=True):
+        return
 
-        zeroErrors = withPeaks[withPeaks['errors'] < 1]
+    modelDb = db.Model(*key)
 
-        correct = correct + len(zeroErrors.index)
+    # Reads before the read path stopped writing could have chunked it already
+    if not db.hasKey(db.ModelPeaks, (*key, db.ModelPeaks.indexBin), txn=txn):
+        db.ModelPeaks.putModel(key, modelDb.get(txn=txn), txn=txn)
+
+    modelDb.put(None, txn=txn)
+
+
+@retry
+@txnAbortOnError
+def numCorrectModels(txn=None):
+    correct = 0
+
+    for key in db.ModelStatusIndex.problems('correct', txn=txn):
+        status = db.ModelStatus(*key).get(txn=txn)
+
+        correct = correct + status['zeroErrors']
 
     return correct
 
@@ -627,9 +962,7 @@ def getTrackModelSummaries(data, txn=None):
 def getTrackModelSummary(data, txn=None):
     hubInfo = db.HubInfo(data['user'], data['hub']).get(txn=txn)
 
-    problems = db.Problems(hubInfo['genome']).get(txn=txn)
-
-    sameChrom = problems[problems['chrom'] == data['ref']]
+    sameChrom = Tracks.getProblemsForChrom(hubInfo['genome'], data['ref'], txn=txn)
 
     sameStart = sameChrom[sameChrom['chromStart'] == data['start']]
 
@@ -1,6 +1,6 @@
 import json
 from core.Models import Models
-from core import dfDataOut
+from core import dfDataOut, dfStreamOut
 from pyramid.view import view_config
 from pyramid.response import Response
 from core.util import PLConfig as cfg
@@ -52,11 +52,22 @@ def putModel(request):
     return Response(status=404)
 
 
+@view_config(route_name='trackModelBatch', request_method='PUT', renderer='json')
+def putModels(request):
+    data = {**request.matchdict, **request.json_body}
+    output = Models.putModels(data)
+
+    if output is not None:
+        return output
+
+    return Response(status=404)
+
+
 # ---- HUB MODELS ---- #
 
 
 @view_config(route_name='hubModels', request_method='GET')
-@dfDataOut
+@dfStreamOut
 def getHubModels(request):
     query = request.matchdict
     try:
@@ -67,15 +78,7 @@ def getHubModels(request):
         pass
     query['currentUser'] = request.authenticated_userid
 
-    output = Models.getHubModels(query)
-
-    if isinstance(output, list):
-        return Response(status=204)
-
-    if len(output.index) < 1:
-        return Response(status=204)
-
-    return output
+    return Models.getHubModels(query)
 
 
 # ---- MODEL SUMS ---- #
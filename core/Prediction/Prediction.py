@@ -1,79 +1,169 @@
+import time
 import scipy
 import numpy as np
-import pandas as pd
 from glmnet_python import cvglmnet
 from simpleBDB import retry, txnAbortOnError
 from core.util import PLConfig as cfg, PLdb as db
+from core.Models import Models
+from core.Prediction.TrainingMatrix import TrainingMatrix
+
+# The training set, kept on disk and shared by the processes which learn
+trainingMatrix = TrainingMatrix()
+
+# How far back in ns the TrainingLog is read again, a txn can commit after ones which logged a later time
+logOverlap = 600 * 10 ** 9
+
+# The label change count seen at the last check, and when the current burst of changes was first seen
+scheduler = {'changes': None, 'pendingSince': None}
 
 try:
     import uwsgi
     import uwsgidecorators
 
-    @uwsgidecorators.timer(cfg.timeBetween)
+    @uwsgidecorators.timer(cfg.learningCheckTime, target='mule')
     def doLearning(num):
-        print('prediction system running')
         if db.isLoaded():
-            runPrediction({})
+            scheduleLearning()
 except ModuleNotFoundError:
     pass
 
 
+def scheduleLearning():
+    """Runs the prediction if enough has changed since the model was last fit"""
+    state = getLearningState({})
+
+    if shouldLearn(state, time.time()):
+        print('prediction system running')
+        runPrediction({})
+
+
+def shouldLearn(state, now):
+    """Learns after cfg.numChanges label changes, or once there are first cfg.minLabeledRegions labeled regions
+
+    Waits until a check sees no new label changes so a burst of labeling only fits once,
+    unless the burst has gone on for longer than cfg.timeBetween
+    """
+    if state['labeledRegions'] < cfg.minLabeledRegions:
+        return False
+
+    firstModel = state['learnedRegions'] < cfg.minLabeledRegions
+
+    if not firstModel and state['changes'] - state['learnedChanges'] < cfg.numChanges:
+        return False
+
+    if scheduler['changes'] != state['changes']:
+        scheduler['changes'] = state['changes']
+
+        if scheduler['pendingSince'] is None:
+            scheduler['pendingSince'] = now
+
+        if now - scheduler['pendingSince'] < cfg.timeBetween:
+            return False
+
+    scheduler['pendingSince'] = None
+
+    return True
+
+
 @retry
 @txnAbortOnError
-def runPrediction(data, txn=None):
+def getLearningState(data, txn=None):
+    return learningState(txn=txn)
+
+
+def learningState(txn=None):
+    with trainingMatrix.locked():
+        updateTrainingSet(txn=txn)
+
+        labeledRegions = trainingMatrix.index['regions']
+
+    return {'changes': db.Prediction('changes').get(txn=txn),
+            'learnedChanges': db.Prediction('learnedChanges').get(txn=txn),
+            'labeledRegions': labeledRegions,
+            'learnedRegions': db.Prediction('learnedRegions').get(txn=txn)}
+
 
+def runPrediction(data):
+    """Fits the prediction model outside of a transaction, then swaps the new model in"""
+    trainingData = getTrainingData(data)
+
+    if trainingData is None:
+        return
+
+    X, Y, badCols, state = trainingData
+
+    cvfit = learn(X, Y)
+
+    putPredictionModel(cvfit, list(X.columns), badCols, state)
+
+    # Problems with more than one model to choose from pick using the prediction
+    Models.updateDisplayModels()
+
+
+@retry
+@txnAbortOnError
+def getTrainingData(data, txn=None):
     datapoints = getDataPoints(txn=txn)
+
     if datapoints is None:
         return
 
-    learn(*datapoints, txn=txn)
+    return (*datapoints, learningState(txn=txn))
 
 
-def getDataPoints(txn=None):
-    dataPoints = pd.DataFrame()
+@retry
+@txnAbortOnError
+def putPredictionModel(cvfit, columns, badCols, state, txn=None):
+    """Puts the model with the columns it was fit with and without, and what it was fit on, in one transaction"""
+    db.Prediction('model').put(cvfit, txn=txn)
+    db.Prediction('columns').put(columns, txn=txn)
+    db.Prediction('badCols').put(badCols, txn=txn)
+    # Processes reload their copy of the model when this changes
+    db.Prediction('modelVersion').increment(txn=txn)
+    db.Prediction('learnedChanges').put(state['changes'], txn=txn)
+    db.Prediction('learnedRegions').put(state['labeledRegions'], txn=txn)
 
-    cursor = db.ModelSummaries.getCursor(txn=None, bulk=True)
 
-    current = cursor.next()
+def updateTrainingSet(txn=None):
+    """Updates the rows of the problems which changed since the training set was last updated
 
-    while current is not None:
-        key, modelSum = current
-        if modelSum.empty:
-            current = cursor.next()
-            continue
+    Should be called with the trainingMatrix lock held
+    """
+    # Problems with summaries from before the training data was kept get it added here
+    db.ModelStatus.build(txn=txn)
 
-        if modelSum['regions'].max() < 1:
-            current = cursor.next()
-            continue
+    index = trainingMatrix.index
 
-        withPeaks = modelSum[modelSum['numPeaks'] > 0]
+    changes = db.TrainingLog.since(max(index['logTime'] - logOverlap, 0), txn=txn)
 
-        noError = withPeaks[withPeaks['errors'] < 1]
+    changed = False
 
-        logPenalties = np.log10(noError['penalty'].astype(float))
+    # Changes which were already read are read again in the overlap, so only ones which are new are applied
+    for logTime, key in changes:
+        if trainingMatrix.logTime(key) != logTime:
+            changed = trainingMatrix.update(key, db.TrainingData(*key).get(txn=txn)) or changed
 
-        featuresDb = db.Features(*key)
-        features = featuresDb.get(txn=txn)
+        index['logTime'] = max(index['logTime'], logTime)
 
-        for penalty in logPenalties:
-            datapoint = features.copy()
+    if changed:
+        trainingMatrix.save()
 
-            datapoint['logPenalty'] = penalty
 
-            dataPoints = dataPoints.append(datapoint, ignore_index=True)
+def getDataPoints(txn=None):
+    """Returns the training set with the bad columns dropped, and the columns which were dropped"""
+    with trainingMatrix.locked():
+        updateTrainingSet(txn=txn)
 
-        current = cursor.next()
+        dataPoints = trainingMatrix.dataPoints()
 
-    cursor.close()
+    if dataPoints is None:
+        return
 
-    # TODO: Save datapoints, update ones which have changed, not all of them every time
+    X, Y = dataPoints
 
-    if dataPoints.empty:
-        return
-    Y = dataPoints['logPenalty']
-    X = dataPoints.drop('logPenalty', 1)
+    X, badCols = dropBadCols(X)
 
-    return dropBadCols(X, txn=txn), Y
+    return X, Y, badCols
 
 
 def makePrediction(data):
@@ -81,24 +171,20 @@ def makePrediction(data):
     print(model)
 
 
-def dropBadCols(df, txn=None):
-    pd.set_option("display.max_rows", None, "display.max_columns", None)
+def dropBadCols(df):
     noNegatives = df.replace(-np.Inf, np.nan)
     output = noNegatives.dropna(axis=1)
 
     # Take a note of what columns were dropped so that can be later used during prediction
     # This line just compares the two column indices and finds the differences
     badCols = list(set(df.columns) - set(output.columns))
-    db.Prediction('badCols').put(badCols, txn=txn)
-    return output
+    return output, badCols
 
 
-def learn(X, Y, txn=None):
+def learn(X, Y):
     X = X.to_numpy(dtype=np.float64, copy=True)
     Y = Y.to_numpy(dtype=np.float64, copy=True)
-    cvfit = cvglmnet(x=X, y=Y)
-    db.Prediction('model').put(cvfit, txn=txn)
-
+    return cvglmnet(x=X, y=Y)
 
 
 # Taken from the glmnet_python library, added a return to it so it can be saved
@@ -0,0 +1,276 @@
+import os
+import fcntl
+import pickle
+import contextlib
+import numpy as np
+import pandas as pd
+from core.util import PLdb as db
+
+# In the db's directory so the training set goes with the db it was built from
+trainingPath = os.path.join(db.dbPath, 'training')
+
+# Smallest number of rows the arrays are made with, they double in size when they run out
+minCapacity = 1024
+
+
+def newIndex():
+    return {'columns': [], 'problems': {}, 'rowKeys': [], 'numRows': 0, 'regions': 0,
+            'logTime': 0, 'generation': 0, 'dirty': False}
+
+
+class TrainingMatrix:
+    """The training set of the penalty predictor, with one row for each zero error penalty of a problem
+
+    X and Y are memmapped arrays on disk with the db so every process uses the same ones, the first numRows rows
+    are the training set. The index says which rows each problem has, so a change to a problem only writes that
+    problem's rows. Removing a problem moves the last rows into its place to keep the rows together.
+
+    The index is marked dirty before the arrays are changed and saved clean after, so a process which stopped part way
+    leaves a dirty index and the training set is built again from the TrainingData
+    """
+
+    def __init__(self, path=trainingPath):
+        self.path = path
+        self.index = newIndex()
+        self.X = None
+        self.Y = None
+        self.loadedFrom = None
+        self.staleFiles = []
+
+    def filePath(self, name):
+        return os.path.join(self.path, name)
+
+    @contextlib.contextmanager
+    def locked(self):
+        """Holds the lock on the training set with the latest version of it loaded"""
+        os.makedirs(self.path, exist_ok=True)
+
+        with open(self.filePath('.lock'), 'w') as lockFile:
+            fcntl.flock(lockFile, fcntl.LOCK_EX)
+            try:
+                self.load()
+                yield self
+            finally:
+                fcntl.flock(lockFile, fcntl.LOCK_UN)
+
+    def load(self):
+        indexPath = self.filePath('index.pkl')
+
+        if not os.path.exists(indexPath):
+            self.reset()
+            return
+
+        stat = os.stat(indexPath)
+        stamp = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+        # Only read again if another process saved since this one loaded
+        if stamp == self.loadedFrom:
+            return
+
+        with open(indexPath, 'rb') as f:
+            index = pickle.load(f)
+
+        if index['dirty']:
+            self.reset()
+            return
+
+        self.index = index
+        self.X, self.Y = self.openArrays(index['generation'])
+        self.loadedFrom = stamp
+
+    def reset(self):
+        """Starts again from an empty training set, the files of the old one are removed on the next save"""
+        arrayFiles = [name for name in os.listdir(self.path) if name.endswith('.npy')]
+
+        self.staleFiles.extend(arrayFiles)
+
+        # The new arrays go after every file which is there, so they aren't one of the files which get removed
+        generations = [int(name.split('.')[1]) for name in arrayFiles]
+
+        self.index = newIndex()
+        self.index['generation'] = max(generations, default=0)
+        self.X = self.Y = None
+        self.loadedFrom = None
+
+    def openArrays(self, generation):
+        if not os.path.exists(self.filePath('X.%d.npy' % generation)):
+            return None, None
+
+        return (np.load(self.filePath('X.%d.npy' % generation), mmap_mode='r+'),
+                np.load(self.filePath('Y.%d.npy' % generation), mmap_mode='r+'))
+
+    def save(self):
+        if self.X is not None:
+            self.X.flush()
+            self.Y.flush()
+
+        self.index['dirty'] = False
+        self.writeIndex()
+
+        for name in self.staleFiles:
+            try:
+                os.remove(self.filePath(name))
+            except FileNotFoundError:
+                pass
+
+        self.staleFiles = []
+
+    def writeIndex(self):
+        indexPath = self.filePath('index.pkl')
+        tempPath = '%s.%s.tmp' % (indexPath, os.getpid())
+
+        with open(tempPath, 'wb') as f:
+            pickle.dump(self.index, f)
+
+        os.replace(tempPath, indexPath)
+
+        stat = os.stat(indexPath)
+        self.loadedFrom = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def markDirty(self):
+        if not self.index['dirty']:
+            self.index['dirty'] = True
+            self.writeIndex()
+
+    def logTime(self, key):
+        """Time of the TrainingLog change the rows of a problem are from, None if it has no rows"""
+        problem = self.index['problems'].get(key)
+
+        if problem is None:
+            return None
+
+        return problem['logTime']
+
+    def update(self, key, trainingData):
+        """Puts the rows of a problem from its TrainingData, removing them if it isn't in the training set anymore
+
+        Returns whether the training set changed
+        """
+        problems = self.index['problems']
+        old = problems.get(key)
+
+        if trainingData is None or trainingData['features'] is None:
+            if old is None:
+                return False
+
+            self.markDirty()
+            self.removeRows(key)
+            return True
+
+        if old is not None and old['logTime'] == trainingData['logTime']:
+            return False
+
+        self.markDirty()
+
+        logPenalties = np.asarray(trainingData['logPenalties'], dtype=np.float64)
+
+        self.addColumns(trainingData['features'].index)
+
+        if old is not None and len(old['rows']) == len(logPenalties):
+            rows = old['rows']
+            self.index['regions'] -= old['regions']
+        else:
+            if old is not None:
+                self.removeRows(key)
+
+            rows = self.appendRows(key, len(logPenalties))
+
+        self.X[rows] = trainingData['features'].reindex(self.index['columns']).to_numpy(dtype=np.float64)
+        self.Y[rows] = logPenalties
+
+        problems[key] = {'rows': rows, 'logTime': trainingData['logTime'], 'regions': trainingData['regions']}
+        self.index['regions'] += trainingData['regions']
+
+        return True
+
+    def removeRows(self, key):
+        problems = self.index['problems']
+        rowKeys = self.index['rowKeys']
+
+        removed = problems.pop(key)
+        self.index['regions'] -= removed['regions']
+
+        # From the highest row down, so the last row is never one of the rows still to be removed
+        for row in sorted(removed['rows'], reverse=True):
+            last = self.index['numRows'] - 1
+
+            if row != last:
+                moved = rowKeys[last]
+                self.X[row] = self.X[last]
+                self.Y[row] = self.Y[last]
+                rowKeys[row] = moved
+
+                movedRows = problems[moved]['rows']
+                movedRows[movedRows.index(last)] = row
+
+            rowKeys.pop()
+            self.index['numRows'] = last
+
+    def appendRows(self, key, numRows):
+        start = self.index['numRows']
+        end = start + numRows
+
+        self.ensureShape(end)
+
+        self.index['rowKeys'].extend([key] * numRows)
+        self.index['numRows'] = end
+
+        return list(range(start, end))
+
+    def addColumns(self, names):
+        columns = self.index['columns']
+        known = set(columns)
+
+        newColumns = [name for name in names if name not in known]
+
+        if newColumns:
+            columns.extend(newColumns)
+            self.ensureShape(self.index['numRows'])
+
+    def ensureShape(self, numRows):
+        """Makes new arrays if there isn't room for numRows rows or there are new columns, copying the rows over
+
+        Rows which were put before a column was added don't have a value for it
+        """
+        numColumns = len(self.index['columns'])
+
+        if self.X is not None and self.X.shape[0] >= numRows and self.X.shape[1] == numColumns:
+            return
+
+        capacity = minCapacity if self.X is None else self.X.shape[0]
+
+        while capacity < numRows:
+            capacity *= 2
+
+        generation = self.index['generation'] + 1
+
+        X = np.lib.format.open_memmap(self.filePath('X.%d.npy' % generation), mode='w+', dtype=np.float64,
+                                      shape=(capacity, numColumns))
+        Y = np.lib.format.open_memmap(self.filePath('Y.%d.npy' % generation), mode='w+', dtype=np.float64,
+                                      shape=(capacity,))
+
+        used = self.index['numRows']
+
+        if self.X is not None:
+            oldColumns = self.X.shape[1]
+            X[:used, :oldColumns] = self.X[:used]
+            X[:used, oldColumns:] = np.nan
+            Y[:used] = self.Y[:used]
+
+            self.staleFiles.extend(['X.%d.npy' % self.index['generation'], 'Y.%d.npy' % self.index['generation']])
+
+        self.X = X
+        self.Y = Y
+        self.index['generation'] = generation
+
+    def dataPoints(self):
+        """Copies of the training set as an X DataFrame and Y Series, None if it is empty"""
+        numRows = self.index['numRows']
+
+        if numRows < 1:
+            return None
+
+        X = pd.DataFrame(np.array(self.X[:numRows]), columns=self.index['columns'])
+        Y = pd.Series(np.array(self.Y[:numRows]))
+
+        return X, Y
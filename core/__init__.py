@@ -1,5 +1,12 @@
 import json
-from pyramid.response import Response
+import tempfile
+import itertools
+import pandas as pd
+from pyramid.response import Response, FileIter
+from core.util import binaryUtil
+
+# Streamed output bigger than this is spooled to disk instead of memory while it is written
+streamSpoolSize = 16 * 1024 * 1024
 
 
 def dfDataOut(func):
@@ -24,6 +31,9 @@ def dfDataOut(func):
 
         elif outputType == 'csv' or outputType == 'text/csv':
             return Response(output.to_csv(sep='\t', index=False), charset='utf8', content_type='text/csv')
+
+        elif outputType == binaryUtil.contentType:
+            return Response(body=binaryUtil.dfToBinary(output), content_type=binaryUtil.contentType)
         else:
             return Response(status=404)
 
@@ -59,3 +69,86 @@ def dfDataOutShrink(func):
             return Response(status=404)
 
     return wrap
+
+
+def dfStreamOut(func):
+    """Like dfDataOut, for views which return an iterator of DataFrames
+
+    Each DataFrame is written out as it comes out of the iterator instead of being concatenated first. The output is
+    spooled to a temporary file before the response starts, so one which fails part way is an error response rather
+    than a truncated one
+    """
+    def wrap(request):
+        if 'Accept' in request.headers:
+            outputType = request.headers['Accept']
+        else:
+            outputType = 'application/json'
+
+        output = func(request)
+
+        if isinstance(output, Response):
+            return output
+
+        output = (df for df in output if len(df.index) > 0)
+
+        first = next(output, None)
+
+        if first is None:
+            return Response(status=204)
+
+        chunks = itertools.chain([first], output)
+
+        if outputType is None:
+            output = pd.concat(chunks, ignore_index=True)
+            output['user'] = request.authenticated_userid
+            return output
+
+        if outputType == 'json' or outputType == 'application/json' or outputType == '*/*':
+            return spooledResponse(jsonChunks(chunks), charset='utf8', content_type='application/json')
+
+        elif outputType == 'csv' or outputType == 'text/csv':
+            return spooledResponse(csvChunks(chunks), charset='utf8', content_type='text/csv')
+
+        elif outputType == binaryUtil.contentType:
+            return spooledResponse((binaryUtil.dfToFrame(df) for df in chunks), content_type=binaryUtil.contentType)
+        else:
+            return Response(status=404)
+
+    return wrap
+
+
+def spooledResponse(chunks, **kwargs):
+    """Writes the chunks to a temporary file and responds with it, an exception from the chunks is raised here"""
+    spool = tempfile.SpooledTemporaryFile(max_size=streamSpoolSize)
+
+    try:
+        for chunk in chunks:
+            spool.write(chunk)
+    except Exception:
+        spool.close()
+        raise
+
+    length = spool.tell()
+    spool.seek(0)
+
+    return Response(app_iter=FileIter(spool), content_length=length, **kwargs)
+
+
+def jsonChunks(chunks):
+    """Writes the records of each DataFrame as part of one json list"""
+    yield b'['
+
+    for i, df in enumerate(chunks):
+        records = json.dumps(df.to_dict('records'))[1:-1]
+
+        if i > 0:
+            records = ',' + records
+
+        yield records.encode('utf-8')
+
+    yield b']'
+
+
+def csvChunks(chunks):
+    for i, df in enumerate(chunks):
+        yield df.to_csv(sep='\t', index=False, header=i == 0).encode('utf-8')
@@ -33,6 +33,7 @@ if 'learning' not in configSections:
     config.add_section('learning')
     config['learning']['doIdlePredictions'] = 'False'
     config['learning']['timeBetween'] = '600'
+    config['learning']['checkTime'] = '60'
     config['learning']['numChanges'] = '10'
     config['learning']['minLabeledRegions'] = '20'
     config['learning']['maxJobsToSpawn'] = '100'
@@ -50,6 +51,8 @@ jbrowsePath = config['http']['path']
 
 dataPath = config['data']['path']
 timeBetween = int(config['learning']['timeBetween'])
+# How often to check whether enough has changed to learn again, configs from before this was added use the default
+learningCheckTime = int(config['learning'].get('checkTime', '60'))
 numChanges = int(config['learning']['numChanges'])
 minLabeledRegions = int(config['learning']['minLabeledRegions'])
 doIdlePredictions = config['learning']['doIdlePredictions'].lower() == 'true'
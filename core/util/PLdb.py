@@ -1,15 +1,22 @@
 import os
 import json
+import struct
+import time
+import logging
 import datetime
 import berkeleydb
+import numpy as np
 import pandas as pd
 import simpleBDB as db
 from core.Jobs import Jobs
 from core.Models import Models
 import core.util.PLConfig as cfg
+from core.util import intervalUtil as iu
 from simpleBDB import AbortTXNException
 from core.Permissions import Permissions
 
+log = logging.getLogger(__name__)
+
 dbPath = os.path.join(cfg.jbrowsePath, cfg.dataPath, 'db')
 
 loaded = False
@@ -46,6 +53,16 @@ def closeDBs(closeEnv=True):
     db.close_env()
 
 
+def hasKey(resource, key, txn=None, write=False):
+    """has_key which can take a write lock on the key, the has_key in simpleBDB 1.1.20 doesn't take flags
+
+    The key is turned into strings the same way resources do it so it matches what was put
+    """
+    flags = berkeleydb.db.DB_RMW if write else 0
+
+    return resource.db.exists(resource.toKeyStore(resource.keyToEntryTuple(key)), txn=txn, flags=flags)
+
+
 def deadlock_detect():
     if loaded:
         db.lockDetect()
@@ -81,6 +98,7 @@ def getTxn(parent=None):
 
 
 class Model(db.PandasDf):
+    """Whole models as they were stored before ModelPeaks, these are only read until they are moved over to it"""
     keys = ("user", "hub", "track", "chrom", "problemstart", "penalty")
 
     def getInBounds(self, chrom, start, end, txn=None):
@@ -94,13 +112,143 @@ class Model(db.PandasDf):
     pass
 
 
+class ModelPeaks(db.Resource):
+    """Peaks of a Model as int32 start/end and float32 height arrays, chunked by genomic bin
+
+    Heights are read back out as float64 with the same digits they were put with
+
+    A region only unpickles the bins which it overlaps. A peak is in every bin it overlaps,
+    and the bin indexBin holds which bins have peaks so a missing index means the model was never chunked.
+    Models from before this are read from Model until Models.chunkOldModels moves them over
+    """
+    keys = ("user", "hub", "track", "chrom", "problemstart", "penalty", "bin")
+
+    binSize = 1000000
+    indexBin = -1
+
+    def make_details(self):
+        return None
+
+    @classmethod
+    def putModel(cls, modelKey, model, txn=None):
+        """Replaces the chunks of the model at modelKey with the peaks in model"""
+        index = cls(*modelKey, cls.indexBin)
+
+        current = index.get(txn=txn, write=True)
+
+        if current is not None:
+            for binNum in current['bins']:
+                cls(*modelKey, binNum).put(None, txn=txn)
+
+        peaks = model[model['annotation'] == 'peak']
+
+        starts, ends = iu.toArrays(peaks)
+        heights = peaks['height'].to_numpy(dtype=np.float32)
+
+        # Peaks from a segmentation don't overlap, so sorting by start also sorts the ends
+        order = np.argsort(starts, kind='stable')
+        starts = starts[order].astype(np.int32)
+        ends = ends[order].astype(np.int32)
+        heights = heights[order]
+
+        bins = []
+
+        if len(starts):
+            for binNum in range(starts[0] // cls.binSize, (ends[-1] - 1) // cls.binSize + 1):
+                first = np.searchsorted(ends, binNum * cls.binSize, side='right')
+                last = np.searchsorted(starts, (binNum + 1) * cls.binSize, side='left')
+
+                if last <= first:
+                    continue
+
+                chunk = {'chromStart': starts[first:last],
+                         'chromEnd': ends[first:last],
+                         'height': heights[first:last]}
+
+                cls(*modelKey, binNum).put(chunk, txn=txn)
+                bins.append(binNum)
+
+        index.put({'bins': bins, 'numPeaks': len(starts)}, txn=txn)
+
+    @classmethod
+    def getInBounds(cls, modelKey, chrom, start, end, txn=None):
+        """Peaks of the model in the region as a DataFrame with the same columns as Model
+
+        Returns None if the model doesn't exist
+        """
+        index = cls(*modelKey, cls.indexBin).get(txn=txn)
+
+        # Models put before chunking existed are read whole until they are chunked, reads don't write
+        if index is None:
+            model = Model(*modelKey).get(txn=txn)
+
+            if model.empty:
+                return None
+
+            peaks = model[model['annotation'] == 'peak']
+
+            isInBounds = iu.inBounds(*iu.toArrays(peaks), start, end)
+
+            return peaks[isInBounds].reset_index(drop=True)
+
+        # A peak which ends right at start is still in bounds, and would be in the bin before start
+        firstBin = (start - 1) // cls.binSize
+        lastBin = end // cls.binSize
+
+        chunks = []
+
+        for binNum in index['bins']:
+            if binNum < firstBin or binNum > lastBin:
+                continue
+
+            chunk = cls(*modelKey, binNum).get(txn=txn)
+
+            # Peaks in more than one bin are only kept from the first bin which is read
+            if chunks:
+                inBin = chunk['chromStart'] >= binNum * cls.binSize
+                chunk = {key: value[inBin] for key, value in chunk.items()}
+
+            chunks.append(chunk)
+
+        if chunks:
+            starts, ends, heights = [np.concatenate([chunk[col] for chunk in chunks])
+                                     for col in ('chromStart', 'chromEnd', 'height')]
+        else:
+            starts = ends = np.zeros(0, dtype=np.int32)
+            heights = np.zeros(0, dtype=np.float32)
+
+        isInBounds = iu.inBounds(starts, ends, start, end)
+
+        # Through the shortest float32 string so a height put as 0.3 comes back as 0.3 and not 0.30000001192...
+        heights = heights[isInBounds].astype(str).astype(np.float64)
+
+        return pd.DataFrame({'chrom': chrom,
+                             'chromStart': starts[isInBounds],
+                             'chromEnd': ends[isInBounds],
+                             'annotation': 'peak',
+                             'height': heights})
+
+    @classmethod
+    def getAll(cls, modelKey, chrom, txn=None):
+        """All of the peaks of the model, None if the model doesn't exist"""
+        return cls.getInBounds(modelKey, chrom, 0, np.iinfo(np.int32).max, txn=txn)
+
+    @classmethod
+    def numModels(cls):
+        indexBin = str(cls.indexBin)
+
+        return sum(1 for key in cls.db_key_tuples() if key[-1] == indexBin)
+
+    pass
+
+
 class Loss(db.Resource):
     keys = ("user", "hub", "track", "chrom", "problemstart", "penalty")
 
     pass
 
 
-# TODO: Add chrom as key, would lead to speed increases
+# Genome wide problems, use ChromProblems for lookups on a single chrom
 class Problems(db.PandasDf):
     keys = ("Genome",)
 
@@ -110,15 +258,85 @@ class Problems(db.PandasDf):
         if problems is None:
             return None
 
-        isInBounds = problems.apply(checkInBounds, axis=1, args=(chrom, start, end))
+        return problems[iu.dfInBounds(problems, chrom, start, end)]
 
-        return problems[isInBounds]
+    def make_details(self):
+        return None
+    pass
+
+
+class ChromProblems(db.Resource):
+    """Problems for a single chrom of a genome, stored as sorted start/end arrays
+
+    Problems are split up by chrom so that a lookup only loads the chrom being viewed,
+    and the sorted arrays allow for finding the problems in a region with a binary search
+    """
+    keys = ("Genome", "chrom")
 
     def make_details(self):
         return None
+
+    @classmethod
+    def toStorable(cls, data):
+        if isinstance(data, pd.DataFrame):
+            data = problemIndex(data)
+
+        return db.Resource.toStorable(data)
+
+    def getInBounds(self, start, end, txn=None):
+        index = self.get(txn=txn)
+
+        if index is None:
+            return None
+
+        starts = index['chromStart']
+        ends = index['chromEnd']
+
+        # maxEnd never decreases, so the first problem which could end after start can be binary searched
+        first = np.searchsorted(index['maxEnd'], start, side='left')
+        last = np.searchsorted(starts, end, side='right')
+
+        inBounds = np.arange(first, max(first, last))
+        inBounds = inBounds[ends[inBounds] >= start]
+
+        return self.indexToDf(starts[inBounds], ends[inBounds])
+
+    def getAll(self, txn=None):
+        index = self.get(txn=txn)
+
+        if index is None:
+            return None
+
+        return self.indexToDf(index['chromStart'], index['chromEnd'])
+
+    def getEnd(self, txn=None):
+        """The end of the last problem on the chrom, nothing on the chrom is looked at past this"""
+        index = self.get(txn=txn)
+
+        if index is None or len(index['maxEnd']) < 1:
+            return None
+
+        return int(index['maxEnd'][-1])
+
+    def indexToDf(self, starts, ends):
+        return pd.DataFrame({'chrom': self.info['chrom'], 'chromStart': starts, 'chromEnd': ends},
+                            columns=['chrom', 'chromStart', 'chromEnd'])
+
+    @classmethod
+    def putGenome(cls, genome, problems, txn=None):
+        """Splits a genome wide problems DataFrame up by chrom and stores each chrom"""
+        for chrom, chromProblems in problems.groupby('chrom'):
+            cls(genome, chrom).put(chromProblems, txn=txn)
+
     pass
 
 
+def problemIndex(problems):
+    order, starts, ends, maxEnd = iu.sortIntervals(*iu.toArrays(problems))
+
+    return {'chromStart': starts, 'chromEnd': ends, 'maxEnd': maxEnd}
+
+
 class JobInfo(db.Resource):
     keys = ("stat",)
 
@@ -134,15 +352,33 @@ class JobInfo(db.Resource):
 
         return current
 
+    def reserveIds(self, count, txn=None):
+        """Takes count ids at once, returning the first of them"""
+        current = self.get(txn=txn, write=True)
+
+        self.put(current + count, txn=txn)
+
+        return current
+
     pass
 
 
 class Job(db.Resource):
     keys = ("ID",)
+    queued = True
 
     def make_details(self):
         return {}
 
+    def put(self, value, txn=None):
+        # Keep the job queue in step with the job in the same txn
+        if self.queued:
+            before = self.get(txn=txn, write=True)
+            JobQueue.updateJob(self.values[0], before, value, txn=txn)
+            JobWork.updateJob(self.values[0], before, value, txn=txn)
+
+        super().put(value, txn=txn)
+
     @classmethod
     def getCursor(cls, txn=None, readCommited=False, bulk=False):
         return JobCursor(db.DB.getCursor(cls, txn=txn, readCommited=readCommited, bulk=bulk), cls)
@@ -164,6 +400,163 @@ class Job(db.Resource):
 
 
 class DoneJob(Job):
+    queued = False
+
+    pass
+
+
+class JobQueue(db.Resource):
+    """Index of jobs ordered by status, then highest priority, then lowest ID
+
+    The keys are packed so that the btree is sorted in that order,
+    so the next job to run can be found by positioning a cursor instead of scanning every job
+    """
+    keys = ("status", "priority", "ID")
+
+    # Offset so that negative priorities still sort correctly as unsigned ints
+    priorityOffset = 2 ** 63
+
+    @classmethod
+    def toKeyStore(cls, key):
+        output = str(key[0]).lower().encode() + b'\x00'
+
+        if len(key) > 1:
+            # Inverted so the highest priority comes first
+            output += struct.pack('>Q', cls.priorityOffset - int(key[1]))
+
+        if len(key) > 2:
+            output += struct.pack('>Q', int(key[2]))
+
+        return output
+
+    @classmethod
+    def fromKeyStore(cls, key):
+        status, packed = key.split(b'\x00', 1)
+        inverted, jobId = struct.unpack('>QQ', packed)
+
+        return status.decode(), cls.priorityOffset - inverted, str(jobId)
+
+    @classmethod
+    def jobKey(cls, jobId, job):
+        if job is None:
+            return None
+
+        if isinstance(job, dict):
+            if 'status' not in job:
+                return None
+            status, priority = job['status'], job['priority']
+        else:
+            status, priority = job.status, job.priority
+
+        return status.lower(), int(priority), str(jobId)
+
+    @classmethod
+    def updateJob(cls, jobId, before, after, txn=None):
+        """Moves a job from where it was in the queue to where it should be now"""
+        beforeKey = cls.jobKey(jobId, before)
+        afterKey = cls.jobKey(jobId, after)
+
+        if beforeKey == afterKey:
+            return
+
+        if beforeKey is not None and hasKey(cls, beforeKey, txn=txn, write=True):
+            cls(*beforeKey).put(None, txn=txn)
+
+        if afterKey is not None:
+            cls(*afterKey).put(jobId, txn=txn)
+
+    @classmethod
+    def removeJob(cls, jobId, job, txn=None):
+        cls.updateJob(jobId, job, None, txn=txn)
+
+    @classmethod
+    def first(cls, status, txn=None):
+        """Gets the key of the job with the highest priority for a status, or None if there isn't one"""
+        cursor = cls.getCursor(txn=txn)
+
+        current = cursor.getWithKey((status,), flags=berkeleydb.db.DB_SET_RANGE | berkeleydb.db.DB_RMW)
+
+        cursor.close()
+
+        if current is None:
+            return None
+
+        key, jobId = current
+
+        if key[0] != status.lower():
+            return None
+
+        return key
+
+    pass
+
+
+class JobWork(db.Resource):
+    """Index of the work waiting in jobs, the problem and penalty (or features) of each new or queued task
+
+    The value is the ID of the job the work is in, so a job asking for the same work can be merged into it
+    """
+    keys = ("user", "hub", "track", "chrom", "chromStart", "work")
+
+    waitingStatuses = ['new', 'queued']
+
+    def make_details(self):
+        return None
+
+    @classmethod
+    def jobWork(cls, job):
+        """The keys of the work in a job's tasks which haven't started yet"""
+        if job is None:
+            return set()
+
+        # New jobs don't have an id yet so can't be turned into a dict
+        if isinstance(job, dict):
+            if 'tasks' not in job:
+                return set()
+
+            user, hub, track, problem, tasks = job['user'], job['hub'], job['track'], job['problem'], job['tasks']
+        else:
+            user, hub, track, problem, tasks = job.user, job.hub, job.track, job.problem, job.tasks
+
+        problemKey = (str(user), hub, track, problem['chrom'], str(problem['chromStart']))
+
+        output = set()
+
+        for task in tasks.values():
+            if task['status'].lower() not in cls.waitingStatuses:
+                continue
+
+            taskType = task['type'].lower()
+
+            if taskType == 'model':
+                works = [task['penalty']]
+            elif taskType == 'multimodel':
+                works = task['penalties']
+            else:
+                works = [taskType]
+
+            output.update(problemKey + (str(work),) for work in works)
+
+        return output
+
+    @classmethod
+    def updateJob(cls, jobId, before, after, txn=None):
+        """Updates the index for the work which was added or removed from a job"""
+        beforeWork = cls.jobWork(before)
+        afterWork = cls.jobWork(after)
+
+        for key in beforeWork - afterWork:
+            # The work may have been taken over by another job since
+            if hasKey(cls, key, txn=txn, write=True) and cls(*key).get(txn=txn, write=True) == str(jobId):
+                cls(*key).put(None, txn=txn)
+
+        for key in afterWork - beforeWork:
+            cls(*key).put(str(jobId), txn=txn)
+
+    @classmethod
+    def removeJob(cls, jobId, job, txn=None):
+        cls.updateJob(jobId, job, None, txn=txn)
+
     pass
 
 
@@ -184,6 +577,49 @@ def labelCompare(item, df):
     return startSame & endSame
 
 
+class TaskLease(db.Resource):
+    """Index of leased tasks ordered by when their lease expires
+
+    Keys are packed the same way as JobQueue so expired leases are found by reading from the start of the btree
+    """
+    keys = ("expires", "ID", "taskId")
+
+    @classmethod
+    def toKeyStore(cls, key):
+        return struct.pack('>QQQ', *[int(value) for value in key])
+
+    @classmethod
+    def fromKeyStore(cls, key):
+        expires, jobId, taskId = struct.unpack('>QQQ', key)
+
+        return expires, str(jobId), str(taskId)
+
+    @classmethod
+    def expired(cls, now, txn=None):
+        """Gets the keys of every lease which expired before now"""
+        output = []
+
+        cursor = cls.getCursor(txn=txn)
+
+        current = cursor.first(flags=berkeleydb.db.DB_RMW)
+
+        while current is not None:
+            key, jobId = current
+
+            if key[0] > now:
+                break
+
+            output.append(key)
+
+            current = cursor.next(flags=berkeleydb.db.DB_RMW)
+
+        cursor.close()
+
+        return output
+
+    pass
+
+
 class Labels(db.PandasDf):
     keys = ("user", "hub", "track", "chrom")
 
@@ -208,30 +644,11 @@ class Labels(db.PandasDf):
         if labels.index.dtype == 'object':
             labels = labels.sort_values('chromStart', ignore_index=True)
 
-        isInBounds = labels.apply(checkInBounds, axis=1, args=(chrom, start, end))
-
-        return labels[isInBounds]
+        return labels[iu.dfInBounds(labels, chrom, start, end)]
 
     pass
 
 
-def checkInBounds(row, chrom, chromStart, chromEnd):
-    try:
-        if not chrom == row['chrom']:
-            return False
-    except KeyError:
-        print('row count', row.count)
-        print("CheckInBoundsKeyError\nRow\n", row, '\n chrom', chrom, 'start', chromStart, 'end', chromEnd)
-        return False
-
-    if chromStart <= row['chromStart'] <= chromEnd:
-        return True
-    elif chromStart <= row['chromEnd'] <= chromEnd:
-        return True
-    else:
-        return (row['chromStart'] < chromEnd) and (row['chromEnd'] > chromEnd)
-
-
 # https://stackoverflow.com/questions/67593037/what-is-an-efficient-method-using-pandas-for-retrieving-data-with-a-given-start
 def checkInBounds_new(df, chrom, chromStart, chromEnd):
     bound1 = df.chromStart.searchsorted(chromStart)
@@ -259,6 +676,310 @@ class ModelSummaries(db.PandasDf):
         df = pd.read_csv(filePath, sep='\t', dtype={'penalty': str})
         return df
 
+    def put(self, value, txn=None):
+        super().put(value, txn=txn)
+
+        # Keep which model is displayed in step with the summaries it's picked from
+        DisplayModel.update(self.values, value, txn=txn)
+        ModelStatus.update(self.values, value, txn=txn)
+
+    pass
+
+
+class DisplayModel(db.Resource):
+    """Penalty of the model which is displayed for a problem, picked from the ModelSummaries when they change
+
+    A penalty of None means none of the models can be displayed and an alternate model is generated instead
+    """
+    keys = ("user", "hub", "track", "chrom", "problemstart")
+
+    def make_details(self):
+        return None
+
+    @classmethod
+    def update(cls, key, modelSums, txn=None):
+        displayDb = cls(*key)
+
+        if modelSums is None:
+            if hasKey(cls, displayDb.values, txn=txn, write=True):
+                displayDb.put(None, txn=txn)
+            return
+
+        try:
+            penalty = Models.displayPenalty(displayDb.values, modelSums, txn=txn)
+        except berkeleydb.db.DBError:
+            # Deadlocks need to get to the retry
+            raise
+        except Exception:
+            # Picking the display model shouldn't stop the summaries being put, an alternate model is shown instead
+            log.exception('Could not pick the display model for %s', displayDb.values)
+            penalty = None
+
+        display = {'penalty': penalty}
+
+        displayDb.put(display, txn=txn)
+
+        return display
+
+    pass
+
+
+class ModelStatus(db.Resource):
+    """Summary of the ModelSummaries of a problem, updated whenever they are put
+
+    Has whether models are processing, the number of zero error models, whether it needs refining,
+    the min error, the max regions, and the penalties which can be used as prediction data points
+    """
+    keys = ("user", "hub", "track", "chrom", "problemstart")
+
+    def make_details(self):
+        return None
+
+    @classmethod
+    def update(cls, key, modelSums, txn=None):
+        statusDb = cls(*key)
+
+        before = statusDb.get(txn=txn, write=True)
+
+        if modelSums is None or modelSums.empty:
+            after = None
+        else:
+            after = Models.modelStatus(modelSums)
+
+        if before is None and after is None:
+            return
+
+        statusDb.put(after, txn=txn)
+
+        ModelStatusIndex.updateProblem(statusDb.values, before, after, txn=txn)
+
+        # The regions are kept with the training data for deciding when to learn, so those changing updates it too
+        if correctPenalties(before) != correctPenalties(after) or statusRegions(before) != statusRegions(after):
+            TrainingData.update(statusDb.values, status=after, txn=txn)
+
+    @classmethod
+    def build(cls, txn=None):
+        """Adds the status of problems with summaries which were put before the status was kept"""
+        built = JobInfo('modelStatusBuilt')
+
+        # Only a build which hasn't happened yet takes the write lock, so readers don't all wait on this record
+        if built.get(txn=txn):
+            return
+
+        if built.get(txn=txn, write=True):
+            return
+
+        cursor = ModelSummaries.getCursor(txn=txn, bulk=True)
+
+        current = cursor.next()
+
+        while current is not None:
+            key, modelSums = current
+
+            cls.update(key, modelSums, txn=txn)
+
+            current = cursor.next()
+
+        cursor.close()
+
+        built.put(1, txn=txn)
+
+    pass
+
+
+def correctPenalties(status):
+    if status is None:
+        return []
+
+    return status['correctPenalties']
+
+
+def statusRegions(status):
+    if status is None:
+        return 0
+
+    return status['regions']
+
+
+class TrainingData(db.Resource):
+    """The features and the log penalties of the zero error models of a problem, its rows in the training set
+
+    Updated when the Features or ModelStatus of the problem change, with each change written to the TrainingLog.
+    Problems which are no longer in the training set keep a record with features of None so their log entry
+    can be replaced
+    """
+    keys = ("user", "hub", "track", "chrom", "problemstart")
+
+    def make_details(self):
+        return None
+
+    @classmethod
+    def update(cls, key, features=None, status=None, txn=None):
+        trainingDb = cls(*key)
+
+        if features is None:
+            features = Features(*key).get(txn=txn)
+
+        if status is None:
+            status = ModelStatus(*key).get(txn=txn)
+
+        before = trainingDb.get(txn=txn, write=True)
+
+        penalties = correctPenalties(status)
+
+        if isinstance(features, pd.Series) and not features.empty and len(penalties) > 0:
+            after = {'features': features,
+                     'logPenalties': np.log10(np.array(penalties, dtype=float)),
+                     'regions': status['regions']}
+        else:
+            if before is None or before['features'] is None:
+                return
+            after = {'features': None}
+
+        if before is not None and 'logTime' in before:
+            TrainingLog(before['logTime'], *trainingDb.values).put(None, txn=txn)
+
+        # A time rather than a counter so changes to different problems don't all lock the same record
+        after['logTime'] = time.time_ns()
+
+        TrainingLog(after['logTime'], *trainingDb.values).put(trainingDb.values, txn=txn)
+        trainingDb.put(after, txn=txn)
+
+    pass
+
+
+class TrainingLog(db.Resource):
+    """Which problem's TrainingData changed at each time in ns, only the latest change of a problem is kept
+
+    The keys are packed with the time first so the changes since a time are read in order from a cursor
+    """
+    keys = ("time", "user", "hub", "track", "chrom", "problemstart")
+
+    @classmethod
+    def toKeyStore(cls, key):
+        return struct.pack('>Q', int(key[0])) + '\x00'.join(str(entry) for entry in key[1:]).encode()
+
+    @classmethod
+    def fromKeyStore(cls, key):
+        return (struct.unpack('>Q', key[:8])[0], *key[8:].decode().split('\x00'))
+
+    @classmethod
+    def since(cls, logTime, txn=None):
+        """Gets the (time, problem key) of each change from logTime onwards, in order"""
+        cursor = cls.getCursor(txn=txn)
+
+        output = []
+
+        current = cursor.getWithKey((logTime,), flags=berkeleydb.db.DB_SET_RANGE)
+
+        while current is not None:
+            key, problemKey = current
+
+            output.append((key[0], problemKey))
+
+            current = cursor.next()
+
+        cursor.close()
+
+        return output
+
+    pass
+
+
+class ModelStatusIndex(db.Resource):
+    """Index of the problems in each status, so only the problems in a status need to be looked at
+
+    The statuses are refine, for problems which the job spawner should check, and correct, for problems with
+    zero error models. The keys are packed with the status first so the problems in a status are next to each other
+    """
+    keys = ("status", "user", "hub", "track", "chrom", "problemstart")
+
+    statuses = ('refine', 'correct')
+
+    @classmethod
+    def toKeyStore(cls, key):
+        return '\x00'.join(str(entry) for entry in key).encode()
+
+    @classmethod
+    def fromKeyStore(cls, key):
+        return tuple(key.decode().split('\x00'))
+
+    @classmethod
+    def statusesOf(cls, status):
+        if status is None:
+            return set()
+
+        output = set()
+
+        if status['needsRefine']:
+            output.add('refine')
+
+        if len(status['correctPenalties']) > 0:
+            output.add('correct')
+
+        return output
+
+    @classmethod
+    def updateProblem(cls, key, before, after, txn=None):
+        """Moves a problem between statuses after its ModelStatus changed from before to after"""
+        beforeStatuses = cls.statusesOf(before)
+        afterStatuses = cls.statusesOf(after)
+
+        for status in beforeStatuses - afterStatuses:
+            cls(status, *key).put(None, txn=txn)
+
+        for status in afterStatuses - beforeStatuses:
+            cls(status, *key).put(True, txn=txn)
+
+    @classmethod
+    def problems(cls, status, txn=None):
+        """Gets the ModelSummaries keys of the problems in a status"""
+        ModelStatus.build(txn=txn)
+
+        cursor = cls.getCursor(txn=txn)
+
+        output = []
+
+        current = cursor.getWithKey((status, ''), flags=berkeleydb.db.DB_SET_RANGE)
+
+        while current is not None:
+            key, value = current
+
+            if key[0] != status:
+                break
+
+            output.append(key[1:])
+
+            current = cursor.next()
+
+        cursor.close()
+
+        return output
+
+    pass
+
+
+class LabelErrors(db.PandasDf):
+    """The error counts of each label for each model of a problem
+
+    Summing the rows of a penalty gives the errors in ModelSummaries for that penalty,
+    which lets a label edit only recalculate the label which changed
+    """
+    keys = ("user", "hub", "track", "chrom", "problemstart")
+
+    def putPenalty(self, penalty, errors, txn=None):
+        """Replaces the label errors for a single penalty"""
+        self.putPenalties([penalty], errors, txn=txn)
+
+    def putPenalties(self, penalties, errors, txn=None):
+        """Replaces the label errors for each of the penalties"""
+        current = self.get(txn=txn, write=True)
+
+        if not current.empty:
+            current = current[~current['penalty'].isin([str(penalty) for penalty in penalties])]
+
+        self.put(current.append(errors, ignore_index=True), txn=txn)
+
     pass
 
 
@@ -268,6 +989,18 @@ class Features(db.Resource):
     def make_details(self):
         return {}
 
+    def put(self, value, txn=None):
+        super().put(value, txn=txn)
+
+        # The problem's rows in the training set are made from its features
+        TrainingData.update(self.values, features=value, txn=txn)
+
+        # Problems which pick their display model using the prediction pick again with their features
+        status = ModelStatus(*self.values).get(txn=txn)
+
+        if status is not None and status['zeroErrors'] > 1:
+            DisplayModel.update(self.values, ModelSummaries(*self.values).get(txn=txn, write=True), txn=txn)
+
     pass
 
 
@@ -280,6 +1013,26 @@ class HubInfo(db.Resource):
     pass
 
 
+class HubIngest(db.Resource):
+    """Progress of setting up an uploaded hub, with the parsed hub and which steps are done"""
+    keys = ("User", "Hub")
+
+    def make_details(self):
+        return None
+
+    pass
+
+
+class GenomeAsset(db.Resource):
+    """Manifest of a prepared genome asset, the files it made with their checksums"""
+    keys = ("Genome", "Asset")
+
+    def make_details(self):
+        return None
+
+    pass
+
+
 class Prediction(db.Resource):
     keys = ("Key",)
 
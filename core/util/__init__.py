@@ -1,3 +1,3 @@
-from . import PLConfig, PLdb, bigWigUtil
+from . import PLConfig, intervalUtil, PLdb, bigWigUtil
 
-__all__ = ['PLConfig', 'PLdb', 'bigWigUtil']
+__all__ = ['PLConfig', 'intervalUtil', 'PLdb', 'bigWigUtil']
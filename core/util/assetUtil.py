@@ -0,0 +1,134 @@
+import os
+import time
+import fcntl
+import hashlib
+import logging
+import threading
+import contextlib
+from core.util import PLdb as db
+
+log = logging.getLogger(__name__)
+
+assetLocks = {}
+assetLocksLock = threading.Lock()
+
+
+class AssetBuildError(Exception):
+    """Raised by builders when what they made can't be trusted, such as a failed download"""
+    pass
+
+
+def getAsset(genome, asset, genomePath, build):
+    """Returns the files of a genome asset, running build only if there isn't a valid one already
+
+    build makes the asset in genomePath and returns the paths of the files it made, raising AssetBuildError if it
+    failed. Only one thread or process checks or builds a (genome, asset) at a time, the others wait for it then use
+    what it made
+    """
+    if not os.path.exists(genomePath):
+        os.makedirs(genomePath, exist_ok=True)
+
+    with assetLock(genome, asset, genomePath):
+        files = checkAsset(genome, asset, genomePath)
+
+        if files is not None:
+            return files
+
+        files = build()
+
+        if files is None:
+            return None
+
+        putManifest(genome, asset, genomePath, files)
+
+        return files
+
+
+@contextlib.contextmanager
+def assetLock(genome, asset, genomePath):
+    # flock is per open file, so this covers other processes and the thread lock covers this one
+    with assetLocksLock:
+        lock = assetLocks.setdefault((genome, asset), threading.Lock())
+
+    with lock:
+        with open(os.path.join(genomePath, '.%s.lock' % asset), 'w') as lockFile:
+            fcntl.flock(lockFile, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lockFile, fcntl.LOCK_UN)
+
+
+def checkAsset(genome, asset, genomePath):
+    """Returns the files of an asset if its manifest matches what is on disk, otherwise removes what is left of it
+
+    Only call this with the asset's lock held
+    """
+    manifest = db.GenomeAsset(genome, asset).get()
+
+    if manifest is None:
+        return None
+
+    files = []
+
+    for relPath, fileInfo in manifest['files'].items():
+        path = os.path.join(genomePath, relPath)
+
+        if not checkFile(path, fileInfo):
+            log.warning('Genome asset %s %s failed validation on %s, rebuilding', genome, asset, relPath)
+            removeAsset(genome, asset, genomePath, manifest)
+            return None
+
+        files.append(path)
+
+    return files
+
+
+def checkFile(path, fileInfo):
+    if not os.path.exists(path):
+        return False
+
+    stat = os.stat(path)
+
+    if stat.st_size != fileInfo['size']:
+        return False
+
+    # Only hash files which were touched since the manifest was made, the FASTA files are big
+    if stat.st_mtime == fileInfo['mtime']:
+        return True
+
+    return fileChecksum(path) == fileInfo['checksum']
+
+
+def removeAsset(genome, asset, genomePath, manifest):
+    # So the builders which skip files which exist don't reuse the bad ones
+    for relPath in manifest['files']:
+        path = os.path.join(genomePath, relPath)
+
+        if os.path.exists(path):
+            os.remove(path)
+
+    db.GenomeAsset(genome, asset).put(None)
+
+
+def putManifest(genome, asset, genomePath, files):
+    manifestFiles = {}
+
+    for path in files:
+        stat = os.stat(path)
+
+        manifestFiles[os.path.relpath(path, start=genomePath)] = {'checksum': fileChecksum(path),
+                                                                  'size': stat.st_size,
+                                                                  'mtime': stat.st_mtime}
+
+    db.GenomeAsset(genome, asset).put({'files': manifestFiles, 'created': time.time()})
+
+
+def fileChecksum(path):
+    sha = hashlib.sha256()
+
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha.update(block)
+
+    return sha.hexdigest()
@@ -1,8 +1,23 @@
 import math
+import threading
 import subprocess
+import collections
+import numpy as np
+
+# Number of bins in each cached tile, and the number of tiles to keep
+tileBins = 1000
+maxCachedTiles = 2000
+
+tileCache = collections.OrderedDict()
+tileLock = threading.Lock()
 
 
 def bigWigSummary(url, chrom, start, end, bins):
+    return runBigWigSummary(url, chrom, start, end, bins).tolist()
+
+
+def runBigWigSummary(url, chrom, start, end, bins):
+    """Runs bigWigSummary, returning the bins as an array with n/a as 0"""
     sumOut = subprocess.run(['bin/bigWigSummary',
                              url,
                              chrom,
@@ -11,17 +26,65 @@ def bigWigSummary(url, chrom, start, end, bins):
                              str(bins)],
                             stdout=subprocess.PIPE).stdout.decode('utf-8')
 
-    sumData = sumOut.split()
-    floatData = []
-    for i in sumData:
-        if i == 'n/a':
-            val = 0
-        else:
-            val = float(i)
+    sumData = np.array(sumOut.split(), dtype=object)
+    sumData[sumData == 'n/a'] = '0'
+
+    return sumData.astype(float)
+
+
+def tiledSummary(url, chrom, start, end, binSize, chromEnd):
+    """Summary of start to end with binSize bases per bin, using cached tiles where possible
+
+    Tiles are aligned to multiples of binSize * tileBins so panning and zooming back to a scale reuse the
+    same tiles, start and end have to be multiples of binSize. The tile which crosses chromEnd is cut short at the
+    last whole bin before it, bigWigSummary can't summarize past the end of a chrom. The tiles which aren't cached
+    are fetched with one bigWigSummary call. Returns an empty list if bigWigSummary doesn't give back every bin.
+    """
+    tileSize = binSize * tileBins
+    lastBinEnd = chromEnd // binSize * binSize
+
+    if end > lastBinEnd:
+        return []
+
+    firstTile = start // tileSize
+    lastTile = (end - 1) // tileSize
+
+    tileKeys = [(url, chrom, binSize, tile) for tile in range(firstTile, lastTile + 1)]
+
+    with tileLock:
+        tiles = {}
+        for key in tileKeys:
+            if key in tileCache:
+                tileCache.move_to_end(key)
+                tiles[key] = tileCache[key]
+
+    missing = [key for key in tileKeys if key not in tiles]
+
+    if missing:
+        fetchStart = missing[0][3] * tileSize
+        fetchEnd = min((missing[-1][3] + 1) * tileSize, lastBinEnd)
+        fetchBins = (fetchEnd - fetchStart) // binSize
+
+        fetched = runBigWigSummary(url, chrom, fetchStart, fetchEnd, fetchBins)
+
+        if len(fetched) != fetchBins:
+            return []
+
+        with tileLock:
+            for key in tileKeys[tileKeys.index(missing[0]):tileKeys.index(missing[-1]) + 1]:
+                offset = (key[3] * tileSize - fetchStart) // binSize
+                tiles[key] = fetched[offset:offset + tileBins]
+                tileCache[key] = tiles[key]
+                tileCache.move_to_end(key)
+
+            while len(tileCache) > maxCachedTiles:
+                tileCache.popitem(last=False)
+
+    output = np.concatenate([tiles[key] for key in tileKeys])
 
-        floatData.append(val)
+    offset = (start - firstTile * tileSize) // binSize
 
-    return floatData
+    return output[offset:offset + (end - start) // binSize].tolist()
 
 
 def anscombeApply(val):
@@ -0,0 +1,88 @@
+import struct
+import numpy as np
+import pandas as pd
+
+# Content type for the packed column layout, decoded by Store/SeqFeature/Binary.js in the PeakLearnerBackend plugin
+contentType = 'application/vnd.peaklearner.columns'
+
+# Column types
+floatColumn = 0
+intColumn = 1
+stringColumn = 2
+
+int32Min = np.iinfo(np.int32).min
+int32Max = np.iinfo(np.int32).max
+
+
+def packString(value):
+    encoded = str(value).encode('utf-8')
+
+    return struct.pack('<H', len(encoded)) + encoded
+
+
+def packColumn(column):
+    """Packs a column as a type byte followed by its values, all little endian
+
+    Integers which fit are int32 and other numbers are float64. Strings are the unique values followed by an
+    uint32 code per row, most string columns here are things like the ref or label type which repeat a lot
+    """
+    values = column.to_numpy()
+
+    if pd.api.types.is_integer_dtype(values.dtype) or pd.api.types.is_bool_dtype(values.dtype):
+        if len(values) < 1 or (values.min() >= int32Min and values.max() <= int32Max):
+            return struct.pack('<B', intColumn) + values.astype('<i4').tobytes()
+
+    if pd.api.types.is_numeric_dtype(values.dtype):
+        return struct.pack('<B', floatColumn) + values.astype('<f8').tobytes()
+
+    codes, uniques = pd.factorize(column)
+
+    # Missing values get their own category rather than a -1 code
+    if (codes < 0).any():
+        codes[codes < 0] = len(uniques)
+        uniques = list(uniques) + ['']
+
+    output = [struct.pack('<BI', stringColumn, len(uniques))]
+    output.extend(packString(unique) for unique in uniques)
+    output.append(codes.astype('<u4').tobytes())
+
+    return b''.join(output)
+
+
+def dfToBinary(df):
+    """Packs a DataFrame column by column
+
+    The layout is an uint32 row count and uint32 column count, then for each column its name as an uint16 length
+    with utf-8 bytes, followed by the packed column
+    """
+    output = [struct.pack('<II', len(df.index), len(df.columns))]
+
+    for name in df.columns:
+        output.append(packString(name))
+        output.append(packColumn(df[name]))
+
+    return b''.join(output)
+
+
+def tablesToBinary(tables):
+    """Packs a list of (name, DataFrame) pairs, each as its name, an uint32 byte length, and the packed table"""
+    output = [struct.pack('<I', len(tables))]
+
+    for name, df in tables:
+        packed = dfToBinary(df)
+
+        output.append(packString(name))
+        output.append(struct.pack('<I', len(packed)))
+        output.append(packed)
+
+    return b''.join(output)
+
+
+def dfToFrame(df):
+    """Packs a DataFrame as an uint32 byte length and the packed table
+
+    Streamed responses are a series of these frames, read until the end of the response
+    """
+    packed = dfToBinary(df)
+
+    return struct.pack('<I', len(packed)) + packed
@@ -0,0 +1,77 @@
+import numpy as np
+
+
+def toArrays(df, startCol='chromStart', endCol='chromEnd'):
+    """Gets the start and end columns of a DataFrame as int64 arrays"""
+    return df[startCol].to_numpy(dtype=np.int64), df[endCol].to_numpy(dtype=np.int64)
+
+
+def inBounds(starts, ends, queryStart, queryEnd):
+    """Mask of which intervals overlap the region queryStart to queryEnd, both ends inclusive"""
+    starts = np.asarray(starts)
+    ends = np.asarray(ends)
+
+    startInside = (queryStart <= starts) & (starts <= queryEnd)
+    endInside = (queryStart <= ends) & (ends <= queryEnd)
+    covers = (starts < queryEnd) & (ends > queryEnd)
+
+    return startInside | endInside | covers
+
+
+def dfInBounds(df, chrom, queryStart, queryEnd):
+    """Mask of which rows of a DataFrame with chrom, chromStart, and chromEnd are in the region"""
+    if len(df.index) < 1:
+        return np.zeros(0, dtype=bool)
+
+    starts, ends = toArrays(df)
+
+    sameChrom = (df['chrom'] == chrom).to_numpy()
+
+    return sameChrom & inBounds(starts, ends, queryStart, queryEnd)
+
+
+def sortIntervals(starts, ends):
+    """Sorts intervals by start
+
+    Returns the order used to sort, the sorted starts and ends,
+    and the running max of the sorted ends which is what makes the ends searchable
+    """
+    starts = np.asarray(starts, dtype=np.int64)
+    ends = np.asarray(ends, dtype=np.int64)
+
+    order = np.argsort(starts, kind='stable')
+    sortedStarts = starts[order]
+    sortedEnds = ends[order]
+
+    if len(sortedEnds):
+        maxEnds = np.maximum.accumulate(sortedEnds)
+    else:
+        maxEnds = sortedEnds
+
+    return order, sortedStarts, sortedEnds, maxEnds
+
+
+def anyInBounds(starts, ends, queryStarts, queryEnds):
+    """For each query region, whether any of the intervals overlap it
+
+    Intervals are sorted once and each query is a binary search, rather than checking every interval per query
+    """
+    queryStarts = np.asarray(queryStarts, dtype=np.int64)
+    queryEnds = np.asarray(queryEnds, dtype=np.int64)
+
+    if len(starts) < 1:
+        return np.zeros(len(queryStarts), dtype=bool)
+
+    order, sortedStarts, sortedEnds, maxEnds = sortIntervals(starts, ends)
+
+    # Number of intervals which start at or before the end of each query
+    numBefore = np.searchsorted(sortedStarts, queryEnds, side='right')
+
+    hasBefore = numBefore > 0
+
+    output = np.zeros(len(queryStarts), dtype=bool)
+
+    # Of those, at least one has to end at or after the start of the query
+    output[hasBefore] = maxEnds[numBefore[hasBefore] - 1] >= queryStarts[hasBefore]
+
+    return output
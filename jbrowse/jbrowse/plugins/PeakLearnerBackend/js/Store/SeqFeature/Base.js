@@ -9,7 +9,8 @@ define([
         'JBrowse/Model/SimpleFeature',
         'JBrowse/View/Track/_FeatureDetailMixin',
         'JBrowse/Store/LRUCache',
-        'dojo/request/xhr'
+        'dojo/request/xhr',
+        './Batch'
     ],
     function (
         declare,
@@ -22,7 +23,8 @@ define([
         SimpleFeature,
         FeatureDetailMixin,
         LRUCache,
-        xhr
+        xhr,
+        Batch
     ) {
         return declare(FeatureDetailMixin, {
             constructor: function (args) {
@@ -105,7 +107,8 @@ define([
                 }
             },
             _readChunk: function (query, callback) {
-                this.sendGet(query, callback)
+                // Sent along with the chunks of the other tracks, rather than one request per track
+                Batch.get(this.getTrackFeaturesUrl(), this.track, this.handler, query, callback)
             },
             addFeature: function (query, callback) {
                 this.sendPut(query, this.getHubHandlerUrl(), callback);
@@ -227,6 +230,9 @@ define([
             getHubHandlerUrl: function() {
                 return this.handler + '/'
             },
+            getTrackFeaturesUrl: function() {
+                return 'trackFeatures/'
+            },
             // Acquired from jbrowse/Store/SeqFeature/REST.js
             _errorHandler: function (handler) {
                 handler = handler || function (e) {
@@ -0,0 +1,94 @@
+define([
+        'dojo/request/xhr',
+        './Binary'
+    ],
+    function (
+        xhr,
+        Binary
+    ) {
+        // Chunk requests from every PeakLearner store made within this many ms are sent as one request
+        const batchWait = 10;
+
+        let batches = {};
+
+        let sendBatch = function (key) {
+            let batch = batches[key];
+            delete batches[key];
+
+            let tracks = [];
+            let handlers = [];
+
+            batch.requests.forEach(request => {
+                if (!tracks.includes(request.track)) {
+                    tracks.push(request.track);
+                }
+                if (!handlers.includes(request.handler)) {
+                    handlers.push(request.handler);
+                }
+            })
+
+            let query = Object.assign({}, batch.query, {
+                tracks: tracks.join(','),
+                handlers: handlers.join(',')
+            });
+
+            let xhrArgs = {
+                handleAs: 'arraybuffer',
+                method: 'get',
+                query: query,
+                headers: {Accept: Binary.contentType}
+            };
+            xhr(batch.url, xhrArgs).then(
+                function (buffer) {
+                    let data = Binary.decodeTracks(buffer);
+
+                    batch.requests.forEach(request => {
+                        let trackData = data ? data[request.track] : undefined;
+
+                        request.callback(trackData ? trackData[request.handler] : []);
+                    })
+                },
+                function (err) {
+                    console.log(err)
+
+                    // The stores are still waiting on their chunks, so they finish loading with nothing
+                    batch.requests.forEach(request => {
+                        request.callback([]);
+                    })
+                }
+            );
+        };
+
+        // The query without the functions which the stores add to it
+        let queryFields = function (query) {
+            let fields = {};
+
+            Object.keys(query).sort().forEach(name => {
+                if (name !== 'toString' && name !== 'name') {
+                    fields[name] = query[name];
+                }
+            })
+
+            return fields;
+        };
+
+        return {
+            // Queues a models or labels request for a track, which is sent with the other tracks making the same query
+            get: function (url, track, handler, query, callback) {
+                let fields = queryFields(query);
+
+                // Models also send what is needed for the alternative models, so they are only batched with tracks
+                // asking for the same ones
+                let key = url + '?' + JSON.stringify(fields);
+
+                let batch = batches[key];
+
+                if (!batch) {
+                    batch = batches[key] = {url: url, query: fields, requests: []};
+                    setTimeout(() => sendBatch(key), batchWait);
+                }
+
+                batch.requests.push({track: track, handler: handler, callback: callback});
+            }
+        };
+    });
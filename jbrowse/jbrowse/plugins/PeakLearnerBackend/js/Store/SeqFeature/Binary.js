@@ -0,0 +1,147 @@
+define([],
+    function () {
+        // Decoder for the packed column layout made by core/util/binaryUtil.py
+        const contentType = 'application/vnd.peaklearner.columns';
+
+        const floatColumn = 0;
+        const intColumn = 1;
+        const stringColumn = 2;
+
+        const decoder = new TextDecoder('utf-8');
+
+        let Reader = function (buffer, offset) {
+            this.view = new DataView(buffer);
+            this.buffer = buffer;
+            this.offset = offset || 0;
+        };
+
+        Reader.prototype.uint8 = function () {
+            let value = this.view.getUint8(this.offset);
+            this.offset += 1;
+            return value;
+        };
+
+        Reader.prototype.uint32 = function () {
+            let value = this.view.getUint32(this.offset, true);
+            this.offset += 4;
+            return value;
+        };
+
+        Reader.prototype.string = function () {
+            let length = this.view.getUint16(this.offset, true);
+            this.offset += 2;
+            let value = decoder.decode(new Uint8Array(this.buffer, this.offset, length));
+            this.offset += length;
+            return value;
+        };
+
+        // Copied out of the buffer as the typed arrays need to be aligned to their element size
+        Reader.prototype.array = function (ArrayType, length) {
+            let end = this.offset + length * ArrayType.BYTES_PER_ELEMENT;
+            let values = new ArrayType(this.buffer.slice(this.offset, end));
+            this.offset = end;
+            return values;
+        };
+
+        Reader.prototype.column = function (numRows) {
+            let type = this.uint8();
+
+            if (type === floatColumn) {
+                return this.array(Float64Array, numRows);
+            }
+
+            if (type === intColumn) {
+                return this.array(Int32Array, numRows);
+            }
+
+            if (type === stringColumn) {
+                let uniques = [];
+                let numUniques = this.uint32();
+                for (let i = 0; i < numUniques; i++) {
+                    uniques.push(this.string());
+                }
+
+                let codes = this.array(Uint32Array, numRows);
+                return Array.from(codes, code => uniques[code]);
+            }
+
+            throw new Error('Unknown column type ' + type);
+        };
+
+        Reader.prototype.table = function () {
+            let numRows = this.uint32();
+            let numColumns = this.uint32();
+
+            let columns = {};
+            for (let i = 0; i < numColumns; i++) {
+                let name = this.string();
+                columns[name] = this.column(numRows);
+            }
+
+            return {numRows: numRows, columns: columns};
+        };
+
+        // The same records the json responses have, one object per row
+        let toRecords = function (table) {
+            let names = Object.keys(table.columns);
+            let records = new Array(table.numRows);
+
+            for (let row = 0; row < table.numRows; row++) {
+                let record = {};
+                names.forEach(name => {
+                    record[name] = table.columns[name][row];
+                });
+                records[row] = record;
+            }
+
+            return records;
+        };
+
+        return {
+            contentType: contentType,
+
+            decodeTable: function (buffer) {
+                return toRecords(new Reader(buffer).table());
+            },
+
+            // Decodes a streamed response, which is frames of a byte length and a table, into one list of records
+            decodeFrames: function (buffer) {
+                let reader = new Reader(buffer);
+                let output = [];
+
+                while (reader.offset < buffer.byteLength) {
+                    let length = reader.uint32();
+                    let end = reader.offset + length;
+
+                    output = output.concat(toRecords(reader.table()));
+
+                    reader.offset = end;
+                }
+
+                return output;
+            },
+
+            // Decodes the tables of a trackFeatures response into {track: {handler: records}}
+            decodeTracks: function (buffer) {
+                let reader = new Reader(buffer);
+                let output = {};
+
+                let numTables = reader.uint32();
+                for (let i = 0; i < numTables; i++) {
+                    let name = reader.string().split('\t');
+                    let length = reader.uint32();
+                    let end = reader.offset + length;
+
+                    let track = name[0];
+                    let handler = name[1];
+
+                    output[track] = output[track] || {};
+                    output[track][handler] = toRecords(reader.table());
+
+                    reader.offset = end;
+                }
+
+                return output;
+            }
+        };
+    });
@@ -66,13 +66,30 @@ function (
                 showLabel: true,
                 label: 'Upload Hub',
                 onClick: () => {
-                    // TODO: Make this in such a way that it can "Ping the server" on progress instead of waiting for the server to complete
                     var desc = {"url": content.urlBox.get('value')};
-                    var success = (data, status, xhr) => {
-                        document.getElementById('uploadStatus').innerHTML="" +
-                            "<a href=\"" + data + "\">New Hub Url</a> ";
+                    var uploadStatus = document.getElementById('uploadStatus');
+                    // The hub is set up in the background, so check on it until it is ready
+                    var checkIngest = (hub) => {
+                        $.getJSON(hub.status, (ingest) => {
+                            if (ingest.status === 'done') {
+                                uploadStatus.innerHTML = "<a href=\"" + hub.path + "\">New Hub Url</a> ";
+                            } else if (ingest.status === 'error') {
+                                uploadStatus.innerHTML = "Hub upload failed: " + ingest.error;
+                            } else {
+                                uploadStatus.innerHTML = "Setting up hub: " + (ingest.stage || ingest.status);
+                                setTimeout(() => checkIngest(hub), 2000);
+                            }
+                        });
                     };
-                    sendPost('parseHub', '/uploadHubUrl/', desc, success);
+                    $.ajax('/uploadHubUrl/', {
+                        data: JSON.stringify(desc),
+                        type: 'PUT',
+                        success: checkIngest,
+                        error: (xhr) => {
+                            var error = xhr.responseJSON && xhr.responseJSON.error;
+                            uploadStatus.innerHTML = "Hub upload failed: " + (error || xhr.statusText);
+                        }
+                    });
                     content.urlBox.reset();
                 }
             }).placeAt(markDescriptionDiv);
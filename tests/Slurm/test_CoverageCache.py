@@ -0,0 +1,64 @@
+import os
+import shutil
+import tempfile
+import unittest
+from Slurm import CoverageCache as cache
+
+
+class CoverageCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.tempDir = tempfile.mkdtemp()
+        self.cachePath = cache.cfg.cachePath
+        self.cacheSize = cache.cfg.cacheSize
+        cache.cfg.cachePath = os.path.join(self.tempDir, 'cache')
+
+    def tearDown(self):
+        cache.cfg.cachePath = self.cachePath
+        cache.cfg.cacheSize = self.cacheSize
+        shutil.rmtree(self.tempDir)
+
+    def writeCoverage(self, name, size):
+        path = os.path.join(self.tempDir, name)
+        with open(path, 'w') as f:
+            f.write('a' * size)
+        return path
+
+    def test_getPut(self):
+        key = cache.cacheKey('url', 'chr1', 0, 100)
+
+        assert key != cache.cacheKey('url', 'chr1', 0, 101)
+
+        output = os.path.join(self.tempDir, 'output.bedGraph')
+
+        with cache.lock(key):
+            assert not cache.get(key, output)
+
+            cache.put(key, self.writeCoverage('coverage', 10))
+
+            assert cache.get(key, output)
+
+        with open(output) as f:
+            assert f.read() == 'a' * 10
+
+    def test_evict(self):
+        cache.cfg.cacheSize = 25
+
+        keys = [cache.cacheKey('url', 'chr1', start, start + 100) for start in range(3)]
+
+        for num, key in enumerate(keys):
+            with cache.lock(key):
+                cache.put(key, self.writeCoverage(str(num), 10))
+            os.utime(cache.entryPath(key), (num, num))
+
+        cache.evict()
+
+        assert not os.path.exists(cache.entryPath(keys[0]))
+        assert os.path.exists(cache.entryPath(keys[1]))
+        assert os.path.exists(cache.entryPath(keys[2]))
+
+        # The lock files go with the entries
+        assert not os.path.exists(cache.lockPath(keys[0]))
+        assert os.path.exists(cache.lockPath(keys[1]))
+
+        with cache.lock(keys[0]) as locked:
+            assert locked
@@ -0,0 +1,31 @@
+import unittest
+import numpy as np
+import pandas as pd
+from Slurm import Features
+
+
+class FeaturesTests(unittest.TestCase):
+    def test_coverageFeatures(self):
+        rng = np.random.default_rng(0)
+        starts = np.cumsum(rng.integers(1, 50, 100))
+        ends = starts + rng.integers(1, 20, 100)
+        counts = rng.integers(0, 10, 100)
+
+        coverage = pd.DataFrame({'chrom': 'chr1', 'chromStart': starts, 'chromEnd': ends, 'count': counts})
+
+        features = Features.coverageFeatures(coverage).iloc[0]
+
+        # Same values as computing them on one count per base
+        perBase = np.repeat(counts, ends - starts)
+
+        expected = np.quantile(perBase, Features.quartiles)
+
+        assert np.allclose(features[Features.quartileNames].to_numpy(dtype=float), expected)
+        assert np.isclose(features['mean'], perBase.mean())
+        assert np.isclose(features['sd'], perBase.std(ddof=1))
+        assert features['bases'] == len(perBase)
+        assert features['data'] == 100
+        assert np.isclose(features['log+1.mean'], np.log(perBase.mean() + 1))
+        assert np.isclose(features['log.log.bases'], np.log(np.log(len(perBase))))
+
+        assert len(features.index) == 36
@@ -47,6 +47,20 @@ class PeakLearnerTests(Base.PeakLearnerTestBase):
             runTask()
 
 
+    def test_slurmWorker(self):
+        from core.util import PLdb as db
+
+        from Slurm.run import runWorker
+
+        runWorker(numWorkers=2, runTime=0, maxIdle=5)
+
+        txn = db.getTxn()
+        jobs = db.Job.all(txn=txn)
+        txn.commit()
+
+        for job in jobs:
+            assert job.status.lower() != 'queued'
+
     def tearDown(self):
         super().tearDown()
 
@@ -0,0 +1,51 @@
+import unittest
+from core.util import PLConfig as cfg
+from core.Prediction import Prediction
+
+
+class PredictionSchedulerTests(unittest.TestCase):
+    def setUp(self):
+        Prediction.scheduler['changes'] = None
+        Prediction.scheduler['pendingSince'] = None
+
+    def state(self, changes, learnedChanges=0, labeledRegions=cfg.minLabeledRegions,
+              learnedRegions=cfg.minLabeledRegions):
+        return {'changes': changes,
+                'learnedChanges': learnedChanges,
+                'labeledRegions': labeledRegions,
+                'learnedRegions': learnedRegions}
+
+    def test_notEnoughRegions(self):
+        state = self.state(cfg.numChanges, labeledRegions=cfg.minLabeledRegions - 1, learnedRegions=0)
+
+        assert not Prediction.shouldLearn(state, 0)
+        assert not Prediction.shouldLearn(state, cfg.timeBetween * 2)
+
+    def test_notEnoughChanges(self):
+        state = self.state(cfg.numChanges - 1)
+
+        assert not Prediction.shouldLearn(state, 0)
+        assert not Prediction.shouldLearn(state, 1)
+
+    def test_waitsForChangesToStop(self):
+        # The first check which sees the changes waits for the labeling to settle
+        assert not Prediction.shouldLearn(self.state(cfg.numChanges), 0)
+
+        # Still labeling
+        assert not Prediction.shouldLearn(self.state(cfg.numChanges + 1), 1)
+
+        # Nothing changed since the last check
+        assert Prediction.shouldLearn(self.state(cfg.numChanges + 1), 2)
+
+    def test_longBurstOfChanges(self):
+        assert not Prediction.shouldLearn(self.state(cfg.numChanges), 0)
+
+        # Labeling which never stops still learns after timeBetween
+        assert Prediction.shouldLearn(self.state(cfg.numChanges + 1), cfg.timeBetween)
+
+    def test_firstModel(self):
+        # Crossing the minimum number of labeled regions learns without waiting for numChanges
+        state = self.state(1, learnedRegions=0)
+
+        assert not Prediction.shouldLearn(state, 0)
+        assert Prediction.shouldLearn(state, 1)
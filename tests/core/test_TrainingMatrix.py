@@ -0,0 +1,105 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from core.Prediction import TrainingMatrix
+
+
+def trainingData(features, logPenalties, logTime, regions=1):
+    return {'features': pd.Series(features),
+            'logPenalties': np.array(logPenalties, dtype=float),
+            'regions': regions,
+            'logTime': logTime}
+
+
+class TrainingMatrixTests(unittest.TestCase):
+    def setUp(self):
+        self.tempDir = tempfile.mkdtemp()
+        self.minCapacity = TrainingMatrix.minCapacity
+        TrainingMatrix.minCapacity = 2
+
+    def tearDown(self):
+        TrainingMatrix.minCapacity = self.minCapacity
+        shutil.rmtree(self.tempDir)
+
+    def newMatrix(self):
+        return TrainingMatrix.TrainingMatrix(self.tempDir)
+
+    def rows(self, matrix):
+        """The (features, logPenalty) of each row, sorted so the order the rows are kept in doesn't matter"""
+        X, Y = matrix.dataPoints()
+
+        return sorted(zip(map(tuple, X.fillna(-1).to_numpy().tolist()), Y.tolist()))
+
+    def test_updateRemove(self):
+        matrix = self.newMatrix()
+
+        with matrix.locked():
+            matrix.update(('a',), trainingData({'f1': 1.0, 'f2': 2.0}, [1, 2], 1))
+            matrix.update(('b',), trainingData({'f1': 3.0, 'f2': 4.0}, [3], 2, regions=2))
+            matrix.update(('c',), trainingData({'f1': 5.0, 'f2': 6.0}, [4, 5], 3))
+            matrix.save()
+
+        assert matrix.index['regions'] == 4
+        assert len(self.rows(matrix)) == 5
+
+        with matrix.locked():
+            # Removing a problem moves the last rows into its place
+            matrix.update(('a',), {'features': None, 'logTime': 4})
+            # Same number of penalties is changed in place, a different number moves the problem to the end
+            matrix.update(('b',), trainingData({'f1': 7.0, 'f2': 8.0}, [6], 5, regions=3))
+            matrix.update(('c',), trainingData({'f1': 9.0, 'f2': 10.0}, [7, 8, 9], 6))
+            matrix.save()
+
+        assert matrix.index['regions'] == 4
+        assert self.rows(matrix) == [((7.0, 8.0), 6.0), ((9.0, 10.0), 7.0), ((9.0, 10.0), 8.0), ((9.0, 10.0), 9.0)]
+
+        # The same change again doesn't do anything
+        with matrix.locked():
+            assert not matrix.update(('b',), trainingData({'f1': 7.0, 'f2': 8.0}, [6], 5, regions=3))
+
+    def test_newColumns(self):
+        matrix = self.newMatrix()
+
+        with matrix.locked():
+            matrix.update(('a',), trainingData({'f1': 1.0}, [1], 1))
+            matrix.update(('b',), trainingData({'f1': 2.0, 'f2': 3.0}, [2], 2))
+            matrix.save()
+
+        assert self.rows(matrix) == [((1.0, -1.0), 1.0), ((2.0, 3.0), 2.0)]
+
+    def test_sharedOnDisk(self):
+        matrix = self.newMatrix()
+
+        with matrix.locked():
+            for num in range(5):
+                matrix.update((str(num),), trainingData({'f1': float(num)}, [num], num))
+            matrix.save()
+
+        # Another process loads what was saved
+        other = self.newMatrix()
+
+        with other.locked():
+            assert self.rows(other) == self.rows(matrix)
+
+        # Only the arrays which are in use are left
+        assert sorted(name for name in os.listdir(self.tempDir) if name.endswith('.npy')) == ['X.3.npy', 'Y.3.npy']
+
+    def test_stoppedPartWay(self):
+        matrix = self.newMatrix()
+
+        with matrix.locked():
+            matrix.update(('a',), trainingData({'f1': 1.0}, [1], 1))
+            matrix.save()
+
+            # Stops before saving
+            matrix.update(('b',), trainingData({'f1': 2.0}, [2], 2))
+
+        other = self.newMatrix()
+
+        # The training set is built again from nothing
+        with other.locked():
+            assert other.dataPoints() is None
+            assert other.index['logTime'] == 0
@@ -0,0 +1,82 @@
+import struct
+import unittest
+import numpy as np
+import pandas as pd
+from core.util import binaryUtil
+
+
+def readString(data, offset):
+    length, = struct.unpack_from('<H', data, offset)
+    offset += 2
+    return data[offset:offset + length].decode('utf-8'), offset + length
+
+
+def readTable(data, offset=0):
+    """Python version of the decoder in the PeakLearnerBackend plugin"""
+    numRows, numColumns = struct.unpack_from('<II', data, offset)
+    offset += 8
+
+    columns = {}
+    for i in range(numColumns):
+        name, offset = readString(data, offset)
+        columnType, = struct.unpack_from('<B', data, offset)
+        offset += 1
+
+        if columnType == binaryUtil.floatColumn:
+            columns[name] = np.frombuffer(data, '<f8', numRows, offset)
+            offset += numRows * 8
+        elif columnType == binaryUtil.intColumn:
+            columns[name] = np.frombuffer(data, '<i4', numRows, offset)
+            offset += numRows * 4
+        else:
+            numUniques, = struct.unpack_from('<I', data, offset)
+            offset += 4
+            uniques = []
+            for j in range(numUniques):
+                unique, offset = readString(data, offset)
+                uniques.append(unique)
+            codes = np.frombuffer(data, '<u4', numRows, offset)
+            offset += numRows * 4
+            columns[name] = [uniques[code] for code in codes]
+
+    return pd.DataFrame(columns), offset
+
+
+class BinaryUtilTests(unittest.TestCase):
+    def test_dfToBinary(self):
+        df = pd.DataFrame({'ref': ['chr1', 'chr1', 'chr2'],
+                           'start': [100, 2000, 3000000000],
+                           'end': [200, 3000, 4000],
+                           'type': ['peak', 'peak', 'lopart'],
+                           'score': [1.5, 2.25, 10.0]})
+
+        out, offset = readTable(binaryUtil.dfToBinary(df))
+
+        assert offset == len(binaryUtil.dfToBinary(df))
+        assert out['ref'].tolist() == df['ref'].tolist()
+        assert out['type'].tolist() == df['type'].tolist()
+        assert out['end'].tolist() == df['end'].tolist()
+        assert out['score'].tolist() == df['score'].tolist()
+        # Too big for int32, so it has to be a float
+        assert out['start'].tolist() == df['start'].tolist()
+
+    def test_tablesToBinary(self):
+        labels = pd.DataFrame({'ref': ['chr1'], 'start': [1], 'end': [2], 'label': ['noPeak']})
+
+        data = binaryUtil.tablesToBinary([('track\tlabels', labels), ('track\tmodels', pd.DataFrame())])
+
+        numTables, = struct.unpack_from('<I', data)
+        assert numTables == 2
+
+        name, offset = readString(data, 4)
+        assert name == 'track\tlabels'
+
+        out, offset = readTable(data, offset + 4)
+        assert out.to_dict('records') == labels.to_dict('records')
+
+        name, offset = readString(data, offset)
+        assert name == 'track\tmodels'
+
+        out, offset = readTable(data, offset + 4)
+        assert len(out.index) == 0
+        assert offset == len(data)
@@ -0,0 +1,50 @@
+import unittest
+import numpy as np
+import pandas as pd
+from core.util import intervalUtil as iu
+
+
+def bruteForceInBounds(start, end, queryStart, queryEnd):
+    if queryStart <= start <= queryEnd:
+        return True
+    elif queryStart <= end <= queryEnd:
+        return True
+    return (start < queryEnd) and (end > queryEnd)
+
+
+class IntervalUtilTests(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(123)
+        self.starts = rng.integers(0, 10000, 200)
+        self.ends = self.starts + rng.integers(1, 500, 200)
+        self.queryStarts = rng.integers(0, 11000, 300)
+        self.queryEnds = self.queryStarts + rng.integers(0, 1000, 300)
+
+    def test_inBounds(self):
+        for queryStart, queryEnd in zip(self.queryStarts[:20], self.queryEnds[:20]):
+            expected = [bruteForceInBounds(start, end, queryStart, queryEnd)
+                        for start, end in zip(self.starts, self.ends)]
+
+            out = iu.inBounds(self.starts, self.ends, queryStart, queryEnd)
+
+            assert out.tolist() == expected
+
+    def test_dfInBounds(self):
+        df = pd.DataFrame({'chrom': ['chr1', 'chr2'] * 100, 'chromStart': self.starts, 'chromEnd': self.ends})
+
+        out = iu.dfInBounds(df, 'chr1', 0, 5000)
+
+        assert not out[1::2].any()
+        assert out[::2].tolist() == iu.inBounds(self.starts[::2], self.ends[::2], 0, 5000).tolist()
+
+        assert len(iu.dfInBounds(pd.DataFrame(), 'chr1', 0, 5000)) == 0
+
+    def test_anyInBounds(self):
+        expected = [iu.inBounds(self.starts, self.ends, queryStart, queryEnd).any()
+                    for queryStart, queryEnd in zip(self.queryStarts, self.queryEnds)]
+
+        out = iu.anyInBounds(self.starts, self.ends, self.queryStarts, self.queryEnds)
+
+        assert out.tolist() == expected
+
+        assert not iu.anyInBounds([], [], [0, 10], [5, 20]).any()
@@ -30,6 +30,8 @@ useThreads = False
 class PeakLearnerJobsTests(Base.PeakLearnerTestBase):
     jobsURL = '/Jobs/'
     queueUrl = '%squeue/' % jobsURL
+    leaseUrl = '%slease/' % jobsURL
+    tasksUrl = '%stasks/' % jobsURL
 
     def setUp(self):
         super().setUp()
@@ -164,20 +166,23 @@ class PeakLearnerJobsTests(Base.PeakLearnerTestBase):
     def test_jobRestart(self):
         from core.Jobs import Jobs
 
-        Jobs.makeJobHaveBadTime({})
+        # A lease time of 0 is already expired, like a worker which died while running the task
+        out = self.testapp.post_json(self.leaseUrl, {'count': 1, 'leaseTime': 0})
 
-        jobUrl = '%s0/' % self.jobsURL
+        assert out.status_code == 200
 
-        out = self.testapp.get(jobUrl, headers={'Accept': 'application/json'})
+        task = out.json[0]
 
-        assert out.status_code == 200
+        jobUrl = '%s%s/' % (self.jobsURL, task['id'])
+
+        out = self.testapp.get(jobUrl, headers={'Accept': 'application/json'})
 
         jobToRestart = out.json
 
         assert jobToRestart['status'].lower() == 'queued'
-        assert jobToRestart['lastModified'] == 0
 
-        Jobs.checkRestartJobs({})
+        time.sleep(1)
+        Jobs.reclaimLeases({})
 
         out = self.testapp.get(jobUrl, headers={'Accept': 'application/json'})
 
@@ -186,7 +191,85 @@ class PeakLearnerJobsTests(Base.PeakLearnerTestBase):
         jobAfterRestart = out.json
 
         assert jobAfterRestart['status'].lower() == 'new'
-        assert jobAfterRestart['lastModified'] != 0
+        assert jobAfterRestart['lastModified'] > jobToRestart['lastModified']
+
+    def test_leaseTasks(self):
+        from core.Jobs import Jobs
+
+        out = self.testapp.post_json(self.leaseUrl, {'count': 2, 'leaseTime': 0})
+
+        assert out.status_code == 200
+
+        tasks = out.json
+
+        assert 0 < len(tasks) <= 2
+
+        for task in tasks:
+            assert task['status'].lower() == 'queued'
+
+        # Lease time of 0 means the lease is already expired
+        time.sleep(1)
+        Jobs.reclaimLeases({})
+
+        for task in tasks:
+            out = self.testapp.get('%s%s/' % (self.jobsURL, task['id']), headers={'Accept': 'application/json'})
+
+            assert out.json['tasks'][task['taskId']]['status'].lower() == 'new'
+
+        out = self.testapp.post_json(self.leaseUrl, {'count': 1})
+
+        assert out.status_code == 200
+
+        task = out.json[0]
+
+        update = [{'id': task['id'], 'taskId': task['taskId'], 'status': 'Processing'}]
+
+        out = self.testapp.post_json(self.tasksUrl, update)
+
+        assert out.status_code == 200
+
+        assert out.json[0]['status'].lower() == 'processing'
+
+        # A task of a job which doesn't exist doesn't stop the rest of the batch from being updated
+        update = [{'id': 'missing', 'taskId': task['taskId'], 'status': 'Done'},
+                  {'id': task['id'], 'taskId': task['taskId'], 'status': 'Queued'}]
+
+        out = self.testapp.post_json(self.tasksUrl, update)
+
+        assert out.status_code == 200
+
+        assert out.json[0]['error'] == 'Job not found'
+        assert out.json[1]['status'].lower() == 'queued'
+
+    def test_duplicateJobMerged(self):
+        from core.Jobs import Jobs
+        from core.util import PLdb as db
+
+        problem = {'chrom': 'chr1', 'chromStart': 0, 'chromEnd': 1000}
+        args = ('Public', 'H3K4me3_TDH_ENCODE', 'aorta_ENCFF115HTK', problem, 1000)
+
+        txn = db.getTxn()
+
+        first = Jobs.SingleModelJob(*args, 1)
+        firstId = first.putNewJob(txn)
+
+        assert firstId is not None
+
+        # The same model while the first is still waiting is merged into it
+        duplicate = Jobs.SingleModelJob(*args, 5)
+
+        assert duplicate.putNewJob(txn) is None
+
+        assert db.Job(firstId).get(txn=txn).priority == 5
+
+        # Only the penalties which aren't waiting already are kept
+        gridSearch = Jobs.GridSearchJob(*args[:-1], [1000, 2000], 0)
+
+        assert gridSearch.putNewJob(txn) is not None
+
+        assert gridSearch.tasks['0']['penalties'] == ['2000']
+
+        txn.commit()
 
     def doPredictionFeatureStep(self):
         # No Prediction Ready
@@ -335,6 +418,9 @@ class PeakLearnerJobsTests(Base.PeakLearnerTestBase):
             self.putFeature(job, trackUrl)
         elif job['type'] == 'model':
             self.putLoss(job, trackUrl)
+        elif job['type'] == 'multiModel':
+            for penalty in job['penalties']:
+                self.putLoss({**job, 'penalty': penalty}, trackUrl)
 
         jobUrl = '%s%s/' % (self.jobsURL, job['id'])
 
@@ -0,0 +1,82 @@
+import io
+import json
+import struct
+import unittest
+import pandas as pd
+import pyramid.testing
+from core import dfStreamOut
+from core.util import binaryUtil
+from tests.core.test_binaryUtil import readTable
+
+problemModels = [pd.DataFrame({'chrom': ['chr1', 'chr1'], 'start': [100, 500], 'end': [200, 600],
+                               'track': ['aorta', 'aorta'], 'penalty': [1000.0, 1000.0]}),
+                 pd.DataFrame(),
+                 pd.DataFrame({'chrom': ['chr2'], 'start': [1000], 'end': [2000],
+                               'track': ['aorta'], 'penalty': [10000.0]})]
+
+expected = pd.concat(problemModels, ignore_index=True)
+
+
+@dfStreamOut
+def problemModelsView(request):
+    return iter(problemModels)
+
+
+@dfStreamOut
+def failingView(request):
+    yield problemModels[0]
+    raise ValueError('Failed reading a problem')
+
+
+def getWithAccept(view, accept):
+    request = pyramid.testing.DummyRequest(headers={'Accept': accept})
+
+    return view(request)
+
+
+class StreamOutTests(unittest.TestCase):
+    def test_json(self):
+        response = getWithAccept(problemModelsView, 'application/json')
+
+        assert response.status_code == 200
+        assert json.loads(response.body) == expected.to_dict('records')
+
+    def test_csv(self):
+        response = getWithAccept(problemModelsView, 'text/csv')
+
+        out = pd.read_csv(io.BytesIO(response.body), sep='\t')
+
+        assert out.to_dict('records') == expected.to_dict('records')
+
+    def test_binary(self):
+        response = getWithAccept(problemModelsView, binaryUtil.contentType)
+
+        data = response.body
+        offset = 0
+        tables = []
+
+        while offset < len(data):
+            length, = struct.unpack_from('<I', data, offset)
+            offset += 4
+
+            table, end = readTable(data, offset)
+            assert end == offset + length
+            tables.append(table)
+            offset = end
+
+        # The empty problem isn't sent
+        assert len(tables) == 2
+        assert pd.concat(tables, ignore_index=True)['chrom'].tolist() == expected['chrom'].tolist()
+        assert pd.concat(tables, ignore_index=True)['start'].tolist() == expected['start'].tolist()
+
+    def test_empty(self):
+        @dfStreamOut
+        def emptyView(request):
+            return iter([pd.DataFrame()])
+
+        assert getWithAccept(emptyView, 'application/json').status_code == 204
+
+    def test_failurePartWay(self):
+        # The error comes out before there is a response, so it can't be a truncated one
+        with self.assertRaises(ValueError):
+            getWithAccept(failingView, 'application/json')
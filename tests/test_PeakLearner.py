@@ -74,7 +74,24 @@ class PeakLearnerTests(Base.PeakLearnerTestBase):
 
         assert request.status_code == 200
 
-        assert request.json == self.testHubURL
+        assert request.json['path'] == self.testHubURL
+
+        # The hub is set up in the background
+        for i in range(600):
+            ingest = self.testapp.get(request.json['status'])
+
+            assert ingest.status_code == 200
+
+            if ingest.json['status'] in ['done', 'error']:
+                break
+
+            time.sleep(1)
+
+        assert ingest.json['status'] == 'done'
+
+        hubInfo = self.testapp.get(self.testHubURL + 'info/')
+
+        assert hubInfo.status_code == 200
 
         dataPath = os.path.join(cfg.jbrowsePath, cfg.dataPath)
 
@@ -289,6 +306,39 @@ class PeakLearnerTests(Base.PeakLearnerTestBase):
 
         assert output.status_code == 200
 
+    def test_getTracksFeatures(self):
+        self.test_doSampleJob()
+
+        params = {'ref': 'chr3', 'start': 0,
+                  'end': 396044860}
+
+        tracksParams = {**params, 'tracks': ','.join([self.track, self.sampleTrack])}
+
+        output = self.testapp.get('%strackFeatures/' % self.hubURL, params=tracksParams)
+
+        assert output.status_code == 200
+
+        features = output.json
+
+        assert len(features.keys()) == 2
+
+        sampleModels = self.testapp.get(self.sampleModelsUrl, params=params, headers={'Accept': 'json'})
+
+        assert features[self.sampleTrack]['models'] == sampleModels.json
+
+        labels = self.testapp.get(self.labelURL, params=params, headers={'Accept': 'json'})
+
+        if labels.status_code == 204:
+            assert features[self.track]['labels'] == []
+        else:
+            assert features[self.track]['labels'] == labels.json
+
+        tracksParams['handlers'] = 'labels'
+
+        output = self.testapp.get('%strackFeatures/' % self.hubURL, params=tracksParams)
+
+        assert 'models' not in output.json[self.track]
+
     def test_labelsWithAcceptAnyHeader(self):
         params = {'ref': 'chr3', 'start': 0,
                   'end': 396044860}